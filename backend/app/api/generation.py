@@ -1,80 +1,76 @@
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
-from typing import Dict, Any
+from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi.responses import StreamingResponse
+from typing import Dict, Any, Optional, Tuple
 from app.core.supabase import supabase
 from app.api.deps import get_current_user
 from app.models.user import UserResponse
-from app.models.question import GenerationRequest, GenerationResponse
-from app.services.ai_service import generate_questions
+from app.models.question import (
+    GenerationRequest, GenerationResponse, GeneratedQuestions,
+    BatchGenerationRequest, BatchGenerationResponse
+)
+from app.services.ai_service import stream_questions, QUESTION_SECTIONS, SET_LABELS
+from app.services.job_queue import get_job_queue, Job, PENDING, PROCESSING, COMPLETED, FAILED
+from app.core.config import settings
+from app.services.llm_cache import get_cache_stats
+from app.services.rate_limiter import get_rate_limit_stats
+from app.services.hedging import get_hedge_stats
+from app.services.rag_service import get_search_stats
+from app.services.embedding_worker import get_embedding_stats
+from app.services.embedding_cache import get_query_embedding_cache_stats
+from app.services.vector_index import get_local_index_stats
 from app.models.paper import PaperResponse
 from uuid import UUID
 import asyncio
+import hashlib
+import json
+import time
 
 router = APIRouter()
 
-# Store generation status in memory (in production, use Redis or database)
-generation_status: Dict[str, Dict[str, Any]] = {}
+# Idle event streams send a comment this often
+SSE_KEEPALIVE_SECONDS = 15
 
 
-async def run_generation(paper_id: str, request: GenerationRequest):
-    """Background task to run question generation."""
-    try:
-        # Update status to processing
-        generation_status[paper_id] = {"status": "processing", "error": None}
-
-        # Generate questions
-        questions = await generate_questions(
-            subject_id=str(request.subject_id),
-            subject_name=request.subject_name,
-            units=request.units,
-            difficulty=request.difficulty,
-            question_config=request.question_config,
-            custom_instructions=request.custom_instructions
-        )
-
-        # Convert to dict for storage
-        questions_dict = questions.model_dump()
-
-        # Update paper with generated questions
-        supabase.table("papers").update({
-            "questions": questions_dict,
-            "status": "generated"
-        }).eq("id", paper_id).execute()
-
-        # Update generation status
-        generation_status[paper_id] = {
-            "status": "completed",
-            "questions": questions_dict
-        }
-
-        print(f"Generation completed for paper {paper_id}")
-
-    except Exception as e:
-        error_msg = str(e)
-        print(f"Generation failed for paper {paper_id}: {error_msg}")
-
-        # Update paper status to failed
-        supabase.table("papers").update({
-            "status": "failed"
-        }).eq("id", paper_id).execute()
+def submission_key(
+    kind: str,
+    paper_id: str,
+    user_id: str,
+    payload: Dict[str, Any],
+    idempotency_key: Optional[str]
+) -> Tuple[str, bool]:
+    """
+    Key under which a generation submission is deduplicated, and whether it
+    also matches finished jobs.
 
-        # Update generation status
-        generation_status[paper_id] = {
-            "status": "failed",
-            "error": error_msg
-        }
+    A client-supplied Idempotency-Key matches the job it created for
+    GENERATION_IDEMPOTENCY_TTL_SECONDS. Without one, a submission identical
+    to a job that is still pending or processing (a double click, a client
+    retry) attaches to that job.
+    """
+    if idempotency_key:
+        return f"{kind}:{paper_id}:{user_id}:{idempotency_key}", True
+    digest = hashlib.sha256(
+        json.dumps(payload, sort_keys=True, default=str).encode()
+    ).hexdigest()
+    return f"{kind}:{paper_id}:{digest}", False
 
 
 @router.post("/generate", response_model=GenerationResponse)
 async def start_generation(
     request: GenerationRequest,
-    background_tasks: BackgroundTasks,
-    current_user: UserResponse = Depends(get_current_user)
+    current_user: UserResponse = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=200)
 ):
     """
     Start question generation for a paper.
 
-    This endpoint starts an asynchronous background task to generate questions.
-    Use GET /api/generation/status/{paper_id} to check progress.
+    This endpoint queues a generation job that a worker process (python -m
+    app.worker) picks up. Use GET /api/generation/status/{paper_id} to check
+    progress.
+
+    Resubmitting returns the existing job (attached=true) instead of queueing
+    another: always while an identical job is still running, and for a day
+    when the same Idempotency-Key header is sent.
     """
     paper_id = str(request.paper_id)
 
@@ -103,17 +99,190 @@ async def start_generation(
 
     request.subject_name = subject_response.data[0]["name"]
 
+    queue = get_job_queue()
+    payload = request.model_dump(mode="json")
+    key, include_finished = submission_key(
+        "paper", paper_id, str(current_user.id), payload, idempotency_key
+    )
+
+    existing = await asyncio.to_thread(queue.find_idempotent, key, include_finished)
+    if existing is not None:
+        return GenerationResponse(
+            paper_id=request.paper_id,
+            status=existing.status,
+            job_id=existing.id,
+            attached=True
+        )
+
     # Update paper status to pending
     supabase.table("papers").update({
         "status": "pending"
     }).eq("id", paper_id).execute()
 
-    # Start background generation task
-    background_tasks.add_task(run_generation, paper_id, request)
+    # Queue the job for the generation workers; a concurrent identical
+    # submission that got past the check above still ends up on one job
+    job, created = await asyncio.to_thread(
+        queue.enqueue, paper_id, payload,
+        idempotency_key=key, include_finished=include_finished
+    )
 
     return GenerationResponse(
         paper_id=request.paper_id,
-        status="pending"
+        status=job.status,
+        job_id=job.id,
+        attached=not created
+    )
+
+
+def load_paper_questions(paper_id: str) -> Optional[Dict[str, Any]]:
+    """Read the questions JSONB of a paper (only once it is generated)."""
+    response = (
+        supabase.table("papers")
+        .select("questions")
+        .eq("id", paper_id)
+        .execute()
+    )
+    return response.data[0].get("questions") if response.data else None
+
+
+@router.post("/generate-sets", response_model=BatchGenerationResponse)
+async def start_set_generation(
+    request: BatchGenerationRequest,
+    current_user: UserResponse = Depends(get_current_user),
+    idempotency_key: Optional[str] = Header(None, alias="Idempotency-Key", max_length=200)
+):
+    """
+    Start generation of several equivalent sets (Set A, Set B, ...) of a paper.
+
+    The paper in the request becomes Set A and a paper is created for each
+    further set. One job retrieves the reference content once and generates
+    all sets concurrently, without repeating questions across sets. Track any
+    of the returned papers with the status or events endpoints.
+
+    Resubmissions attach to the existing job as for POST /generate, without
+    creating set papers again. Generating sets of the same paper again once
+    that job has finished reuses its set papers.
+    """
+    paper_id = str(request.paper_id)
+
+    paper_response = (
+        supabase.table("papers")
+        .select("*")
+        .eq("id", paper_id)
+        .eq("faculty_id", str(current_user.id))
+        .execute()
+    )
+
+    if not paper_response.data:
+        raise HTTPException(status_code=404, detail="Paper not found")
+
+    paper = paper_response.data[0]
+
+    subject_response = (
+        supabase.table("subjects")
+        .select("name")
+        .eq("id", str(request.subject_id))
+        .execute()
+    )
+
+    if not subject_response.data:
+        raise HTTPException(status_code=404, detail="Subject not found")
+
+    request.subject_name = subject_response.data[0]["name"]
+
+    queue = get_job_queue()
+    payload = request.model_dump(mode="json")
+    key, include_finished = submission_key(
+        "sets", paper_id, str(current_user.id), payload, idempotency_key
+    )
+
+    existing = await asyncio.to_thread(queue.find_idempotent, key, include_finished)
+    if existing is not None:
+        return BatchGenerationResponse(
+            paper_ids=existing.paper_ids or [existing.paper_id],
+            status=existing.status,
+            job_id=existing.id,
+            attached=True
+        )
+
+    # A paper generated as sets before keeps its set papers and titles;
+    # resubmitting fills them again instead of adding more
+    base_title = paper["title"].removesuffix(f" - Set {SET_LABELS[0]}")
+    previous = await asyncio.to_thread(queue.latest_for_paper, paper_id)
+    reused_ids = []
+    if (
+        previous is not None
+        and previous.status in (COMPLETED, FAILED)
+        and previous.paper_id == paper_id
+        and previous.paper_ids
+    ):
+        candidates = previous.paper_ids[1:request.set_count]
+        if candidates:
+            reused_response = (
+                supabase.table("papers")
+                .select("id")
+                .in_("id", candidates)
+                .eq("faculty_id", str(current_user.id))
+                .execute()
+            )
+            found = {row["id"] for row in reused_response.data or []}
+            reused_ids = [set_id for set_id in candidates if set_id in found]
+
+    def set_paper(index: int) -> Dict[str, Any]:
+        return {
+            "faculty_id": str(current_user.id),
+            "subject_id": str(request.subject_id),
+            "title": f"{base_title} - Set {SET_LABELS[index]}",
+            "units": request.units,
+            "difficulty": request.difficulty,
+            "custom_instructions": request.custom_instructions,
+            "question_config": request.question_config,
+            "status": "pending",
+            "questions": {}
+        }
+
+    for index, set_id in enumerate(reused_ids, start=1):
+        supabase.table("papers").update(set_paper(index)).eq("id", set_id).execute()
+
+    new_papers = [
+        set_paper(index)
+        for index in range(1 + len(reused_ids), request.set_count)
+    ]
+    created_ids = []
+    if new_papers:
+        insert_response = supabase.table("papers").insert(new_papers).execute()
+        if len(insert_response.data or []) != len(new_papers):
+            raise HTTPException(status_code=400, detail="Could not create set papers")
+        created_ids = [row["id"] for row in insert_response.data]
+
+    paper_ids = [paper_id] + reused_ids + created_ids
+
+    supabase.table("papers").update({
+        "status": "pending"
+    }).eq("id", paper_id).execute()
+
+    # One job fills every set, sharing retrieval and cross-set deduplication
+    job, created = await asyncio.to_thread(
+        queue.enqueue,
+        paper_id,
+        payload,
+        paper_ids,
+        idempotency_key=key,
+        include_finished=include_finished
+    )
+    if created:
+        supabase.table("papers").update({
+            "title": f"{base_title} - Set {SET_LABELS[0]}"
+        }).eq("id", paper_id).execute()
+    elif created_ids:
+        # Lost a race with an identical submission; its job has its own sets
+        supabase.table("papers").delete().in_("id", created_ids).execute()
+
+    return BatchGenerationResponse(
+        paper_ids=job.paper_ids or paper_ids,
+        status=job.status,
+        job_id=job.id,
+        attached=not created
     )
 
 
@@ -125,15 +294,20 @@ async def get_generation_status(
     """
     Check the status of question generation for a paper.
 
+    Prefer GET /api/generation/events/{paper_id}, which pushes status changes;
+    this endpoint is the polling fallback and only reads the paper's
+    questions once generation has completed.
+
     Returns:
     - status: "pending", "processing", "completed", or "failed"
+    - stage / sections: Pipeline stage while processing
     - questions: Generated questions (only if status is "completed")
     - error: Error message (only if status is "failed")
     """
     # Verify paper exists and belongs to user
     paper_response = (
         supabase.table("papers")
-        .select("*")
+        .select("id, status")
         .eq("id", paper_id)
         .eq("faculty_id", str(current_user.id))
         .execute()
@@ -144,25 +318,215 @@ async def get_generation_status(
 
     paper = paper_response.data[0]
 
-    # Check memory status first for real-time updates
-    if paper_id in generation_status:
-        status_data = generation_status[paper_id]
+    # The job queue is shared by all API workers and generation workers
+    job = await asyncio.to_thread(get_job_queue().latest_for_paper, paper_id)
+    if job is not None:
+        questions = None
+        if job.status == COMPLETED:
+            questions = await asyncio.to_thread(load_paper_questions, paper_id)
         return GenerationResponse(
             paper_id=paper_id,
-            status=status_data["status"],
-            questions=status_data.get("questions"),
-            error=status_data.get("error")
+            status=job.status,
+            stage=job.stage,
+            sections=job.sections,
+            questions=questions,
+            error=job.error if job.status == FAILED else None,
+            usage=(job.result or {}).get("usage")
         )
 
     # Fall back to database status
+    status = paper.get("status", "pending")
     return GenerationResponse(
         paper_id=paper_id,
-        status=paper.get("status", "pending"),
-        questions=paper.get("questions") if paper.get("status") == "generated" else None,
+        status=status,
+        questions=load_paper_questions(paper_id) if status == "generated" else None,
         error=None
     )
 
 
+def format_sse(event: str, data: Any) -> str:
+    """Format a Server-Sent Event."""
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def job_event(paper_id: str, job: Job) -> Dict[str, Any]:
+    return {
+        "paper_id": paper_id,
+        "status": job.status,
+        "stage": job.stage,
+        "sections": job.sections,
+        "error": job.error if job.status == FAILED else None,
+        "usage": (job.result or {}).get("usage")
+    }
+
+
+@router.get("/events/{paper_id}")
+async def generation_events(
+    paper_id: str,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """
+    Subscribe to the generation status of a queued paper over Server-Sent
+    Events.
+
+    An event "status" is sent for every change, e.g. pending -> processing
+    (stage "retrieving") -> processing (stage "generating", sections
+    ["mcq", "long"]) -> ..., and the stream ends with a "completed" or
+    "failed" event. Fetch the questions with GET /api/generation/paper/{paper_id}
+    after "completed".
+
+    Changes are read from the local job queue that the generation workers
+    write to, so open subscriptions do not query the database.
+    """
+    paper_response = (
+        supabase.table("papers")
+        .select("id, status")
+        .eq("id", paper_id)
+        .eq("faculty_id", str(current_user.id))
+        .execute()
+    )
+
+    if not paper_response.data:
+        raise HTTPException(status_code=404, detail="Paper not found")
+
+    paper_status = paper_response.data[0].get("status", "pending")
+    queue = get_job_queue()
+
+    async def event_stream():
+        last_event = None
+        last_sent = time.monotonic()
+        while True:
+            job = await asyncio.to_thread(queue.latest_for_paper, paper_id)
+            if job is None:
+                # Not generated through the queue (e.g. streamed)
+                yield format_sse("status", {"paper_id": paper_id, "status": paper_status})
+                return
+
+            event = job_event(paper_id, job)
+            if event != last_event:
+                yield format_sse("status", event)
+                last_event = event
+                last_sent = time.monotonic()
+                if job.status in (COMPLETED, FAILED):
+                    yield format_sse(job.status, event)
+                    return
+            elif time.monotonic() - last_sent > SSE_KEEPALIVE_SECONDS:
+                # Comment line keeps proxies from closing an idle stream
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+
+            await asyncio.sleep(settings.GENERATION_EVENTS_POLL_SECONDS)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/stream/{paper_id}")
+async def stream_generation(
+    paper_id: str,
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """
+    Generate questions for a paper and stream them over Server-Sent Events.
+
+    Each question is sent as soon as the model finishes writing it:
+    - event "question": {"type": "mcq" | "fill_blanks" | "short" | "long", "question": {...}}
+    - event "completed": {"paper_id": ..., "questions": {...}} once the paper is saved
+    - event "error": {"error": "..."} if generation fails
+
+    Returns 409 while a queued job for the paper is pending or processing.
+    If the client disconnects before the paper is saved, it is marked failed.
+    """
+    paper_response = (
+        supabase.table("papers")
+        .select("*, subjects(name)")
+        .eq("id", paper_id)
+        .eq("faculty_id", str(current_user.id))
+        .execute()
+    )
+
+    if not paper_response.data:
+        raise HTTPException(status_code=404, detail="Paper not found")
+
+    # Generating here as well would race the worker writing the same paper
+    job = await asyncio.to_thread(get_job_queue().latest_for_paper, paper_id)
+    if job is not None and job.status in (PENDING, PROCESSING):
+        raise HTTPException(
+            status_code=409,
+            detail="Paper is already being generated; follow /api/generation/events"
+        )
+
+    paper = paper_response.data[0]
+    subject_data = paper.get("subjects")
+    subject_name = "Unknown Subject"
+    if isinstance(subject_data, dict):
+        subject_name = str(subject_data.get("name", "Unknown Subject"))
+
+    async def event_stream():
+        supabase.table("papers").update({
+            "status": "pending"
+        }).eq("id", paper_id).execute()
+
+        questions = GeneratedQuestions()
+        finished = False
+        try:
+            async for question_type, question in stream_questions(
+                subject_id=str(paper["subject_id"]),
+                subject_name=subject_name,
+                units=paper.get("units") or [],
+                difficulty=paper.get("difficulty", "medium"),
+                question_config=paper.get("question_config") or {},
+                custom_instructions=paper.get("custom_instructions")
+            ):
+                key, _ = QUESTION_SECTIONS[question_type]
+                getattr(questions, key).append(question)
+                yield format_sse("question", {
+                    "type": question_type,
+                    "question": question.model_dump()
+                })
+
+            questions_dict = questions.model_dump()
+            supabase.table("papers").update({
+                "questions": questions_dict,
+                "status": "generated"
+            }).eq("id", paper_id).execute()
+            finished = True
+
+            yield format_sse("completed", {
+                "paper_id": paper_id,
+                "questions": questions_dict
+            })
+
+        except Exception as e:
+            error_msg = str(e)
+            print(f"Streaming generation failed for paper {paper_id}: {error_msg}")
+
+            supabase.table("papers").update({
+                "status": "failed"
+            }).eq("id", paper_id).execute()
+            finished = True
+
+            yield format_sse("error", {"error": error_msg})
+
+        finally:
+            if not finished:
+                # The client went away mid-generation; nothing will finish
+                # the paper, so it must not stay pending
+                print(f"Streaming generation abandoned for paper {paper_id}")
+                supabase.table("papers").update({
+                    "status": "failed"
+                }).eq("id", paper_id).execute()
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
 @router.get("/paper/{paper_id}", response_model=PaperResponse)
 async def get_paper_with_questions(
     paper_id: str,
@@ -183,3 +547,22 @@ async def get_paper_with_questions(
         raise HTTPException(status_code=404, detail="Paper not found")
 
     return response.data[0]
+
+
+@router.get("/metrics")
+async def get_generation_metrics(
+    current_user: UserResponse = Depends(get_current_user)
+):
+    """
+    Runtime metrics of the generation pipeline in this worker.
+    """
+    return {
+        "llm_cache": get_cache_stats(),
+        "llm_rate_limit": get_rate_limit_stats(),
+        "llm_hedging": get_hedge_stats(),
+        "rag_search": get_search_stats(),
+        "embeddings": get_embedding_stats(),
+        "query_embedding_cache": get_query_embedding_cache_stats(),
+        "local_index": get_local_index_stats(),
+        "generation_jobs": await asyncio.to_thread(get_job_queue().counts)
+    }
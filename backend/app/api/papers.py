@@ -2,9 +2,10 @@ from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from typing import List, Optional, Any, Dict
 from app.core.supabase import supabase
 from app.api.deps import get_current_user
-from app.models.paper import PaperCreate, PaperResponse
+from app.models.paper import PaperCreate, PaperResponse, PaperVariant
 from app.models.user import UserResponse
 from app.services.export_service import ExportService
+from app.services.variant_service import derive_variants, variant_seed
 
 router = APIRouter()
 
@@ -248,3 +249,108 @@ def download_paper(
         media_type=media_type,
         headers={"Content-Disposition": f"attachment; filename={filename}"},
     )
+
+
+def get_generated_paper(paper_id: str, faculty_id: str) -> Dict[str, Any]:
+    response = (
+        supabase.table("papers")
+        .select("*, subjects(name)")
+        .eq("id", paper_id)
+        .eq("faculty_id", faculty_id)
+        .single()
+        .execute()
+    )
+
+    if not response.data:
+        raise HTTPException(status_code=404, detail="Paper not found")
+
+    paper_data: Dict[str, Any] = response.data
+    if not paper_data.get("questions"):
+        raise HTTPException(
+            status_code=400, detail="Paper has no generated questions yet"
+        )
+    return paper_data
+
+
+@router.get("/{paper_id}/variants", response_model=List[PaperVariant])
+def get_paper_variants(
+    paper_id: str,
+    count: int = Query(2, ge=1, le=26),
+    seed: Optional[str] = Query(None, max_length=100),
+    shuffle_questions: bool = True,
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """
+    Derive variants of a generated paper by reordering the questions of each
+    section and permuting MCQ options (correct_answer follows its option).
+    No questions are generated, so this takes milliseconds.
+
+    The same seed (default: the paper id) always gives the same variants;
+    download one with GET /{paper_id}/variants/{variant}/download.
+    """
+    paper_data = get_generated_paper(paper_id, str(current_user.id))
+    seed = variant_seed(paper_id, seed)
+    variants = derive_variants(paper_data["questions"], count, seed, shuffle_questions)
+
+    return [
+        PaperVariant(
+            variant=index,
+            seed=seed,
+            title=f"{paper_data['title']} - Variant {index}",
+            questions=questions,
+        )
+        for index, questions in enumerate(variants, start=1)
+    ]
+
+
+@router.get("/{paper_id}/variants/{variant}/download")
+def download_paper_variant(
+    paper_id: str,
+    variant: int,
+    format: str = Query(..., regex="^(pdf|docx)$"),
+    seed: Optional[str] = Query(None, max_length=100),
+    shuffle_questions: bool = True,
+    current_user: UserResponse = Depends(get_current_user),
+):
+    """Export one variant, re-derived from the seed rather than stored."""
+    if variant < 1:
+        raise HTTPException(status_code=400, detail="Variants are numbered from 1")
+
+    paper_data = get_generated_paper(paper_id, str(current_user.id))
+    subject_data = paper_data.get("subjects")
+    subject_name = "Unknown Subject"
+
+    if isinstance(subject_data, dict):
+        subject_name = str(subject_data.get("name", "Unknown Subject"))
+
+    (questions,) = derive_variants(
+        paper_data["questions"],
+        1,
+        variant_seed(paper_id, seed),
+        shuffle_questions,
+        start=variant,
+    )
+    paper = PaperResponse(
+        **{
+            **paper_data,
+            "title": f"{paper_data['title']} - Variant {variant}",
+            "questions": questions,
+        }
+    )
+
+    if format == "pdf":
+        content = ExportService.generate_pdf(paper, subject_name)
+        media_type = "application/pdf"
+        filename = f"{paper.title.replace(' ', '_')}.pdf"
+    else:
+        content = ExportService.generate_docx(paper, subject_name)
+        media_type = (
+            "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+        )
+        filename = f"{paper.title.replace(' ', '_')}.docx"
+
+    return Response(
+        content=content,
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"},
+    )
@@ -1,12 +1,18 @@
+import asyncio
+import time
 from typing import Any, List, Optional
 from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
 from pydantic import BaseModel
 from app.services.rag_service import process_document_chunks, search_similar_chunks
+from app.services.ingestion_progress import FAILED, PROCESSING, get_progress_store
 from app.api.deps import get_current_user
 from app.core.supabase import supabase
 
 router = APIRouter()
 
+# A run that has not reported progress for this long is assumed dead
+PROCESSING_STALE_SECONDS = 600
+
 
 class SearchRequest(BaseModel):
     query: str
@@ -22,6 +28,10 @@ async def process_document_rag(
 ):
     """
     Trigger RAG processing (chunking and embedding) for a document.
+
+    Safe to repeat: only new or changed chunks are embedded, chunks the
+    text no longer produces are removed, and an unchanged document is left
+    as it is.
     """
     response = (
         supabase.table("documents").select("*").eq("id", doc_id).single().execute()
@@ -42,6 +52,15 @@ async def process_document_rag(
         "file_name": doc.get("file_name"),
     }
 
+    # A second run at the same time would insert the new chunks twice
+    progress = await asyncio.to_thread(get_progress_store().get, doc_id)
+    if (
+        progress is not None
+        and progress["status"] == PROCESSING
+        and time.time() - progress["updated_at"] < PROCESSING_STALE_SECONDS
+    ):
+        return {"message": "RAG processing already running", "progress": progress}
+
     background_tasks.add_task(process_document_chunks, doc_id, content, metadata)
 
     return {"message": "RAG processing started in background"}
@@ -64,7 +83,18 @@ async def search_documents(
 async def get_rag_status(doc_id: str, current_user: Any = Depends(get_current_user)):
     """
     Check if document has been chunked and embedded.
+
+    While processing runs (on this host), "progress" has the number of
+    chunks embedded and stored so far against the estimated total.
     """
+    progress = await asyncio.to_thread(get_progress_store().get, doc_id)
+    if progress is not None and progress["status"] == PROCESSING:
+        return {
+            "chunk_count": progress["chunks_stored"],
+            "status": PROCESSING,
+            "progress": progress,
+        }
+
     response = (
         supabase.table("document_chunks")
         .select("count", count="exact")
@@ -73,7 +103,7 @@ async def get_rag_status(doc_id: str, current_user: Any = Depends(get_current_us
     )
 
     count = response.count
-    return {
-        "chunk_count": count,
-        "status": "completed" if count and count > 0 else "pending",
-    }
+    status = "completed" if count and count > 0 else "pending"
+    if progress is not None and progress["status"] == FAILED:
+        status = FAILED
+    return {"chunk_count": count, "status": status, "progress": progress}
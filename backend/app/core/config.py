@@ -15,5 +15,162 @@ class Settings:
     MISTRAL_API_KEY = os.getenv("MISTRAL_API_KEY", "")
     GROQ_API_KEY = os.getenv("GROQ_API_KEY", "")
 
+    # Async LLM client pool
+    GROQ_BASE_URL = os.getenv("GROQ_BASE_URL", "")
+    LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", 20))
+    LLM_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_MAX_KEEPALIVE_CONNECTIONS", 10))
+    LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", 120))
+    # LLM response cache: "memory", "sqlite" or "none"
+    LLM_CACHE_BACKEND = os.getenv("LLM_CACHE_BACKEND", "memory")
+    LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_cache.sqlite3")
+    LLM_CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", 512))
+    LLM_CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_SECONDS", 86400))
+    # Parallel sub-requests per section when a count exceeds one response
+    LLM_BATCH_CONCURRENCY = int(os.getenv("LLM_BATCH_CONCURRENCY", 4))
+    # Papers whose estimated output fits this budget are generated in one call
+    LLM_SINGLE_CALL_MAX_OUTPUT_TOKENS = int(
+        os.getenv("LLM_SINGLE_CALL_MAX_OUTPUT_TOKENS", 4000)
+    )
+    # Requests/tokens per minute shared by all workers on the host through a
+    # SQLite file. Off by default ("none"); set "sqlite" with the limits of
+    # the account. The limit defaults match the Groq free tier for
+    # llama-3.3-70b-versatile
+    LLM_RATE_LIMIT_BACKEND = os.getenv("LLM_RATE_LIMIT_BACKEND", "none")
+    LLM_RATE_LIMIT_PATH = os.getenv("LLM_RATE_LIMIT_PATH", "llm_rate_limit.sqlite3")
+    LLM_REQUESTS_PER_MINUTE = int(os.getenv("LLM_REQUESTS_PER_MINUTE", 30))
+    LLM_TOKENS_PER_MINUTE = int(os.getenv("LLM_TOKENS_PER_MINUTE", 12000))
+    # Share of max_tokens reserved for the completion until the provider
+    # reports actual usage
+    LLM_EXPECTED_COMPLETION_FRACTION = float(
+        os.getenv("LLM_EXPECTED_COMPLETION_FRACTION", 0.5)
+    )
+    # Longest a call waits for capacity before failing
+    LLM_RATE_LIMIT_MAX_WAIT_SECONDS = float(
+        os.getenv("LLM_RATE_LIMIT_MAX_WAIT_SECONDS", 300)
+    )
+    # Hedging: a call still running after the LLM_HEDGE_PERCENTILE latency of
+    # earlier calls is duplicated to LLM_FALLBACK_MODEL (empty = same model)
+    # and the first valid response wins
+    LLM_HEDGE_ENABLED = os.getenv("LLM_HEDGE_ENABLED", "true").lower() == "true"
+    LLM_FALLBACK_MODEL = os.getenv("LLM_FALLBACK_MODEL", "")
+    LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 95))
+    LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", 20))
+    LLM_HEDGE_INITIAL_DELAY_SECONDS = float(
+        os.getenv("LLM_HEDGE_INITIAL_DELAY_SECONDS", 30)
+    )
+    LLM_HEDGE_MIN_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_MIN_DELAY_SECONDS", 1))
+    # Timeout of one completion request (not counting rate limit waits)
+    LLM_CALL_TIMEOUT_SECONDS = float(os.getenv("LLM_CALL_TIMEOUT_SECONDS", 90))
+    # Follow-up calls asking only for the questions a response was missing
+    LLM_REPAIR_ROUNDS = int(os.getenv("LLM_REPAIR_ROUNDS", 1))
+
+    # Store every generated question in the question_bank table
+    QUESTION_BANK_ENABLED = os.getenv("QUESTION_BANK_ENABLED", "true").lower() == "true"
+
+    # Near-duplicate removal across the sections of a paper
+    DEDUP_ENABLED = os.getenv("DEDUP_ENABLED", "true").lower() == "true"
+    DEDUP_SIMILARITY_THRESHOLD = float(os.getenv("DEDUP_SIMILARITY_THRESHOLD", 0.9))
+    DEDUP_REGENERATE_ROUNDS = int(os.getenv("DEDUP_REGENERATE_ROUNDS", 1))
+
+    # Generation job queue (SQLite file shared by API and worker processes)
+    GENERATION_QUEUE_PATH = os.getenv(
+        "GENERATION_QUEUE_PATH", "generation_jobs.sqlite3"
+    )
+    GENERATION_WORKER_PROCESSES = int(os.getenv("GENERATION_WORKER_PROCESSES", 2))
+    # Jobs run at the same time by each worker process
+    GENERATION_WORKER_CONCURRENCY = int(os.getenv("GENERATION_WORKER_CONCURRENCY", 4))
+    GENERATION_WORKER_POLL_SECONDS = float(
+        os.getenv("GENERATION_WORKER_POLL_SECONDS", 1)
+    )
+    # How often status event streams check the queue for changes
+    GENERATION_EVENTS_POLL_SECONDS = float(
+        os.getenv("GENERATION_EVENTS_POLL_SECONDS", 0.5)
+    )
+    # Running jobs get this long to finish on shutdown before being requeued
+    GENERATION_WORKER_DRAIN_SECONDS = float(
+        os.getenv("GENERATION_WORKER_DRAIN_SECONDS", 120)
+    )
+    # A job whose worker misses heartbeats for this long is picked up again
+    GENERATION_JOB_LEASE_SECONDS = float(os.getenv("GENERATION_JOB_LEASE_SECONDS", 60))
+    GENERATION_JOB_MAX_ATTEMPTS = int(os.getenv("GENERATION_JOB_MAX_ATTEMPTS", 3))
+    GENERATION_JOB_RETRY_BACKOFF_SECONDS = float(
+        os.getenv("GENERATION_JOB_RETRY_BACKOFF_SECONDS", 10)
+    )
+    # A repeated Idempotency-Key returns the job it created for this long
+    GENERATION_IDEMPOTENCY_TTL_SECONDS = float(
+        os.getenv("GENERATION_IDEMPOTENCY_TTL_SECONDS", 86400)
+    )
+
+    # Context builder: token budget counted with the generation model's tokenizer
+    LLM_TOKENIZER = os.getenv("LLM_TOKENIZER", "unsloth/Llama-3.3-70B-Instruct")
+    CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", 2000))
+    # Maximal marginal relevance trade-off: 1.0 = relevance only
+    CONTEXT_MMR_LAMBDA = float(os.getenv("CONTEXT_MMR_LAMBDA", 0.7))
+
+    # Embedding worker: requests arriving within EMBEDDING_BATCH_WAIT_MS are
+    # embedded together, up to EMBEDDING_MAX_BATCH_SIZE texts per forward pass
+    EMBEDDING_MAX_BATCH_SIZE = int(os.getenv("EMBEDDING_MAX_BATCH_SIZE", 64))
+    EMBEDDING_BATCH_WAIT_MS = float(os.getenv("EMBEDDING_BATCH_WAIT_MS", 5))
+    # Embedding requests allowed to wait; callers beyond this wait for room
+    EMBEDDING_QUEUE_SIZE = int(os.getenv("EMBEDDING_QUEUE_SIZE", 256))
+
+    # Embedding backend: "huggingface" (sentence-transformers on torch) or
+    # "onnx" (the same model on ONNX Runtime, without torch). Both give the
+    # 384-dim vectors the embedding columns hold.
+    EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "huggingface")
+    # The int8-quantized ONNX export: faster on CPU, vectors slightly off
+    EMBEDDING_ONNX_QUANTIZED = (
+        os.getenv("EMBEDDING_ONNX_QUANTIZED", "false").lower() == "true"
+    )
+    # Directory holding the .onnx file and tokenizer.json, instead of the Hub
+    EMBEDDING_ONNX_DIR = os.getenv("EMBEDDING_ONNX_DIR", "")
+    # ONNX Runtime threads per inference (0: one per physical core)
+    EMBEDDING_ONNX_THREADS = int(os.getenv("EMBEDDING_ONNX_THREADS", 0))
+
+    # Query embedding cache: "memory", "sqlite" (memory plus an on-disk tier
+    # shared by the workers on the host) or "none"
+    EMBEDDING_CACHE_BACKEND = os.getenv("EMBEDDING_CACHE_BACKEND", "memory")
+    EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "query_embeddings.sqlite3")
+    EMBEDDING_CACHE_MAX_ENTRIES = int(os.getenv("EMBEDDING_CACHE_MAX_ENTRIES", 2048))
+    EMBEDDING_CACHE_DISK_MAX_ENTRIES = int(
+        os.getenv("EMBEDDING_CACHE_DISK_MAX_ENTRIES", 50000)
+    )
+
+    # Document ingestion: chunks embedded and inserted per batch, with retries
+    INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 64))
+    INGEST_MAX_ATTEMPTS = int(os.getenv("INGEST_MAX_ATTEMPTS", 3))
+    INGEST_RETRY_BACKOFF_SECONDS = float(os.getenv("INGEST_RETRY_BACKOFF_SECONDS", 2))
+    INGESTION_PROGRESS_PATH = os.getenv(
+        "INGESTION_PROGRESS_PATH", "ingestion_progress.sqlite3"
+    )
+
+    # In-process copy of recently searched subjects' chunks, searched instead
+    # of the match RPCs once loaded (needs sql/phase9_corpus_version.sql)
+    LOCAL_INDEX_ENABLED = os.getenv("LOCAL_INDEX_ENABLED", "false").lower() == "true"
+    LOCAL_INDEX_MAX_MB = float(os.getenv("LOCAL_INDEX_MAX_MB", 256))
+    # How stale a loaded subject may get before its version stamp is checked
+    LOCAL_INDEX_CHECK_SECONDS = float(os.getenv("LOCAL_INDEX_CHECK_SECONDS", 30))
+    LOCAL_INDEX_PAGE_SIZE = int(os.getenv("LOCAL_INDEX_PAGE_SIZE", 1000))
+
+    # Compact vectors (needs sql/phase11_compact_vectors.sql): "float32" keeps
+    # full precision everywhere; "float16" searches the halfvec column; "int8"
+    # also stores int8 rows with a scale per row and holds the local index as
+    # int8, with its float32 rows in a memory-mapped file under
+    # LOCAL_INDEX_SPILL_DIR (empty: the system temp directory). The match RPCs
+    # and the int8 local index re-score VECTOR_RESCORE_FACTOR x the requested
+    # chunks at full precision.
+    VECTOR_PRECISION = os.getenv("VECTOR_PRECISION", "float32")
+    VECTOR_RESCORE_FACTOR = int(os.getenv("VECTOR_RESCORE_FACTOR", 4))
+    LOCAL_INDEX_SPILL_DIR = os.getenv("LOCAL_INDEX_SPILL_DIR", "")
+
+    # Load the embedding model and clients in the background on startup;
+    # GET /ready reports 503 until they are warm. Failed steps are retried
+    # until they succeed, waiting up to WARMUP_RETRY_MAX_SECONDS in between;
+    # workers start claiming jobs after WARMUP_TIMEOUT_SECONDS regardless.
+    WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "false").lower() == "true"
+    WARMUP_RETRY_MAX_SECONDS = float(os.getenv("WARMUP_RETRY_MAX_SECONDS", 60))
+    WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", 120))
+
 
 settings = Settings()
@@ -1,8 +1,30 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from app.api import auth, subjects, documents, papers, rag, generation
+from app.core.config import settings
+from app.services.embedding_worker import close_embedding_worker
+from app.services.llm_client import close_async_client
+from app.services.tokenizer import start_tokenizer_load
+from app.services.warmup import run_warmup, warmup_state
 
-app = FastAPI(title="Jenisha Question Paper Generator")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Token counts are estimated until the tokenizer has loaded in a thread
+    start_tokenizer_load()
+    # Warm up in the background so startup (and /ready) is not blocked
+    warmup = asyncio.create_task(run_warmup()) if settings.WARMUP_ENABLED else None
+    yield
+    if warmup is not None:
+        warmup.cancel()
+    await close_embedding_worker()
+    await close_async_client()
+
+
+app = FastAPI(title="Jenisha Question Paper Generator", lifespan=lifespan)
 
 # Configure CORS
 origins = [
@@ -29,3 +51,13 @@ app.include_router(generation.router, prefix="/api/generation", tags=["generatio
 @app.get("/")
 def read_root():
     return {"message": "Welcome to Jenisha API"}
+
+
+@app.get("/ready")
+def read_ready():
+    """
+    Readiness probe: 503 until the startup warm-up (WARMUP_ENABLED) has loaded
+    the embedding model and initialized the clients.
+    """
+    summary = warmup_state.summary()
+    return JSONResponse(summary, status_code=200 if summary["ready"] else 503)
@@ -33,3 +33,10 @@ class PaperResponse(PaperBase):
 
     class Config:
         from_attributes = True
+
+
+class PaperVariant(BaseModel):
+    variant: int
+    seed: str
+    title: str
+    questions: Dict[str, Any]
@@ -42,12 +42,23 @@ class LongQuestion(BaseModel):
     unit: Optional[int] = Field(None, ge=1, le=5, description="Source unit number")
 
 
+class GenerationUsage(BaseModel):
+    """LLM usage for generating one paper"""
+    mode: Literal["single", "per_section"] = Field(..., description="Whether sections were generated in one call or separately")
+    llm_calls: int = Field(default=0, description="Number of LLM requests made")
+    prompt_tokens: int = Field(default=0, description="Prompt tokens across all requests")
+    completion_tokens: int = Field(default=0, description="Completion tokens across all requests")
+    bank_questions: int = Field(default=0, description="Questions taken from the question bank")
+    duplicates_removed: int = Field(default=0, description="Near-duplicate questions dropped across sections")
+
+
 class GeneratedQuestions(BaseModel):
     """Complete set of generated questions"""
     mcqs: List[MCQuestion] = Field(default_factory=list, description="Multiple choice questions")
     fill_blanks: List[FillBlankQuestion] = Field(default_factory=list, description="Fill in the blanks questions")
     short: List[ShortQuestion] = Field(default_factory=list, description="Short answer questions")
     long: List[LongQuestion] = Field(default_factory=list, description="Long answer questions")
+    usage: Optional[GenerationUsage] = Field(None, exclude=True, description="LLM usage report (not stored with the questions)")
 
 
 class GenerationRequest(BaseModel):
@@ -59,11 +70,31 @@ class GenerationRequest(BaseModel):
     difficulty: Literal["easy", "medium", "hard"]
     custom_instructions: Optional[str] = None
     question_config: Dict[str, int]
+    fresh: bool = Field(default=False, description="Bypass cached LLM responses and generate new questions")
+    use_question_bank: bool = Field(default=False, description="Fill the paper from the question bank first, generating only the shortfall")
+
+
+class BatchGenerationRequest(GenerationRequest):
+    """Request model for generating several sets (A, B, ...) of one paper"""
+    set_count: int = Field(default=2, ge=2, le=6, description="Number of equivalent sets; paper_id becomes Set A and a paper is created for each other set")
+
+
+class BatchGenerationResponse(BaseModel):
+    """Response model for multi-set generation"""
+    paper_ids: List[UUID]
+    status: Literal["pending", "processing", "completed", "failed"]
+    job_id: Optional[str] = None
+    attached: bool = Field(default=False, description="The submission joined an existing job instead of starting one")
 
 
 class GenerationResponse(BaseModel):
     """Response model for generation status"""
     paper_id: UUID
     status: Literal["pending", "processing", "completed", "failed", "generated"]
+    stage: Optional[str] = Field(None, description="Pipeline stage while processing: retrieving, generating or deduplicating")
+    sections: Optional[List[str]] = Field(None, description="Question types being generated in the generating stage")
     questions: Optional[GeneratedQuestions] = None
     error: Optional[str] = None
+    usage: Optional[GenerationUsage] = None
+    job_id: Optional[str] = None
+    attached: bool = Field(default=False, description="The submission joined an existing job instead of starting one")
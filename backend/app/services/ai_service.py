@@ -1,7 +1,9 @@
+import asyncio
 import json
+import math
 import re
-from typing import List, Dict, Any, Optional, Literal
-from groq import Groq
+from typing import List, Dict, Any, AsyncIterator, Optional, Literal, Tuple, Type
+from pydantic import BaseModel, ValidationError
 from app.core.config import settings
 from app.models.question import (
     MCQuestion,
@@ -9,21 +11,37 @@ from app.models.question import (
     ShortQuestion,
     LongQuestion,
     GeneratedQuestions,
+    GenerationUsage,
+)
+from app.services.rag_service import search_chunks_by_units, search_similar_chunks
+from app.services.llm_client import (
+    chat_completion,
+    stream_chat_completion,
+    track_usage,
+)
+from app.services.hedging import hedged_call
+from app.services.progress import (
+    DEDUPLICATING,
+    GENERATING,
+    RETRIEVING,
+    report_progress,
+)
+from app.services.json_stream import IncrementalJSONParser, salvage_json_items
+from app.services.context_builder import build_mmr_context
+from app.services.tokenizer import count_tokens
+from app.services.dedup_service import deduplicate_questions
+from app.services.question_bank import fetch_bank_questions, schedule_save_to_bank
+from app.services.llm_cache import (
+    bypass_cache,
+    get_llm_cache,
+    is_cache_bypassed,
+    make_cache_key,
 )
-from app.services.rag_service import search_similar_chunks
-
-# Lazy initialization of Groq client
-_groq_client = None
-
 
-def get_groq_client():
-    """Get or initialize the Groq client."""
-    global _groq_client
-    if _groq_client is None:
-        if not settings.GROQ_API_KEY:
-            raise ValueError("GROQ_API_KEY is not set in environment variables")
-        _groq_client = Groq(api_key=settings.GROQ_API_KEY)
-    return _groq_client
+GENERATION_MODEL = "llama-3.3-70b-versatile"
+GENERATION_SYSTEM_MESSAGE = (
+    "You are an expert educational question generator. Always output valid JSON only."
+)
 
 
 def build_difficulty_guidance(difficulty: Literal["easy", "medium", "hard"]) -> str:
@@ -117,36 +135,55 @@ Return ONLY a valid JSON object with this exact structure:
 
 
 def build_context_from_chunks(
-    chunks: List[Dict[str, Any]], max_context_length: int = 8000
+    chunks: List[Dict[str, Any]], max_context_tokens: Optional[int] = None
 ) -> str:
-    """Build context string from retrieved chunks."""
-    if not chunks:
-        return ""
-
-    # Sort chunks by similarity and combine them
-    sorted_chunks = sorted(chunks, key=lambda x: x.get("similarity", 0), reverse=True)
+    """
+    Build context string from retrieved chunks within a token budget of the
+    generation model. Chunks are picked by maximal marginal relevance so
+    near-identical chunks do not crowd out other material, and adjacent
+    chunks of the same document are merged without their overlap.
+    """
+    if max_context_tokens is None:
+        max_context_tokens = settings.CONTEXT_MAX_TOKENS
+    return build_mmr_context(chunks, max_context_tokens, settings.CONTEXT_MMR_LAMBDA)
 
-    context_parts = []
-    total_length = 0
 
-    for chunk in sorted_chunks:
-        content = chunk.get("content", "")
-        metadata = chunk.get("metadata", {})
-        unit = metadata.get("unit", "Unknown")
+def build_unit_context(
+    chunks_by_unit: Dict[int, List[Dict[str, Any]]],
+    max_context_tokens: Optional[int] = None,
+) -> str:
+    """
+    Build context from per-unit chunks, splitting the token budget evenly
+    across units. Units with less material than their share pass the rest
+    on to the others.
+    """
+    if max_context_tokens is None:
+        max_context_tokens = settings.CONTEXT_MAX_TOKENS
 
-        chunk_text = f"[Unit {unit}] {content}"
+    units = [unit for unit in sorted(chunks_by_unit) if chunks_by_unit[unit]]
+    if not units:
+        return ""
 
-        if total_length + len(chunk_text) > max_context_length:
-            # Truncate the last chunk if needed
-            remaining = max_context_length - total_length
-            if remaining > 100:  # Only add if we have meaningful space
-                context_parts.append(chunk_text[:remaining] + "...")
-            break
+    demand = {
+        unit: sum(
+            count_tokens(f"[Unit {unit}] {chunk.get('content', '')}")
+            for chunk in chunks_by_unit[unit]
+        )
+        for unit in units
+    }
 
-        context_parts.append(chunk_text)
-        total_length += len(chunk_text)
+    # Allocate the smallest demands first so their leftovers are redistributed
+    budgets: Dict[int, int] = {}
+    remaining = max_context_tokens
+    for position, unit in enumerate(sorted(units, key=lambda u: demand[u])):
+        share = remaining // (len(units) - position)
+        budgets[unit] = min(demand[unit], share)
+        remaining -= budgets[unit]
 
-    return "\n\n".join(context_parts)
+    parts = [
+        build_context_from_chunks(chunks_by_unit[unit], budgets[unit]) for unit in units
+    ]
+    return "\n\n".join(part for part in parts if part)
 
 
 def clean_json_response(response_text: str) -> str:
@@ -170,105 +207,330 @@ def clean_json_response(response_text: str) -> str:
     return response_text
 
 
-async def generate_mcqs(
+async def request_json_completion(prompt: str, max_tokens: int) -> Dict[str, Any]:
+    """
+    Send a generation prompt to the LLM and parse its JSON response.
+
+    Responses are cached by a hash of the model, messages and sampling
+    parameters; only responses that parse are stored. A response that is not
+    valid JSON (e.g. truncated) is reduced to its complete array items.
+
+    Slow calls are hedged (see hedged_call): past the usual latency a second
+    request goes to LLM_FALLBACK_MODEL and the first valid answer wins.
+    Only answers of GENERATION_MODEL are cached.
+    """
+    request = {
+        "model": GENERATION_MODEL,
+        "messages": [
+            {"role": "system", "content": GENERATION_SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt},
+        ],
+        "temperature": 0.7,
+        "max_tokens": max_tokens,
+        "response_format": {"type": "json_object"},
+    }
+
+    cache = get_llm_cache()
+    cache_key = make_cache_key(request) if cache is not None else ""
+    if cache is not None and not is_cache_bypassed():
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            return json.loads(clean_json_response(cached_text))
+
+    async def attempt(model: str) -> Tuple[str, str, Dict[str, Any], bool]:
+        response = await chat_completion(**{**request, "model": model})
+        response_text = response.choices[0].message.content or ""
+        try:
+            data = json.loads(clean_json_response(response_text))
+            return model, response_text, data, True
+        except json.JSONDecodeError:
+            # Usually output cut off at max_tokens; keep the items that closed
+            data = salvage_json_items(response_text)
+            if not data:
+                raise
+            print(
+                f"Salvaged {sum(len(items) for items in data.values())} items from "
+                f"an invalid JSON response (finish reason: "
+                f"{response.choices[0].finish_reason})"
+            )
+            return model, response_text, data, False
+
+    model, response_text, data, complete = await hedged_call(
+        attempt, GENERATION_MODEL, max_tokens
+    )
+
+    # The key names GENERATION_MODEL; a fallback model's answer is not its own
+    if cache is not None and complete and model == GENERATION_MODEL:
+        cache.set(cache_key, response_text)
+    return data
+
+
+# question_config key -> (JSON array key, question model)
+QUESTION_SECTIONS: Dict[str, Tuple[str, Type[BaseModel]]] = {
+    "mcq": ("mcqs", MCQuestion),
+    "fill_blanks": ("fill_blanks", FillBlankQuestion),
+    "short": ("short", ShortQuestion),
+    "long": ("long", LongQuestion),
+}
+
+SECTION_LABELS = {
+    "mcq": "multiple choice questions",
+    "fill_blanks": "fill in the blank questions",
+    "short": "short answer questions",
+    "long": "long answer questions",
+}
+
+SECTION_NOTES = {
+    "mcq": "",
+    "fill_blanks": "",
+    "short": " Each should have 3-5 marks and 3-5 expected points.",
+    "long": " Each should have 10 marks and 6-10 expected points.",
+}
+
+SECTION_MAX_TOKENS = {"mcq": 4000, "fill_blanks": 2000, "short": 3000, "long": 3000}
+
+# Generous estimate of output tokens per question, used to pick the generation mode
+OUTPUT_TOKENS_PER_QUESTION = {"mcq": 130, "fill_blanks": 50, "short": 140, "long": 250}
+
+
+def parse_section_items(question_type: str, items: List[Dict[str, Any]]) -> List[Any]:
+    """
+    Validate the raw JSON items of one section into question models.
+    Invalid items are skipped so one bad item does not cost the section.
+    """
+    _, model = QUESTION_SECTIONS[question_type]
+
+    questions = []
+    skipped = 0
+    for item in items:
+        # Ensure MCQs have exactly 4 options
+        if not isinstance(item, dict) or (
+            question_type == "mcq" and len(item.get("options", [])) != 4
+        ):
+            skipped += 1
+            continue
+        try:
+            questions.append(model(**item))
+        except ValidationError:
+            skipped += 1
+
+    if skipped:
+        print(f"Skipped {skipped} invalid {SECTION_LABELS[question_type]}")
+    return questions
+
+
+def build_section_prompt(
+    question_type: str,
     count: int,
     subject_name: str,
     units: List[int],
     difficulty: str,
     context: str,
     custom_instructions: Optional[str] = None,
-) -> List[MCQuestion]:
-    """Generate multiple choice questions."""
-    if count <= 0:
-        return []
+    batch: Tuple[int, int] = (0, 1),
+) -> str:
+    """
+    Build the prompt asking for a single section of the paper.
 
+    batch is (index, total) when the section is split into parallel
+    sub-requests; each batch is steered towards different material.
+    """
+    key, _ = QUESTION_SECTIONS[question_type]
     prompt = build_system_prompt(
         subject_name, units, difficulty, custom_instructions, context
     )
-    prompt += f"\n\nGenerate exactly {count} multiple choice questions in the 'mcqs' array. Other arrays should be empty."
-
-    client = get_groq_client()
+    prompt += (
+        f"\n\nGenerate exactly {count} {SECTION_LABELS[question_type]} in the "
+        f"'{key}' array.{SECTION_NOTES[question_type]} Other arrays should be empty."
+    )
 
-    try:
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert educational question generator. Always output valid JSON only.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=4000,
-            response_format={"type": "json_object"},
+    index, total = batch
+    if total > 1:
+        focus = ""
+        if len(units) >= total:
+            focus = ", focusing on " + ", ".join(
+                f"Unit {u}" for u in units[index::total]
+            )
+        prompt += (
+            f" This is batch {index + 1} of {total} for this section, generated "
+            f"alongside the others, so cover different concepts{focus}."
         )
+    return prompt
 
-        response_text = response.choices[0].message.content or ""
-        cleaned_response = clean_json_response(response_text)
-        data = json.loads(cleaned_response)
 
-        mcqs = []
-        for item in data.get("mcqs", []):
-            # Ensure we have exactly 4 options
-            if len(item.get("options", [])) == 4:
-                mcqs.append(MCQuestion(**item))
+def plan_batches(question_type: str, count: int) -> List[int]:
+    """
+    Split a section's question count into sub-batches that each fit the
+    section's output token budget, as evenly as possible.
+    """
+    if count <= 0:
+        return []
 
-        return mcqs[:count]
+    per_batch = max(
+        1,
+        SECTION_MAX_TOKENS[question_type] // OUTPUT_TOKENS_PER_QUESTION[question_type],
+    )
+    batches = math.ceil(count / per_batch)
+    size, extra = divmod(count, batches)
+    return [size + (1 if i < extra else 0) for i in range(batches)]
 
-    except Exception as e:
-        print(f"Error generating MCQs: {e}")
-        return []
 
+def normalize_question_text(text: str) -> str:
+    """Normalize question text for duplicate detection."""
+    return " ".join(re.sub(r"[^\w\s]", " ", text.lower()).split())
 
-async def generate_fill_blanks(
+
+def merge_unique(batches: List[List[Any]], count: int) -> List[Any]:
+    """Merge sub-batch results, dropping repeated questions, up to count."""
+    merged = []
+    seen = set()
+    for questions in batches:
+        for question in questions:
+            key = normalize_question_text(question.question)
+            if key in seen:
+                continue
+            seen.add(key)
+            merged.append(question)
+    return merged[:count]
+
+
+async def generate_batch(
+    question_type: str,
     count: int,
     subject_name: str,
     units: List[int],
     difficulty: str,
     context: str,
     custom_instructions: Optional[str] = None,
-) -> List[FillBlankQuestion]:
-    """Generate fill in the blanks questions."""
-    if count <= 0:
-        return []
+    batch: Tuple[int, int] = (0, 1),
+) -> List[Any]:
+    """
+    Generate one sub-batch of a section.
 
-    prompt = build_system_prompt(
-        subject_name, units, difficulty, custom_instructions, context
-    )
-    prompt += f"\n\nGenerate exactly {count} fill in the blank questions in the 'fill_blanks' array. Other arrays should be empty."
+    Valid items are kept from every response; when a response comes back
+    short (invalid items, truncated output, a failed call), up to
+    LLM_REPAIR_ROUNDS follow-up calls ask for the missing count only.
+    """
+    key, _ = QUESTION_SECTIONS[question_type]
+    questions: List[Any] = []
 
-    client = get_groq_client()
+    for attempt in range(settings.LLM_REPAIR_ROUNDS + 1):
+        missing = count - len(questions)
+        if missing <= 0:
+            break
 
-    try:
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert educational question generator. Always output valid JSON only.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=2000,
-            response_format={"type": "json_object"},
+        instructions = custom_instructions
+        if questions:
+            instructions = build_avoid_instructions(
+                custom_instructions, [q.question for q in questions]
+            )
+        prompt = build_section_prompt(
+            question_type,
+            missing,
+            subject_name,
+            units,
+            difficulty,
+            context,
+            instructions,
+            batch,
         )
 
-        response_text = response.choices[0].message.content or ""
-        cleaned_response = clean_json_response(response_text)
-        data = json.loads(cleaned_response)
+        try:
+            data = await request_json_completion(
+                prompt, max_tokens=SECTION_MAX_TOKENS[question_type]
+            )
+            items = data.get(key, [])
+            if not isinstance(items, list):
+                items = []
+            questions = merge_unique(
+                [questions, parse_section_items(question_type, items)], count
+            )
+        except Exception as e:
+            print(f"Error generating {SECTION_LABELS[question_type]}: {e}")
 
-        blanks = []
-        for item in data.get("fill_blanks", []):
-            blanks.append(FillBlankQuestion(**item))
+        if attempt and len(questions) < count:
+            print(
+                f"Repair round {attempt}: {len(questions)}/{count} "
+                f"{SECTION_LABELS[question_type]}"
+            )
 
-        return blanks[:count]
+    return questions
 
-    except Exception as e:
-        print(f"Error generating fill blanks: {e}")
+
+async def generate_section(
+    question_type: str,
+    count: int,
+    subject_name: str,
+    units: List[int],
+    difficulty: str,
+    context: str,
+    custom_instructions: Optional[str] = None,
+) -> List[Any]:
+    """
+    Generate the questions of a single type.
+
+    Counts larger than one response can hold are split by plan_batches into
+    sub-requests that run concurrently (at most LLM_BATCH_CONCURRENCY per
+    section) and are merged without duplicates.
+    """
+    batches = plan_batches(question_type, count)
+    if not batches:
         return []
 
+    semaphore = asyncio.Semaphore(settings.LLM_BATCH_CONCURRENCY)
+
+    async def run_batch(index: int, size: int) -> List[Any]:
+        async with semaphore:
+            return await generate_batch(
+                question_type,
+                size,
+                subject_name,
+                units,
+                difficulty,
+                context,
+                custom_instructions,
+                (index, len(batches)),
+            )
+
+    results = await asyncio.gather(
+        *(run_batch(index, size) for index, size in enumerate(batches))
+    )
+    return merge_unique(list(results), count)
+
+
+async def generate_mcqs(
+    count: int,
+    subject_name: str,
+    units: List[int],
+    difficulty: str,
+    context: str,
+    custom_instructions: Optional[str] = None,
+) -> List[MCQuestion]:
+    """Generate multiple choice questions."""
+    return await generate_section(
+        "mcq", count, subject_name, units, difficulty, context, custom_instructions
+    )
+
+
+async def generate_fill_blanks(
+    count: int,
+    subject_name: str,
+    units: List[int],
+    difficulty: str,
+    context: str,
+    custom_instructions: Optional[str] = None,
+) -> List[FillBlankQuestion]:
+    """Generate fill in the blanks questions."""
+    return await generate_section(
+        "fill_blanks",
+        count,
+        subject_name,
+        units,
+        difficulty,
+        context,
+        custom_instructions,
+    )
+
 
 async def generate_short_questions(
     count: int,
@@ -279,93 +541,349 @@ async def generate_short_questions(
     custom_instructions: Optional[str] = None,
 ) -> List[ShortQuestion]:
     """Generate short answer questions."""
-    if count <= 0:
-        return []
+    return await generate_section(
+        "short", count, subject_name, units, difficulty, context, custom_instructions
+    )
 
+
+async def generate_long_questions(
+    count: int,
+    subject_name: str,
+    units: List[int],
+    difficulty: str,
+    context: str,
+    custom_instructions: Optional[str] = None,
+) -> List[LongQuestion]:
+    """Generate long answer questions."""
+    return await generate_section(
+        "long", count, subject_name, units, difficulty, context, custom_instructions
+    )
+
+
+def estimate_output_tokens(question_config: Dict[str, int]) -> int:
+    """Estimate the completion tokens needed for a whole paper."""
+    return sum(
+        max(question_config.get(question_type, 0), 0) * tokens
+        for question_type, tokens in OUTPUT_TOKENS_PER_QUESTION.items()
+    )
+
+
+def choose_generation_mode(
+    question_config: Dict[str, int],
+) -> Literal["single", "per_section"]:
+    """
+    Use one call for the whole paper when it fits the output budget.
+
+    A single call sends the reference context and JSON schema once instead of
+    once per section. Papers with one section, or too many questions for one
+    response, keep the per-section calls.
+    """
+    requested = [t for t in QUESTION_SECTIONS if question_config.get(t, 0) > 0]
+    if len(requested) < 2:
+        return "per_section"
+
+    if (
+        estimate_output_tokens(question_config)
+        > settings.LLM_SINGLE_CALL_MAX_OUTPUT_TOKENS
+    ):
+        return "per_section"
+
+    return "single"
+
+
+async def generate_all_sections(
+    question_config: Dict[str, int],
+    subject_name: str,
+    units: List[int],
+    difficulty: str,
+    context: str,
+    custom_instructions: Optional[str] = None,
+) -> Dict[str, List[Any]]:
+    """
+    Generate every requested section with one structured LLM call.
+
+    Returns the valid questions per question type, which may fall short of
+    the requested counts; the caller tops up the shortfall per section.
+    """
     prompt = build_system_prompt(
         subject_name, units, difficulty, custom_instructions, context
     )
-    prompt += f"\n\nGenerate exactly {count} short answer questions in the 'short' array. Each should have 3-5 marks and 3-5 expected points. Other arrays should be empty."
 
-    client = get_groq_client()
+    requested_lines = []
+    for question_type, (key, _) in QUESTION_SECTIONS.items():
+        count = question_config.get(question_type, 0)
+        if count > 0:
+            requested_lines.append(
+                f"- exactly {count} {SECTION_LABELS[question_type]} in the "
+                f"'{key}' array.{SECTION_NOTES[question_type]}"
+            )
+
+    prompt += (
+        "\n\nGenerate all of the following in one JSON object:\n"
+        + "\n".join(requested_lines)
+        + "\nArrays for question types not listed should be empty."
+    )
 
     try:
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert educational question generator. Always output valid JSON only.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=3000,
-            response_format={"type": "json_object"},
+        data = await request_json_completion(
+            prompt, max_tokens=settings.LLM_SINGLE_CALL_MAX_OUTPUT_TOKENS
         )
+    except Exception as e:
+        print(f"Error generating all sections in one call: {e}")
+        return {}
+
+    sections: Dict[str, List[Any]] = {}
+    for question_type, (key, _) in QUESTION_SECTIONS.items():
+        count = question_config.get(question_type, 0)
+        items = data.get(key, [])
+        if count > 0 and isinstance(items, list):
+            sections[question_type] = merge_unique(
+                [parse_section_items(question_type, items)], count
+            )
+
+    return sections
 
-        response_text = response.choices[0].message.content or ""
-        cleaned_response = clean_json_response(response_text)
-        data = json.loads(cleaned_response)
 
-        shorts = []
-        for item in data.get("short", []):
-            shorts.append(ShortQuestion(**item))
+# Chunks retrieved per paper, split across the selected units. More are
+# retrieved than fit in the context so MMR has room to pick diverse ones.
+RAG_TOTAL_CHUNKS = 30
+RAG_MIN_CHUNKS_PER_UNIT = 5
 
-        return shorts[:count]
+
+async def retrieve_context(
+    subject_id: str, subject_name: str, units: Optional[List[int]] = None
+) -> str:
+    """
+    Retrieve reference content for a paper via RAG ("" if unavailable).
+
+    With units, each selected unit is searched separately and concurrently
+    and the context budget is split across them, so unselected units do not
+    take up prompt tokens. Falls back to a subject-wide search.
+    """
+    # Build search query for RAG
+    search_query = f"key concepts definitions important topics from {subject_name}"
+    context = ""
+
+    try:
+        chunk_count = 0
+        if units:
+            limit_per_unit = max(
+                math.ceil(RAG_TOTAL_CHUNKS / len(units)), RAG_MIN_CHUNKS_PER_UNIT
+            )
+            try:
+                chunks_by_unit = await search_chunks_by_units(
+                    {unit: f"{search_query} Unit {unit}" for unit in units},
+                    subject_id=subject_id,
+                    limit_per_unit=limit_per_unit,
+                    threshold=0.3,
+                )
+                chunk_count = sum(len(chunks) for chunks in chunks_by_unit.values())
+                context = build_unit_context(chunks_by_unit)
+            except Exception as e:
+                print(f"Error retrieving per-unit context: {e}")
+
+        if not context:
+            # Retrieve relevant chunks using RAG
+            chunks = await search_similar_chunks(
+                query=search_query, subject_id=subject_id, limit=20, threshold=0.3
+            )
+            chunk_count = len(chunks)
+            context = build_context_from_chunks(chunks)
+
+        if context:
+            print(
+                f"Retrieved {chunk_count} chunks, "
+                f"context tokens: {count_tokens(context)}"
+            )
+        else:
+            print(
+                f"No chunks found for subject {subject_id}, proceeding without context"
+            )
 
     except Exception as e:
-        print(f"Error generating short questions: {e}")
-        return []
+        print(f"Error retrieving context via RAG: {e}")
+        print("Proceeding without RAG context")
 
+    return context
 
-async def generate_long_questions(
-    count: int,
+
+async def generate_sections(
+    question_config: Dict[str, int],
     subject_name: str,
     units: List[int],
     difficulty: str,
     context: str,
     custom_instructions: Optional[str] = None,
-) -> List[LongQuestion]:
-    """Generate long answer questions."""
-    if count <= 0:
-        return []
+) -> Dict[str, List[Any]]:
+    """
+    Generate the requested counts per question type with the LLM, using a
+    single call or per-section calls as chosen by choose_generation_mode.
+    """
+    sections: Dict[str, List[Any]] = {}
+    if choose_generation_mode(question_config) == "single":
+        sections = await generate_all_sections(
+            question_config,
+            subject_name,
+            units,
+            difficulty,
+            context,
+            custom_instructions,
+        )
 
-    prompt = build_system_prompt(
-        subject_name, units, difficulty, custom_instructions, context
+    # Generate remaining question types concurrently (all of them in
+    # per-section mode, or whatever the single call did not deliver)
+    shortfall = {
+        question_type: question_config.get(question_type, 0)
+        - len(sections.get(question_type, []))
+        for question_type in QUESTION_SECTIONS
+    }
+    existing = [q.question for questions in sections.values() for q in questions]
+    if existing:
+        custom_instructions = build_avoid_instructions(custom_instructions, existing)
+
+    # Sections still being generated, for progress reports
+    in_progress = [t for t in QUESTION_SECTIONS if shortfall[t] > 0]
+    if in_progress:
+        report_progress(GENERATING, list(in_progress))
+
+    async def run_section(question_type: str) -> List[Any]:
+        try:
+            return await generate_section(
+                question_type,
+                shortfall[question_type],
+                subject_name,
+                units,
+                difficulty,
+                context,
+                custom_instructions,
+            )
+        finally:
+            if question_type in in_progress:
+                in_progress.remove(question_type)
+                if in_progress:
+                    report_progress(GENERATING, list(in_progress))
+
+    results = await asyncio.gather(
+        *(run_section(question_type) for question_type in QUESTION_SECTIONS),
+        return_exceptions=True,
     )
-    prompt += f"\n\nGenerate exactly {count} long answer questions in the 'long' array. Each should have 10 marks and 6-10 expected points. Other arrays should be empty."
 
-    client = get_groq_client()
+    # Handle results (some may be exceptions)
+    for question_type, result in zip(QUESTION_SECTIONS, results):
+        if not isinstance(result, Exception):
+            sections.setdefault(question_type, []).extend(result)
 
-    try:
-        response = client.chat.completions.create(
-            model="llama-3.3-70b-versatile",
-            messages=[
-                {
-                    "role": "system",
-                    "content": "You are an expert educational question generator. Always output valid JSON only.",
-                },
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.7,
-            max_tokens=3000,
-            response_format={"type": "json_object"},
-        )
+    return sections
 
-        response_text = response.choices[0].message.content or ""
-        cleaned_response = clean_json_response(response_text)
-        data = json.loads(cleaned_response)
 
-        longs = []
-        for item in data.get("long", []):
-            longs.append(LongQuestion(**item))
+async def assemble_from_bank(
+    subject_id: str,
+    units: List[int],
+    difficulty: str,
+    question_config: Dict[str, int],
+) -> Dict[str, List[Any]]:
+    """Fill as much of question_config as possible from the question bank."""
+    # Unknown section types are ignored, as generation ignores them
+    known_config = {
+        question_type: count
+        for question_type, count in question_config.items()
+        if question_type in QUESTION_SECTIONS
+    }
+    bank = await fetch_bank_questions(subject_id, units, difficulty, known_config)
+
+    sections: Dict[str, List[Any]] = {}
+    for question_type, items in bank.items():
+        try:
+            sections[question_type] = parse_section_items(question_type, items)
+        except Exception as e:
+            label = SECTION_LABELS.get(question_type, question_type)
+            print(f"Error loading banked {label}: {e}")
+    return sections
 
-        return longs[:count]
 
+# When two questions cover the same concept, keep the one worth more marks
+DEDUP_PRIORITY = ["long", "short", "mcq", "fill_blanks"]
+
+# Existing questions listed in a regeneration prompt, to keep it short
+MAX_AVOID_QUESTIONS = 40
+
+
+def build_avoid_instructions(
+    custom_instructions: Optional[str], existing: List[str]
+) -> str:
+    """Extend custom instructions with questions the model must not repeat."""
+    avoid = "\n".join(f"- {text[:150]}" for text in existing[:MAX_AVOID_QUESTIONS])
+    instructions = (
+        f"Do not repeat or rephrase any of these existing questions:\n{avoid}"
+    )
+    if custom_instructions:
+        return f"{custom_instructions}\n{instructions}"
+    return instructions
+
+
+async def deduplicate_paper(
+    sections: Dict[str, List[Any]],
+    question_config: Dict[str, int],
+    subject_id: str,
+    subject_name: str,
+    units: List[int],
+    difficulty: str,
+    context: str,
+    custom_instructions: Optional[str] = None,
+) -> Tuple[Dict[str, List[Any]], int]:
+    """
+    Drop near-duplicate questions across sections and batches, then
+    regenerate the shortfall (up to DEDUP_REGENERATE_ROUNDS times).
+
+    Returns the deduplicated sections and the number of questions dropped.
+    """
+    try:
+        sections, dropped = await deduplicate_questions(
+            sections, settings.DEDUP_SIMILARITY_THRESHOLD, DEDUP_PRIORITY
+        )
     except Exception as e:
-        print(f"Error generating long questions: {e}")
-        return []
+        print(f"Error removing near-duplicate questions: {e}")
+        return sections, 0
+
+    for _ in range(settings.DEDUP_REGENERATE_ROUNDS):
+        shortfall = {
+            question_type: max(
+                question_config.get(question_type, 0) - len(sections[question_type]),
+                0,
+            )
+            for question_type in QUESTION_SECTIONS
+        }
+        if not any(shortfall.values()):
+            break
+
+        if not context:
+            context = await retrieve_context(subject_id, subject_name, units)
+        existing = [q.question for questions in sections.values() for q in questions]
+        replacements = await generate_sections(
+            shortfall,
+            subject_name,
+            units,
+            difficulty,
+            context,
+            build_avoid_instructions(custom_instructions, existing),
+        )
+
+        try:
+            sections, more = await deduplicate_questions(
+                {
+                    question_type: sections[question_type]
+                    + replacements.get(question_type, [])
+                    for question_type in QUESTION_SECTIONS
+                },
+                settings.DEDUP_SIMILARITY_THRESHOLD,
+                DEDUP_PRIORITY,
+            )
+            dropped += more
+        except Exception as e:
+            print(f"Error removing near-duplicate questions: {e}")
+            break
+
+    return sections, dropped
 
 
 async def generate_questions(
@@ -375,6 +893,8 @@ async def generate_questions(
     difficulty: str,
     question_config: Dict[str, int],
     custom_instructions: Optional[str] = None,
+    fresh: bool = False,
+    use_question_bank: bool = False,
 ) -> GeneratedQuestions:
     """
     Main function to generate all types of questions for a paper.
@@ -386,71 +906,414 @@ async def generate_questions(
         difficulty: Difficulty level (easy, medium, hard)
         question_config: Dict with mcq, fill_blanks, short, long counts
         custom_instructions: Optional custom instructions
+        fresh: Skip cached LLM responses and generate new questions
+        use_question_bank: Take questions from the bank first and only
+            generate the shortfall
 
     Returns:
         GeneratedQuestions object with all generated questions
     """
 
-    # Build search query for RAG
-    search_query = f"key concepts definitions important topics from {subject_name}"
-    context = ""
+    banked: Dict[str, List[Any]] = {}
+    if use_question_bank:
+        banked = await assemble_from_bank(
+            subject_id, units, difficulty, question_config
+        )
 
-    try:
-        # Retrieve relevant chunks using RAG
-        chunks = await search_similar_chunks(
-            query=search_query, subject_id=subject_id, limit=20, threshold=0.3
+    remaining_config = {
+        question_type: max(
+            question_config.get(question_type, 0) - len(banked.get(question_type, [])),
+            0,
         )
+        for question_type in QUESTION_SECTIONS
+    }
+    mode = choose_generation_mode(remaining_config)
 
-        if chunks:
-            context = build_context_from_chunks(chunks)
-            print(f"Retrieved {len(chunks)} chunks, context length: {len(context)}")
-        else:
-            print(
-                f"No chunks found for subject {subject_id}, proceeding without context"
+    context = ""
+    generated: Dict[str, List[Any]] = {}
+    duplicates_removed = 0
+    with track_usage() as usage, bypass_cache(fresh):
+        if any(remaining_config.values()):
+            report_progress(RETRIEVING)
+            context = await retrieve_context(subject_id, subject_name, units)
+            generated = await generate_sections(
+                remaining_config,
+                subject_name,
+                units,
+                difficulty,
+                context,
+                custom_instructions,
             )
 
-    except Exception as e:
-        print(f"Error retrieving context via RAG: {e}")
-        print("Proceeding without RAG context")
+        sections = {
+            question_type: banked.get(question_type, [])
+            + generated.get(question_type, [])
+            for question_type in QUESTION_SECTIONS
+        }
+        if settings.DEDUP_ENABLED:
+            report_progress(DEDUPLICATING)
+            sections, duplicates_removed = await deduplicate_paper(
+                sections,
+                question_config,
+                subject_id,
+                subject_name,
+                units,
+                difficulty,
+                context,
+                custom_instructions,
+            )
 
-    # Generate all question types concurrently
-    import asyncio
+    banked_ids = {id(q) for questions in banked.values() for q in questions}
+    schedule_save_to_bank(
+        subject_id,
+        difficulty,
+        {
+            question_type: [q for q in questions if id(q) not in banked_ids]
+            for question_type, questions in sections.items()
+        },
+    )
 
-    mcq_count = question_config.get("mcq", 0)
-    fill_blanks_count = question_config.get("fill_blanks", 0)
-    short_count = question_config.get("short", 0)
-    long_count = question_config.get("long", 0)
+    bank_questions = sum(len(questions) for questions in banked.values())
+    generation_usage = GenerationUsage(
+        mode=mode,
+        llm_calls=usage.calls,
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens,
+        bank_questions=bank_questions,
+        duplicates_removed=duplicates_removed,
+    )
+    print(
+        f"Generation usage ({mode}): {bank_questions} questions from the bank, "
+        f"{usage.calls} LLM calls, {usage.prompt_tokens} prompt tokens, "
+        f"{usage.completion_tokens} completion tokens, "
+        f"{duplicates_removed} near-duplicates removed"
+    )
 
-    results = await asyncio.gather(
-        generate_mcqs(
-            mcq_count, subject_name, units, difficulty, context, custom_instructions
-        ),
-        generate_fill_blanks(
-            fill_blanks_count,
-            subject_name,
-            units,
-            difficulty,
-            context,
-            custom_instructions,
-        ),
-        generate_short_questions(
-            short_count, subject_name, units, difficulty, context, custom_instructions
-        ),
-        generate_long_questions(
-            long_count, subject_name, units, difficulty, context, custom_instructions
-        ),
-        return_exceptions=True,
+    return GeneratedQuestions(
+        mcqs=sections["mcq"],
+        fill_blanks=sections["fill_blanks"],
+        short=sections["short"],
+        long=sections["long"],
+        usage=generation_usage,
     )
 
-    # Handle results (some may be exceptions)
-    mcqs = results[0] if not isinstance(results[0], Exception) else []
-    fill_blanks = results[1] if not isinstance(results[1], Exception) else []
-    shorts = results[2] if not isinstance(results[2], Exception) else []
-    longs = results[3] if not isinstance(results[3], Exception) else []
 
-    return GeneratedQuestions(
-        mcqs=mcqs,  # type: ignore
-        fill_blanks=fill_blanks,  # type: ignore
-        short=shorts,  # type: ignore
-        long=longs,  # type: ignore
+# Labels of the sets generated by generate_question_sets
+SET_LABELS = "ABCDEF"
+
+
+def build_set_instructions(
+    custom_instructions: Optional[str], set_index: int, set_count: int
+) -> str:
+    """Tell the model which set it is writing, so the sets differ."""
+    instructions = (
+        f"This is Set {SET_LABELS[set_index]} of {set_count} equivalent sets of "
+        f"this paper. Cover the same units at the same difficulty, but use "
+        f"different questions from the other sets."
+    )
+    if custom_instructions:
+        return f"{custom_instructions}\n{instructions}"
+    return instructions
+
+
+async def deduplicate_sets(
+    sets: List[Dict[str, List[Any]]],
+) -> Tuple[List[Dict[str, List[Any]]], int]:
+    """
+    Remove questions that repeat (near-duplicates when DEDUP_ENABLED,
+    otherwise identical text) within or across sets. Earlier sets keep
+    their questions.
+    """
+    keyed = {
+        f"{index}:{question_type}": questions
+        for index, sections in enumerate(sets)
+        for question_type, questions in sections.items()
+    }
+    priority = [
+        f"{index}:{question_type}"
+        for index in range(len(sets))
+        for question_type in DEDUP_PRIORITY
+    ]
+
+    deduplicated = None
+    if settings.DEDUP_ENABLED:
+        try:
+            deduplicated, dropped = await deduplicate_questions(
+                keyed, settings.DEDUP_SIMILARITY_THRESHOLD, priority
+            )
+        except Exception as e:
+            print(f"Error removing near-duplicate questions across sets: {e}")
+
+    if deduplicated is None:
+        seen = set()
+        deduplicated, dropped = {}, 0
+        for key in priority:
+            deduplicated[key] = []
+            for question in keyed.get(key, []):
+                text = normalize_question_text(question.question)
+                if text in seen:
+                    dropped += 1
+                    continue
+                seen.add(text)
+                deduplicated[key].append(question)
+
+    return [
+        {
+            question_type: deduplicated.get(f"{index}:{question_type}", [])
+            for question_type in QUESTION_SECTIONS
+        }
+        for index in range(len(sets))
+    ], dropped
+
+
+async def generate_question_sets(
+    subject_id: str,
+    subject_name: str,
+    units: List[int],
+    difficulty: str,
+    question_config: Dict[str, int],
+    set_count: int,
+    custom_instructions: Optional[str] = None,
+    fresh: bool = False,
+) -> List[GeneratedQuestions]:
+    """
+    Generate set_count equivalent but different sets of one paper.
+
+    Reference content is retrieved once and shared by all sets, which are
+    generated concurrently. Questions repeated within or across sets are
+    removed and the shortfall regenerated (up to DEDUP_REGENERATE_ROUNDS
+    times) with the questions of every set listed to avoid. The question
+    bank is not used, as it would hand the same questions to every set.
+    """
+    if not 1 <= set_count <= len(SET_LABELS):
+        raise ValueError(f"set_count must be between 1 and {len(SET_LABELS)}")
+
+    def shortfall_of(sections: Dict[str, List[Any]]) -> Dict[str, int]:
+        return {
+            question_type: max(
+                question_config.get(question_type, 0) - len(sections[question_type]),
+                0,
+            )
+            for question_type in QUESTION_SECTIONS
+        }
+
+    with track_usage() as usage, bypass_cache(fresh):
+        report_progress(RETRIEVING)
+        context = await retrieve_context(subject_id, subject_name, units)
+
+        generated = await asyncio.gather(
+            *(
+                generate_sections(
+                    question_config,
+                    subject_name,
+                    units,
+                    difficulty,
+                    context,
+                    build_set_instructions(custom_instructions, index, set_count),
+                )
+                for index in range(set_count)
+            )
+        )
+        sets = [
+            {t: sections.get(t, []) for t in QUESTION_SECTIONS}
+            for sections in generated
+        ]
+
+        report_progress(DEDUPLICATING)
+        sets, duplicates_removed = await deduplicate_sets(sets)
+
+        for _ in range(settings.DEDUP_REGENERATE_ROUNDS):
+            shortfalls = [shortfall_of(sections) for sections in sets]
+            if not any(any(shortfall.values()) for shortfall in shortfalls):
+                break
+
+            existing = [
+                q.question
+                for sections in sets
+                for questions in sections.values()
+                for q in questions
+            ]
+            replacements = await asyncio.gather(
+                *(
+                    generate_sections(
+                        shortfall,
+                        subject_name,
+                        units,
+                        difficulty,
+                        context,
+                        build_avoid_instructions(
+                            build_set_instructions(
+                                custom_instructions, index, set_count
+                            ),
+                            existing,
+                        ),
+                    )
+                    for index, shortfall in enumerate(shortfalls)
+                )
+            )
+            sets, dropped = await deduplicate_sets(
+                [
+                    {t: sections[t] + extra.get(t, []) for t in QUESTION_SECTIONS}
+                    for sections, extra in zip(sets, replacements)
+                ]
+            )
+            duplicates_removed += dropped
+
+    for sections in sets:
+        schedule_save_to_bank(subject_id, difficulty, sections)
+
+    generation_usage = GenerationUsage(
+        mode=choose_generation_mode(question_config),
+        llm_calls=usage.calls,
+        prompt_tokens=usage.prompt_tokens,
+        completion_tokens=usage.completion_tokens,
+        bank_questions=0,
+        duplicates_removed=duplicates_removed,
+    )
+    print(
+        f"Generated {set_count} sets: {usage.calls} LLM calls, "
+        f"{usage.prompt_tokens} prompt tokens, "
+        f"{usage.completion_tokens} completion tokens, "
+        f"{duplicates_removed} duplicates removed"
+    )
+
+    return [
+        GeneratedQuestions(
+            mcqs=sections["mcq"],
+            fill_blanks=sections["fill_blanks"],
+            short=sections["short"],
+            long=sections["long"],
+            usage=generation_usage,
+        )
+        for sections in sets
+    ]
+
+
+async def stream_section(
+    question_type: str,
+    count: int,
+    subject_name: str,
+    units: List[int],
+    difficulty: str,
+    context: str,
+    custom_instructions: Optional[str] = None,
+    batch: Tuple[int, int] = (0, 1),
+) -> AsyncIterator[Any]:
+    """
+    Stream one section (or one sub-batch of it), yielding each question as
+    soon as the model closes its JSON object. Invalid items are skipped
+    instead of failing the section.
+    """
+    if count <= 0:
+        return
+
+    key, _ = QUESTION_SECTIONS[question_type]
+    prompt = build_section_prompt(
+        question_type,
+        count,
+        subject_name,
+        units,
+        difficulty,
+        context,
+        custom_instructions,
+        batch,
     )
+
+    # JSON mode is not used here as it does not support streaming; the
+    # parser skips anything the model writes around the JSON object.
+    stream = stream_chat_completion(
+        model=GENERATION_MODEL,
+        messages=[
+            {"role": "system", "content": GENERATION_SYSTEM_MESSAGE},
+            {"role": "user", "content": prompt},
+        ],
+        temperature=0.7,
+        max_tokens=SECTION_MAX_TOKENS[question_type],
+    )
+    parser = IncrementalJSONParser()
+    emitted = 0
+
+    try:
+        async for delta in stream:
+            for item_key, item in parser.feed(delta):
+                if item_key != key:
+                    continue
+                for question in parse_section_items(question_type, [item]):
+                    yield question
+                    emitted += 1
+                    if emitted >= count:
+                        return
+    finally:
+        await stream.aclose()
+
+
+async def stream_questions(
+    subject_id: str,
+    subject_name: str,
+    units: List[int],
+    difficulty: str,
+    question_config: Dict[str, int],
+    custom_instructions: Optional[str] = None,
+) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming counterpart of generate_questions.
+
+    All sections (and their sub-batches from plan_batches) stream
+    concurrently and (question_type, question) pairs are yielded in the order
+    the questions complete, skipping duplicates across batches.
+    """
+    context = await retrieve_context(subject_id, subject_name, units)
+
+    queue: asyncio.Queue = asyncio.Queue()
+    batch_done = object()
+
+    async def pump(question_type: str, size: int, batch: Tuple[int, int]) -> None:
+        try:
+            async for question in stream_section(
+                question_type,
+                size,
+                subject_name,
+                units,
+                difficulty,
+                context,
+                custom_instructions,
+                batch,
+            ):
+                await queue.put((question_type, question))
+        except Exception as e:
+            print(f"Error streaming {SECTION_LABELS[question_type]}: {e}")
+        finally:
+            await queue.put((question_type, batch_done))
+
+    tasks = []
+    for question_type in QUESTION_SECTIONS:
+        batches = plan_batches(question_type, question_config.get(question_type, 0))
+        for index, size in enumerate(batches):
+            tasks.append(
+                asyncio.create_task(pump(question_type, size, (index, len(batches))))
+            )
+
+    seen = {question_type: set() for question_type in QUESTION_SECTIONS}
+    streamed: Dict[str, List[Any]] = {t: [] for t in QUESTION_SECTIONS}
+    remaining = len(tasks)
+    try:
+        while remaining:
+            question_type, question = await queue.get()
+            if question is batch_done:
+                remaining -= 1
+                continue
+
+            key = normalize_question_text(question.question)
+            section_full = len(streamed[question_type]) >= question_config.get(
+                question_type, 0
+            )
+            if key in seen[question_type] or section_full:
+                continue
+            seen[question_type].add(key)
+            streamed[question_type].append(question)
+            yield question_type, question
+
+        schedule_save_to_bank(subject_id, difficulty, streamed)
+    finally:
+        for task in tasks:
+            task.cancel()
@@ -0,0 +1,149 @@
+import json
+from typing import Any, Dict, List, Optional
+import numpy as np
+from app.services.tokenizer import count_tokens
+
+# Chunks are split with a 200-char overlap; allow some slack when matching it
+MAX_CHUNK_OVERLAP = 400
+
+
+def parse_embedding(value: Any) -> Optional[List[float]]:
+    """pgvector columns arrive from PostgREST as "[0.1,0.2,...]" strings."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return json.loads(value)
+    return list(value)
+
+
+def strip_overlap(previous: str, following: str) -> str:
+    """Drop the prefix of following that repeats the end of previous."""
+    limit = min(len(previous), len(following), MAX_CHUNK_OVERLAP)
+    for size in range(limit, 0, -1):
+        if previous.endswith(following[:size]):
+            return following[size:]
+    return following
+
+
+def mmr_order(
+    relevance: np.ndarray, vectors: Optional[np.ndarray], diversity_lambda: float
+) -> List[int]:
+    """
+    Order candidates by maximal marginal relevance.
+
+    Each step picks argmax(lambda * relevance - (1 - lambda) * max similarity
+    to the already picked chunks); the similarity to the latest pick is one
+    matrix-vector product over all candidates. Without vectors the order is
+    plain relevance.
+    """
+    count = len(relevance)
+    if vectors is None or count < 2:
+        return [int(i) for i in np.argsort(-relevance)]
+
+    unit = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    max_similarity = np.full(count, -np.inf)
+    available = np.ones(count, dtype=bool)
+    order: List[int] = []
+
+    for _ in range(count):
+        redundancy = np.where(np.isfinite(max_similarity), max_similarity, 0.0)
+        scores = diversity_lambda * relevance - (1 - diversity_lambda) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        order.append(best)
+        available[best] = False
+        max_similarity = np.maximum(max_similarity, unit @ unit[best])
+
+    return order
+
+
+def chunk_unit(chunk: Dict[str, Any]) -> Any:
+    metadata = chunk.get("metadata") or {}
+    return metadata.get("unit_number", metadata.get("unit", "Unknown"))
+
+
+def build_mmr_context(
+    chunks: List[Dict[str, Any]], max_tokens: int, diversity_lambda: float
+) -> str:
+    """
+    Select chunks by MMR until the token budget is spent, then merge
+    adjacent chunks of the same document into one passage without their
+    repeated overlap.
+
+    A chunk that directly follows an already selected chunk only costs the
+    tokens of its non-overlapping text.
+    """
+    if not chunks or max_tokens <= 0:
+        return ""
+
+    relevance = np.array([c.get("similarity", 0.0) for c in chunks], dtype=np.float32)
+    embeddings = [parse_embedding(c.get("embedding")) for c in chunks]
+    vectors = None
+    if all(e is not None for e in embeddings):
+        vectors = np.asarray(embeddings, dtype=np.float32)
+
+    def position(chunk: Dict[str, Any]) -> Optional[tuple]:
+        if chunk.get("document_id") is None or chunk.get("chunk_index") is None:
+            return None
+        return (chunk["document_id"], chunk["chunk_index"])
+
+    selected: Dict[int, str] = {}  # chunk number -> text it contributes
+    by_position = {position(c): i for i, c in enumerate(chunks) if position(c)}
+    used_tokens = 0
+
+    for i in mmr_order(relevance, vectors, diversity_lambda):
+        chunk = chunks[i]
+        text = chunk.get("content", "")
+        header = f"[Unit {chunk_unit(chunk)}] "
+
+        pos = position(chunk)
+        previous = by_position.get((pos[0], pos[1] - 1)) if pos else None
+        following = by_position.get((pos[0], pos[1] + 1)) if pos else None
+        if previous in selected:
+            text = strip_overlap(chunks[previous].get("content", ""), text)
+            header = ""
+        if following in selected:
+            header = ""
+
+        cost = count_tokens(header + text)
+        if used_tokens + cost > max_tokens:
+            continue
+        selected[i] = text
+        used_tokens += cost
+
+    return assemble_passages(chunks, selected)
+
+
+def assemble_passages(chunks: List[Dict[str, Any]], selected: Dict[int, str]) -> str:
+    """Join selected chunks into passages, merging runs of adjacent chunks."""
+    passages: List[tuple] = []  # (unit, best relevance, text)
+    ordered = sorted(
+        selected,
+        key=lambda i: (
+            str(chunks[i].get("document_id")),
+            chunks[i].get("chunk_index") or 0,
+            i,
+        ),
+    )
+
+    run: List[int] = []
+    for i in ordered + [None]:
+        if run and i is not None and chunks[i].get("document_id") is not None:
+            last = chunks[run[-1]]
+            if (
+                chunks[i].get("document_id") == last.get("document_id")
+                and chunks[i].get("chunk_index") == (last.get("chunk_index") or 0) + 1
+            ):
+                run.append(i)
+                continue
+
+        if run:
+            text = chunks[run[0]].get("content", "")
+            for j in run[1:]:
+                text += strip_overlap(text, chunks[j].get("content", ""))
+            best = max(chunks[j].get("similarity", 0.0) for j in run)
+            passages.append((str(chunk_unit(chunks[run[0]])), -best, text))
+        run = [i] if i is not None else []
+
+    passages.sort(key=lambda p: (p[0], p[1]))
+    return "\n\n".join(f"[Unit {unit}] {text}" for unit, _, text in passages)
@@ -0,0 +1,62 @@
+from typing import Any, Dict, List, Tuple
+import numpy as np
+from app.services.embedding_worker import embed_texts
+
+
+def near_duplicate_mask(vectors: np.ndarray, threshold: float) -> np.ndarray:
+    """
+    Greedy near-duplicate filter over row vectors.
+
+    Items are considered in order; an item is dropped when its cosine
+    similarity to an earlier kept item is at or above threshold. The
+    similarity matrix is computed in one matrix product and each step only
+    updates a boolean row, so hundreds of items take well under a millisecond.
+    """
+    count = len(vectors)
+    if count < 2:
+        return np.ones(count, dtype=bool)
+
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    unit = vectors / np.maximum(norms, 1e-12)
+    duplicate_of = (unit @ unit.T) >= threshold
+
+    keep = np.ones(count, dtype=bool)
+    for i in range(count - 1):
+        if keep[i]:
+            keep[i + 1 :] &= ~duplicate_of[i, i + 1 :]
+    return keep
+
+
+async def deduplicate_questions(
+    sections: Dict[str, List[Any]],
+    threshold: float,
+    priority: List[str],
+) -> Tuple[Dict[str, List[Any]], int]:
+    """
+    Remove near-duplicate questions across all sections of a paper.
+
+    All question texts are embedded in one request to the embedding worker.
+    When two questions cover the same concept, the one from the section
+    earlier in priority (and, within a section, the earlier question) is kept.
+
+    Returns the filtered sections and the number of questions dropped.
+    """
+    ordered: List[Tuple[str, Any]] = [
+        (question_type, question)
+        for question_type in priority
+        for question in sections.get(question_type, [])
+    ]
+    if len(ordered) < 2:
+        return sections, 0
+
+    vectors = await embed_texts([question.question for _, question in ordered])
+    keep = near_duplicate_mask(np.asarray(vectors, dtype=np.float32), threshold)
+
+    deduplicated: Dict[str, List[Any]] = {
+        question_type: [] for question_type in sections
+    }
+    for (question_type, question), kept in zip(ordered, keep):
+        if kept:
+            deduplicated[question_type].append(question)
+
+    return deduplicated, int(len(ordered) - keep.sum())
@@ -0,0 +1,151 @@
+import os
+from typing import List, Optional, Tuple
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from app.core.config import settings
+
+# Embedding backends (EMBEDDING_BACKEND); all produce the same 384-dim vectors
+HUGGINGFACE = "huggingface"
+ONNX = "onnx"
+BACKENDS = (HUGGINGFACE, ONNX)
+
+# ONNX exports published in the model repository, next to the PyTorch weights
+ONNX_MODEL_FILE = "onnx/model.onnx"
+ONNX_QUANTIZED_MODEL_FILE = "onnx/model_quint8_avx2.onnx"
+TOKENIZER_FILE = "tokenizer.json"
+
+# Word pieces per text, as sentence-transformers truncates all-MiniLM-L6-v2
+MAX_SEQUENCE_LENGTH = 256
+
+# Texts per inference call; sorted by length so each call pads little
+ONNX_BATCH_SIZE = 32
+
+
+class OnnxEmbeddings(Embeddings):
+    """
+    The sentence-transformers pipeline of all-MiniLM-L6-v2 on ONNX Runtime:
+    BERT encoder, mean pooling over the attention mask, L2 normalization.
+    Needs neither torch nor sentence-transformers at run time.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        quantized: bool = False,
+        model_dir: Optional[str] = None,
+        threads: int = 0,
+    ) -> None:
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        self.model_name = model_name
+        self.quantized = quantized
+        model_path, tokenizer_path = self._files(model_dir)
+
+        self.tokenizer = Tokenizer.from_file(tokenizer_path)
+        self.tokenizer.enable_truncation(max_length=MAX_SEQUENCE_LENGTH)
+        pad_id = self.tokenizer.token_to_id("[PAD]") or 0
+        self.tokenizer.enable_padding(pad_id=pad_id, pad_token="[PAD]")
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = (
+            onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        )
+        if threads > 0:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+    def _files(self, model_dir: Optional[str]) -> Tuple[str, str]:
+        model_file = ONNX_QUANTIZED_MODEL_FILE if self.quantized else ONNX_MODEL_FILE
+        if model_dir:
+            model_path = os.path.join(model_dir, model_file)
+            if not os.path.exists(model_path):
+                model_path = os.path.join(model_dir, os.path.basename(model_file))
+            return model_path, os.path.join(model_dir, TOKENIZER_FILE)
+
+        from huggingface_hub import hf_hub_download
+
+        return (
+            hf_hub_download(self.model_name, model_file),
+            hf_hub_download(self.model_name, TOKENIZER_FILE),
+        )
+
+    def _embed_batch(self, texts: List[str]) -> np.ndarray:
+        encodings = self.tokenizer.encode_batch(texts)
+        input_ids = np.asarray([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.asarray(
+            [e.attention_mask for e in encodings], dtype=np.int64
+        )
+        inputs = {"input_ids": input_ids, "attention_mask": attention_mask}
+        if "token_type_ids" in self.input_names:
+            inputs["token_type_ids"] = np.asarray(
+                [e.type_ids for e in encodings], dtype=np.int64
+            )
+        hidden = self.session.run(None, inputs)[0]
+
+        if hidden.ndim == 3:
+            mask = attention_mask[:, :, None].astype(np.float32)
+            summed = (hidden * mask).sum(axis=1)
+            hidden = summed / np.clip(mask.sum(axis=1), 1e-9, None)
+        norms = np.linalg.norm(hidden, axis=1, keepdims=True)
+        return hidden / np.clip(norms, 1e-12, None)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        # Same preprocessing as HuggingFaceEmbeddings
+        texts = [text.replace("\n", " ") for text in texts]
+        if not texts:
+            return []
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]), reverse=True)
+        vectors = np.empty((len(texts), 0), dtype=np.float32)
+        for start in range(0, len(order), ONNX_BATCH_SIZE):
+            batch = order[start : start + ONNX_BATCH_SIZE]
+            embedded = self._embed_batch([texts[i] for i in batch])
+            if vectors.shape[1] == 0:
+                vectors = np.empty((len(texts), embedded.shape[1]), dtype=np.float32)
+            vectors[batch] = embedded
+        return vectors.tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def embedding_model_id(
+    model_name: str, backend: Optional[str] = None, quantized: Optional[bool] = None
+) -> str:
+    """
+    Identity of the vectors a backend produces; vectors of different IDs
+    must not be mixed. The reference backend keeps the bare model name that
+    rows embedded before backends existed carry.
+    """
+    backend = (backend or settings.EMBEDDING_BACKEND).lower()
+    if backend == HUGGINGFACE:
+        return model_name
+    if backend == ONNX:
+        if settings.EMBEDDING_ONNX_QUANTIZED if quantized is None else quantized:
+            return f"{model_name}@onnx-int8"
+        return f"{model_name}@onnx"
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+
+def create_embeddings_model(
+    model_name: str, backend: Optional[str] = None, quantized: Optional[bool] = None
+) -> Embeddings:
+    """Build the embedding model of the configured EMBEDDING_BACKEND."""
+    backend = (backend or settings.EMBEDDING_BACKEND).lower()
+    if backend == HUGGINGFACE:
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
+        return HuggingFaceEmbeddings(model_name=model_name)
+    if backend == ONNX:
+        return OnnxEmbeddings(
+            model_name,
+            quantized=(
+                settings.EMBEDDING_ONNX_QUANTIZED if quantized is None else quantized
+            ),
+            model_dir=settings.EMBEDDING_ONNX_DIR or None,
+            threads=settings.EMBEDDING_ONNX_THREADS,
+        )
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
@@ -0,0 +1,219 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+import numpy as np
+from app.core.config import settings
+
+
+def normalize_query(text: str) -> str:
+    """Whitespace differences do not change the embedding of a query."""
+    return " ".join(text.split())
+
+
+def make_embedding_key(model_name: str, text: str) -> str:
+    """Key a query vector by the model that produced it, so a model change misses."""
+    payload = f"{model_name}\n{normalize_query(text)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCacheStats:
+    def __init__(self) -> None:
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        hits = self.memory_hits + self.disk_hits
+        lookups = hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class SQLiteVectorStore:
+    """On-disk tier shared by every worker process on the host (LRU bounded)."""
+
+    def __init__(self, path: str, max_entries: int) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS query_embeddings ("
+                "key TEXT PRIMARY KEY, vector BLOB NOT NULL, "
+                "accessed_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get_many(self, keys: Sequence[str]) -> Dict[str, np.ndarray]:
+        if not keys:
+            return {}
+        placeholders = ", ".join("?" * len(keys))
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT key, vector FROM query_embeddings "
+                f"WHERE key IN ({placeholders})",
+                list(keys),
+            ).fetchall()
+            if rows:
+                conn.executemany(
+                    "UPDATE query_embeddings SET accessed_at = ? WHERE key = ?",
+                    [(time.time(), key) for key, _ in rows],
+                )
+        return {key: np.frombuffer(blob, dtype=np.float32) for key, blob in rows}
+
+    def set_many(self, items: Sequence[Tuple[str, np.ndarray]]) -> int:
+        """Store vectors; returns the number of entries evicted."""
+        now = time.time()
+        with self._connect() as conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO query_embeddings VALUES (?, ?, ?)",
+                [(key, vector.tobytes(), now) for key, vector in items],
+            )
+            return conn.execute(
+                "DELETE FROM query_embeddings WHERE key IN ("
+                "SELECT key FROM query_embeddings ORDER BY accessed_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM query_embeddings").fetchone()[0]
+
+
+class QueryEmbeddingCache:
+    """
+    LRU cache of query text -> embedding, in memory with an optional on-disk
+    tier. Vectors are kept as float32, the precision the model produces.
+    """
+
+    def __init__(
+        self,
+        model_name: str,
+        max_entries: int,
+        disk: Optional[SQLiteVectorStore] = None,
+    ) -> None:
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.disk = disk
+        self.stats = EmbeddingCacheStats()
+        self._entries: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def name(self) -> str:
+        return "sqlite" if self.disk is not None else "memory"
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        self._entries[key] = vector
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    def get_many(self, texts: Sequence[str]) -> List[Optional[List[float]]]:
+        """Cached vectors of texts, None where not cached."""
+        keys = [make_embedding_key(self.model_name, text) for text in texts]
+        found: Dict[str, np.ndarray] = {}
+        with self._lock:
+            for key in keys:
+                vector = self._entries.get(key)
+                if vector is not None:
+                    self._entries.move_to_end(key)
+                    found[key] = vector
+                    self.stats.memory_hits += 1
+
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        if self.disk is not None and missing:
+            from_disk = self.disk.get_many(missing)
+            with self._lock:
+                for key, vector in from_disk.items():
+                    self._remember(key, vector)
+                    self.stats.disk_hits += 1
+            found.update(from_disk)
+
+        self.stats.misses += sum(1 for key in keys if key not in found)
+        return [found[key].tolist() if key in found else None for key in keys]
+
+    def set_many(self, items: Sequence[Tuple[str, List[float]]]) -> None:
+        stored = [
+            (
+                make_embedding_key(self.model_name, text),
+                np.asarray(vector, dtype=np.float32),
+            )
+            for text, vector in items
+        ]
+        with self._lock:
+            for key, vector in stored:
+                self._remember(key, vector)
+            self.stats.stores += len(stored)
+        if self.disk is not None and stored:
+            self.stats.evictions += self.disk.set_many(stored)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+_query_cache: Optional[QueryEmbeddingCache] = None
+_query_cache_initialized = False
+
+
+def get_query_embedding_cache() -> Optional[QueryEmbeddingCache]:
+    """Get the configured query embedding cache, or None if it is disabled."""
+    global _query_cache, _query_cache_initialized
+    if not _query_cache_initialized:
+        from app.services.rag_service import get_embedding_model_id
+
+        backend = settings.EMBEDDING_CACHE_BACKEND.lower()
+        if backend in ("memory", "sqlite"):
+            disk = None
+            if backend == "sqlite":
+                disk = SQLiteVectorStore(
+                    settings.EMBEDDING_CACHE_PATH,
+                    settings.EMBEDDING_CACHE_DISK_MAX_ENTRIES,
+                )
+            _query_cache = QueryEmbeddingCache(
+                # The backend is part of the ID, so switching it misses
+                get_embedding_model_id(),
+                settings.EMBEDDING_CACHE_MAX_ENTRIES,
+                disk,
+            )
+        elif backend != "none":
+            raise ValueError(
+                f"Unknown EMBEDDING_CACHE_BACKEND: {settings.EMBEDDING_CACHE_BACKEND}"
+            )
+        _query_cache_initialized = True
+    return _query_cache
+
+
+def get_query_embedding_cache_stats() -> Dict[str, Any]:
+    cache = get_query_embedding_cache()
+    if cache is None:
+        return {"backend": "none"}
+    stats = {"backend": cache.name, "entries": len(cache), **cache.stats.as_dict()}
+    if cache.disk is not None:
+        stats["disk_entries"] = len(cache.disk)
+    return stats
@@ -0,0 +1,206 @@
+import asyncio
+import bisect
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+from app.core.config import settings
+
+Vector = List[float]
+
+
+class Histogram:
+    """Counts of observations per bucket (upper bounds, inclusive)."""
+
+    def __init__(self, bounds: Sequence[float]) -> None:
+        self.bounds = list(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        self.max = max(self.max, value)
+
+    def summary(self) -> Dict[str, Any]:
+        labels = [f"<={bound:g}" for bound in self.bounds]
+        labels.append(f">{self.bounds[-1]:g}")
+        return {
+            "count": self.count,
+            "mean": round(self.total / self.count, 3) if self.count else 0.0,
+            "max": round(self.max, 3),
+            "buckets": dict(zip(labels, self.counts)),
+        }
+
+
+@dataclass
+class EmbeddingRequest:
+    texts: List[str]
+    future: asyncio.Future
+    enqueued_at: float = field(default_factory=time.perf_counter)
+
+
+class EmbeddingWorker:
+    """
+    Long-lived embedding service for one event loop. Requests arriving within
+    EMBEDDING_BATCH_WAIT_MS of each other are embedded in one embed_documents
+    call (up to EMBEDDING_MAX_BATCH_SIZE texts) on a dedicated thread, so
+    concurrent searches share a forward pass. At most EMBEDDING_QUEUE_SIZE
+    requests wait; further callers wait for room before queueing.
+    """
+
+    def __init__(
+        self,
+        embed: Callable[[List[str]], List[Vector]],
+        max_batch_size: int,
+        batch_wait_seconds: float,
+        queue_size: int,
+    ) -> None:
+        self.embed = embed
+        self.max_batch_size = max_batch_size
+        self.batch_wait_seconds = batch_wait_seconds
+        self.queue: asyncio.Queue[EmbeddingRequest] = asyncio.Queue(queue_size)
+        # One thread: batches run one after another, each using all cores
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="embed")
+        self.batch_sizes = Histogram([1, 2, 4, 8, 16, 32, 64, 128])
+        self.queue_wait_ms = Histogram([1, 5, 10, 25, 50, 100, 250, 1000])
+        self.batches = 0
+        self.backpressure_waits = 0
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def embed_texts(self, texts: List[str]) -> List[Vector]:
+        vectors: List[Vector] = []
+        # Large inputs (document ingestion) go in batch-sized pieces, one at a
+        # time, so queries can be served between them
+        for start in range(0, len(texts), self.max_batch_size):
+            piece = texts[start : start + self.max_batch_size]
+            vectors.extend(await self._submit(piece))
+        return vectors
+
+    async def _submit(self, texts: List[str]) -> List[Vector]:
+        request = EmbeddingRequest(texts, asyncio.get_running_loop().create_future())
+        if self.queue.full():
+            self.backpressure_waits += 1
+        await self.queue.put(request)
+        return await request.future
+
+    async def _run(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = [await self.queue.get()]
+            size = len(batch[0].texts)
+            deadline = loop.time() + self.batch_wait_seconds
+
+            # Collect what arrives within the batching window
+            while size < self.max_batch_size:
+                if not self.queue.empty():
+                    request = self.queue.get_nowait()
+                else:
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        request = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                if size + len(request.texts) > self.max_batch_size:
+                    # Too big for this batch; it starts the next one
+                    await self._run_batch(batch)
+                    batch, size = [request], 0
+                    deadline = loop.time() + self.batch_wait_seconds
+                else:
+                    batch.append(request)
+                size += len(request.texts)
+
+            await self._run_batch(batch)
+
+    async def _run_batch(self, batch: List[EmbeddingRequest]) -> None:
+        started = time.perf_counter()
+        batch = [request for request in batch if not request.future.done()]
+        if not batch:
+            return
+        texts = [text for request in batch for text in request.texts]
+        for request in batch:
+            self.queue_wait_ms.observe((started - request.enqueued_at) * 1000)
+        self.batch_sizes.observe(len(texts))
+        self.batches += 1
+
+        try:
+            vectors = await asyncio.get_running_loop().run_in_executor(
+                self.executor, self.embed, texts
+            )
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+            return
+
+        offset = 0
+        for request in batch:
+            count = len(request.texts)
+            if not request.future.done():
+                request.future.set_result(vectors[offset : offset + count])
+            offset += count
+
+    async def close(self) -> None:
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self.executor.shutdown(wait=False)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "queued": self.queue.qsize(),
+            "backpressure_waits": self.backpressure_waits,
+            "batch_size": self.batch_sizes.summary(),
+            "queue_wait_ms": self.queue_wait_ms.summary(),
+        }
+
+
+# Bound to the event loop it was created on, like the LLM client
+_worker: Optional[EmbeddingWorker] = None
+_worker_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def get_embedding_worker() -> EmbeddingWorker:
+    global _worker, _worker_loop
+    loop = asyncio.get_running_loop()
+    if _worker is None or _worker_loop is not loop:
+        from app.services.rag_service import get_embeddings_model
+
+        def embed(texts: List[str]) -> List[Vector]:
+            return get_embeddings_model().embed_documents(texts)
+
+        _worker = EmbeddingWorker(
+            embed,
+            max_batch_size=settings.EMBEDDING_MAX_BATCH_SIZE,
+            batch_wait_seconds=settings.EMBEDDING_BATCH_WAIT_MS / 1000,
+            queue_size=settings.EMBEDDING_QUEUE_SIZE,
+        )
+        _worker_loop = loop
+    return _worker
+
+
+async def embed_texts(texts: List[str]) -> List[Vector]:
+    """Embed texts through the batching worker of the running loop."""
+    if not texts:
+        return []
+    return await get_embedding_worker().embed_texts(texts)
+
+
+async def close_embedding_worker() -> None:
+    global _worker, _worker_loop
+    if _worker is not None:
+        await _worker.close()
+    _worker = None
+    _worker_loop = None
+
+
+def get_embedding_stats() -> Dict[str, Any]:
+    return _worker.summary() if _worker is not None else {}
@@ -0,0 +1,230 @@
+import asyncio
+import threading
+import time
+from collections import deque
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Deque, Dict, Optional, Tuple, TypeVar
+import numpy as np
+from app.core.config import settings
+from app.services.rate_limiter import RateLimitTimeout
+
+T = TypeVar("T")
+
+# Latencies remembered per (model, max_tokens); old samples age out
+LATENCY_WINDOW = 200
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies, keyed by model and
+    max_tokens since output length dominates completion time.
+    """
+
+    def __init__(self, window: int = LATENCY_WINDOW) -> None:
+        self.window = window
+        self._samples: Dict[Tuple[str, int], Deque[float]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, model: str, max_tokens: int, seconds: float) -> None:
+        with self._lock:
+            samples = self._samples.setdefault(
+                (model, max_tokens), deque(maxlen=self.window)
+            )
+            samples.append(seconds)
+
+    def percentile(self, model: str, max_tokens: int, q: float) -> Optional[float]:
+        """The q-th percentile latency, or None with too few samples."""
+        with self._lock:
+            samples = list(self._samples.get((model, max_tokens), ()))
+        if len(samples) < settings.LLM_HEDGE_MIN_SAMPLES:
+            return None
+        return float(np.percentile(samples, q))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._samples.clear()
+
+    def summary(self) -> Dict[str, Any]:
+        with self._lock:
+            items = [(key, list(samples)) for key, samples in self._samples.items()]
+        return {
+            f"{model}:{max_tokens}": {
+                "samples": len(samples),
+                **{
+                    f"p{q}": round(float(np.percentile(samples, q)), 3)
+                    for q in (50, 95, 99)
+                },
+            }
+            for (model, max_tokens), samples in items
+            if samples
+        }
+
+
+class HedgeStats:
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.calls = 0
+        self.hedged = 0
+        self.hedge_wins = 0
+        self.primary_failures = 0
+        self.timeouts = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "calls": self.calls,
+            "hedged": self.hedged,
+            "hedge_wins": self.hedge_wins,
+            "primary_failures": self.primary_failures,
+            "timeouts": self.timeouts,
+        }
+
+
+latency_tracker = LatencyTracker()
+hedge_stats = HedgeStats()
+
+# Set by hedged_call inside each attempt; chat_completion calls it once the
+# request holds rate limit capacity and a concurrency slot
+_on_call_started: ContextVar[Optional[Callable[[], None]]] = ContextVar(
+    "on_call_started", default=None
+)
+
+
+def mark_call_started() -> None:
+    """The provider request of the current attempt is about to be sent."""
+    callback = _on_call_started.get()
+    if callback is not None:
+        callback()
+
+
+class Attempt:
+    """One model's call in a hedged race, timed from when it was sent."""
+
+    def __init__(self, model: str) -> None:
+        self.model = model
+        self.started_at: Optional[float] = None
+        self.started = asyncio.Event()
+
+    def mark_started(self) -> None:
+        if self.started_at is None:
+            self.started_at = time.monotonic()
+            self.started.set()
+
+
+def hedge_delay(model: str, max_tokens: int) -> float:
+    """
+    Seconds to wait for the primary call before sending a hedge: the
+    LLM_HEDGE_PERCENTILE latency seen for this model and size, or
+    LLM_HEDGE_INITIAL_DELAY_SECONDS until enough calls have been observed.
+    """
+    observed = latency_tracker.percentile(
+        model, max_tokens, settings.LLM_HEDGE_PERCENTILE
+    )
+    if observed is None:
+        return settings.LLM_HEDGE_INITIAL_DELAY_SECONDS
+    return max(observed, settings.LLM_HEDGE_MIN_DELAY_SECONDS)
+
+
+async def hedged_call(
+    call: Callable[[str], Awaitable[T]], model: str, max_tokens: int
+) -> T:
+    """
+    Run call(model), and if it has not returned a valid result by the hedge
+    delay, also run call(fallback model) and return whichever valid result
+    arrives first. The other call is cancelled.
+
+    The delay and the recorded latencies count from when the request is
+    sent (see mark_call_started), not from when it started waiting for rate
+    limit capacity or a free slot: a throttled call is not slow, and hedging
+    it would only take more of the capacity that is short.
+
+    A call that raises (a per-call timeout in chat_completion, or a response
+    that fails validation) does not end the race while the other is running.
+    A primary that could not get rate limit capacity is not hedged.
+    """
+    hedge_stats.calls += 1
+
+    async def timed(attempt: Attempt) -> T:
+        token = _on_call_started.set(attempt.mark_started)
+        try:
+            result = await call(attempt.model)
+        finally:
+            _on_call_started.reset(token)
+        if attempt.started_at is not None:
+            latency_tracker.record(
+                attempt.model, max_tokens, time.monotonic() - attempt.started_at
+            )
+        return result
+
+    if not settings.LLM_HEDGE_ENABLED:
+        return await timed(Attempt(model))
+
+    first = Attempt(model)
+    primary = asyncio.create_task(timed(first))
+    tasks = {primary}
+    hedge: Optional[asyncio.Task] = None
+    error: Optional[BaseException] = None
+    delay = hedge_delay(model, max_tokens)
+    waiting: Optional[asyncio.Task] = None
+
+    try:
+        while tasks:
+            timeout = None
+            waiters = set(tasks)
+            if hedge is None:
+                if first.started_at is None:
+                    # The hedge clock starts once the primary is sent
+                    waiting = asyncio.create_task(first.started.wait())
+                    waiters.add(waiting)
+                else:
+                    timeout = max(first.started_at + delay - time.monotonic(), 0.0)
+            done, _ = await asyncio.wait(
+                waiters, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+            )
+            if waiting is not None:
+                waiting.cancel()
+                done.discard(waiting)
+                waiting = None
+            tasks -= done
+
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        hedge_stats.hedge_wins += 1
+                    return task.result()
+                error = task.exception()
+                if task is primary:
+                    hedge_stats.primary_failures += 1
+
+            if hedge is not None:
+                continue
+            if primary in done:
+                # A primary without rate limit capacity is not hedged
+                if isinstance(error, RateLimitTimeout):
+                    break
+            elif timeout is None:
+                # The primary was just sent; wait for its deadline
+                continue
+
+            # Deadline passed, or the primary failed early: send the hedge
+            hedge_stats.hedged += 1
+            hedge = asyncio.create_task(
+                timed(Attempt(settings.LLM_FALLBACK_MODEL or model))
+            )
+            tasks.add(hedge)
+
+        raise error
+    finally:
+        for task in (primary, hedge, waiting):
+            if task is not None and not task.done():
+                task.cancel()
+
+
+def get_hedge_stats() -> Dict[str, Any]:
+    return {
+        "enabled": settings.LLM_HEDGE_ENABLED,
+        "fallback_model": settings.LLM_FALLBACK_MODEL or None,
+        **hedge_stats.as_dict(),
+        "latency": latency_tracker.summary(),
+    }
@@ -0,0 +1,122 @@
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from app.core.config import settings
+
+# Ingestion states
+PROCESSING = "processing"
+COMPLETED = "completed"
+FAILED = "failed"
+
+COUNTERS = (
+    "chunks_embedded",
+    "chunks_stored",
+    "chunks_skipped",
+    "chunks_deleted",
+    "batches",
+    "retries",
+)
+
+
+class SQLiteProgressStore:
+    """
+    Progress of document ingestion runs in a SQLite file, so any API worker
+    on the host can report the progress of a run another worker is doing.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conn.close()
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS ingestion_progress ("
+                "doc_id TEXT PRIMARY KEY, status TEXT NOT NULL, "
+                "chunks_estimated INTEGER NOT NULL DEFAULT 0, "
+                "chunks_embedded INTEGER NOT NULL DEFAULT 0, "
+                "chunks_stored INTEGER NOT NULL DEFAULT 0, "
+                "batches INTEGER NOT NULL DEFAULT 0, "
+                "retries INTEGER NOT NULL DEFAULT 0, "
+                "error TEXT, started_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            columns = {
+                row["name"]
+                for row in conn.execute("PRAGMA table_info(ingestion_progress)")
+            }
+            for column in COUNTERS:
+                if column not in columns:
+                    conn.execute(
+                        f"ALTER TABLE ingestion_progress ADD COLUMN {column} "
+                        "INTEGER NOT NULL DEFAULT 0"
+                    )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def start(self, doc_id: str, chunks_estimated: int) -> None:
+        """Begin a run, resetting the counters of any earlier run."""
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ingestion_progress (doc_id, status, "
+                "chunks_estimated, started_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+                (doc_id, PROCESSING, chunks_estimated, now, now),
+            )
+
+    def add(self, doc_id: str, **counters: int) -> None:
+        """Add to the counters of a running ingestion."""
+        if any(name not in COUNTERS for name in counters):
+            raise ValueError(f"Unknown ingestion counters: {list(counters)}")
+        assignments = ", ".join(f"{name} = {name} + ?" for name in counters)
+        with self._transaction() as conn:
+            conn.execute(
+                f"UPDATE ingestion_progress SET {assignments}, updated_at = ? "
+                "WHERE doc_id = ?",
+                (*counters.values(), time.time(), doc_id),
+            )
+
+    def finish(self, doc_id: str, status: str, error: Optional[str] = None) -> None:
+        with self._transaction() as conn:
+            conn.execute(
+                "UPDATE ingestion_progress SET status = ?, error = ?, "
+                "updated_at = ? WHERE doc_id = ?",
+                (status, error, time.time(), doc_id),
+            )
+
+    def get(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            row = conn.execute(
+                "SELECT * FROM ingestion_progress WHERE doc_id = ?", (doc_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        return dict(row) if row is not None else None
+
+
+_progress_store: Optional[SQLiteProgressStore] = None
+
+
+def get_progress_store() -> SQLiteProgressStore:
+    """Get the ingestion progress store."""
+    global _progress_store
+    if _progress_store is None:
+        _progress_store = SQLiteProgressStore(settings.INGESTION_PROGRESS_PATH)
+    return _progress_store
@@ -0,0 +1,423 @@
+import json
+import random
+import sqlite3
+import time
+import uuid
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from app.core.config import settings
+
+# Job states, in the vocabulary of GenerationResponse.status
+PENDING = "pending"
+PROCESSING = "processing"
+COMPLETED = "completed"
+FAILED = "failed"
+
+
+@dataclass
+class Job:
+    id: str
+    paper_id: str
+    payload: Dict[str, Any]
+    status: str
+    attempts: int
+    max_attempts: int
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    lease_owner: Optional[str] = None
+    # Progress of a running job, see app.services.progress
+    stage: Optional[str] = None
+    sections: Optional[List[str]] = None
+    updated_at: float = 0.0
+    # All papers filled by the job, when more than paper_id
+    paper_ids: Optional[List[str]] = None
+    idempotency_key: Optional[str] = None
+
+
+class SQLiteJobQueue:
+    """
+    Durable generation job queue in a SQLite file shared by the API workers
+    (which enqueue and read status) and the generation worker processes
+    (which claim and run jobs).
+
+    A claimed job is leased to one worker, which renews the lease with
+    heartbeats. A job whose lease expires (its worker died) is claimed
+    again; failed jobs are retried with exponential backoff up to
+    max_attempts.
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        # WAL lets status reads proceed while a worker writes
+        conn = sqlite3.connect(self.path, timeout=30)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        finally:
+            conn.close()
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS generation_jobs ("
+                "id TEXT PRIMARY KEY, paper_id TEXT NOT NULL, "
+                "payload TEXT NOT NULL, status TEXT NOT NULL, "
+                "attempts INTEGER NOT NULL DEFAULT 0, "
+                "max_attempts INTEGER NOT NULL, "
+                "available_at REAL NOT NULL, "
+                "lease_owner TEXT, lease_expires_at REAL, "
+                "error TEXT, result TEXT, "
+                "created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+            )
+            columns = {
+                row["name"]
+                for row in conn.execute("PRAGMA table_info(generation_jobs)")
+            }
+            for column in ("stage", "sections", "paper_ids", "idempotency_key"):
+                if column not in columns:
+                    conn.execute(
+                        f"ALTER TABLE generation_jobs ADD COLUMN {column} TEXT"
+                    )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS generation_jobs_claim "
+                "ON generation_jobs (status, available_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS generation_jobs_paper "
+                "ON generation_jobs (paper_id, created_at)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS generation_jobs_idempotency "
+                "ON generation_jobs (idempotency_key, created_at)"
+            )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    @contextmanager
+    def _read(self) -> Iterator[sqlite3.Connection]:
+        """Read without taking the write lock (status polls, event streams)."""
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    @staticmethod
+    def _to_job(row: sqlite3.Row) -> Job:
+        return Job(
+            id=row["id"],
+            paper_id=row["paper_id"],
+            payload=json.loads(row["payload"]),
+            status=row["status"],
+            attempts=row["attempts"],
+            max_attempts=row["max_attempts"],
+            error=row["error"],
+            result=json.loads(row["result"]) if row["result"] else None,
+            lease_owner=row["lease_owner"],
+            stage=row["stage"],
+            sections=json.loads(row["sections"]) if row["sections"] else None,
+            paper_ids=json.loads(row["paper_ids"]) if row["paper_ids"] else None,
+            idempotency_key=row["idempotency_key"],
+            updated_at=row["updated_at"],
+        )
+
+    def enqueue(
+        self,
+        paper_id: str,
+        payload: Dict[str, Any],
+        paper_ids: Optional[List[str]] = None,
+        idempotency_key: Optional[str] = None,
+        include_finished: bool = False,
+    ) -> Tuple[Job, bool]:
+        """
+        Queue a job for paper_id. A job that fills several papers (e.g. the
+        sets of a multi-set paper) lists all of them in paper_ids, so status
+        lookups by any of those papers find it.
+
+        If a job with the same idempotency_key is pending or processing (or,
+        with include_finished, was created within
+        GENERATION_IDEMPOTENCY_TTL_SECONDS), no job is added and that job is
+        returned instead. Returns the job and whether it was created.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            if idempotency_key is not None:
+                existing = self._find_idempotent(
+                    conn, idempotency_key, include_finished, now
+                )
+                if existing is not None:
+                    return existing, False
+
+            job_id = str(uuid.uuid4())
+            conn.execute(
+                "INSERT INTO generation_jobs (id, paper_id, payload, status, "
+                "max_attempts, available_at, created_at, updated_at, paper_ids, "
+                "idempotency_key) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (
+                    job_id,
+                    paper_id,
+                    json.dumps(payload, default=str),
+                    PENDING,
+                    settings.GENERATION_JOB_MAX_ATTEMPTS,
+                    now,
+                    now,
+                    now,
+                    json.dumps(paper_ids) if paper_ids else None,
+                    idempotency_key,
+                ),
+            )
+        job = Job(
+            id=job_id,
+            paper_id=paper_id,
+            payload=payload,
+            status=PENDING,
+            attempts=0,
+            max_attempts=settings.GENERATION_JOB_MAX_ATTEMPTS,
+            paper_ids=paper_ids,
+            idempotency_key=idempotency_key,
+            updated_at=now,
+        )
+        return job, True
+
+    def find_idempotent(
+        self, idempotency_key: str, include_finished: bool = False
+    ) -> Optional[Job]:
+        """The job a submission with this idempotency key would attach to."""
+        with self._read() as conn:
+            return self._find_idempotent(
+                conn, idempotency_key, include_finished, time.time()
+            )
+
+    def _find_idempotent(
+        self,
+        conn: sqlite3.Connection,
+        idempotency_key: str,
+        include_finished: bool,
+        now: float,
+    ) -> Optional[Job]:
+        if include_finished:
+            row = conn.execute(
+                "SELECT * FROM generation_jobs WHERE idempotency_key = ? "
+                "AND created_at > ? ORDER BY created_at DESC LIMIT 1",
+                (idempotency_key, now - settings.GENERATION_IDEMPOTENCY_TTL_SECONDS),
+            ).fetchone()
+        else:
+            row = conn.execute(
+                "SELECT * FROM generation_jobs WHERE idempotency_key = ? "
+                "AND status IN (?, ?) ORDER BY created_at DESC LIMIT 1",
+                (idempotency_key, PENDING, PROCESSING),
+            ).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def fail_expired(self) -> List[Job]:
+        """
+        Fail the processing jobs whose lease expired on their last attempt:
+        a job that keeps taking its worker down must not be retried forever.
+        Returns them, so their papers can be marked failed.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            rows = conn.execute(
+                "SELECT * FROM generation_jobs WHERE status = ? "
+                "AND lease_expires_at < ? AND attempts >= max_attempts",
+                (PROCESSING, now),
+            ).fetchall()
+            conn.executemany(
+                "UPDATE generation_jobs SET status = ?, lease_owner = NULL, "
+                "error = 'Worker stopped responding', updated_at = ? WHERE id = ?",
+                [(FAILED, now, row["id"]) for row in rows],
+            )
+        jobs = [self._to_job(row) for row in rows]
+        for job in jobs:
+            job.status = FAILED
+        return jobs
+
+    def claim(self, worker_id: str, lease_seconds: float) -> Optional[Job]:
+        """
+        Lease the oldest runnable job: a pending job whose backoff has
+        elapsed, or a processing job whose worker stopped heartbeating with
+        attempts left (call fail_expired first for the others).
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT * FROM generation_jobs WHERE "
+                "(status = ? AND available_at <= ?) OR "
+                "(status = ? AND lease_expires_at < ? "
+                "AND attempts < max_attempts) "
+                "ORDER BY available_at LIMIT 1",
+                (PENDING, now, PROCESSING, now),
+            ).fetchone()
+            if row is None:
+                return None
+
+            conn.execute(
+                "UPDATE generation_jobs SET status = ?, attempts = attempts + 1, "
+                "lease_owner = ?, lease_expires_at = ?, stage = NULL, "
+                "sections = NULL, updated_at = ? WHERE id = ?",
+                (PROCESSING, worker_id, now + lease_seconds, now, row["id"]),
+            )
+            job = self._to_job(row)
+        job.status = PROCESSING
+        job.attempts += 1
+        job.lease_owner = worker_id
+        job.stage = job.sections = None
+        return job
+
+    def set_progress(
+        self,
+        job_id: str,
+        worker_id: str,
+        stage: str,
+        sections: Optional[List[str]] = None,
+    ) -> bool:
+        """Record the pipeline stage of a running job for status subscribers."""
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE generation_jobs SET stage = ?, sections = ?, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = ?",
+                (
+                    stage,
+                    json.dumps(sections) if sections is not None else None,
+                    now,
+                    job_id,
+                    worker_id,
+                    PROCESSING,
+                ),
+            ).rowcount
+        return updated == 1
+
+    def heartbeat(self, job_id: str, worker_id: str, lease_seconds: float) -> bool:
+        """Extend the lease; False if the job is no longer leased to this worker."""
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE generation_jobs SET lease_expires_at = ?, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = ?",
+                (now + lease_seconds, now, job_id, worker_id, PROCESSING),
+            ).rowcount
+        return updated == 1
+
+    def complete(
+        self, job_id: str, worker_id: str, result: Optional[Dict[str, Any]] = None
+    ) -> bool:
+        return self._finish(job_id, worker_id, COMPLETED, None, result)
+
+    def fail(self, job_id: str, worker_id: str, error: str) -> Optional[str]:
+        """
+        Record a failed attempt. The job goes back to pending after a backoff
+        of GENERATION_JOB_RETRY_BACKOFF_SECONDS * 2^(attempt - 1) (with
+        jitter), or to failed once max_attempts is used up. Returns the new
+        status, or None if the job is no longer leased to this worker.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            row = conn.execute(
+                "SELECT attempts, max_attempts FROM generation_jobs "
+                "WHERE id = ? AND lease_owner = ? AND status = ?",
+                (job_id, worker_id, PROCESSING),
+            ).fetchone()
+            if row is None:
+                return None
+
+            if row["attempts"] >= row["max_attempts"]:
+                status, available_at = FAILED, now
+            else:
+                backoff = settings.GENERATION_JOB_RETRY_BACKOFF_SECONDS * 2 ** (
+                    row["attempts"] - 1
+                )
+                status = PENDING
+                available_at = now + backoff * random.uniform(1.0, 1.5)
+
+            conn.execute(
+                "UPDATE generation_jobs SET status = ?, available_at = ?, "
+                "lease_owner = NULL, lease_expires_at = NULL, error = ?, "
+                "stage = NULL, sections = NULL, updated_at = ? WHERE id = ?",
+                (status, available_at, error, now, job_id),
+            )
+        return status
+
+    def release(self, job_id: str, worker_id: str) -> bool:
+        """
+        Hand an interrupted job back to the queue (e.g. on shutdown) without
+        counting the attempt.
+        """
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE generation_jobs SET status = ?, available_at = ?, "
+                "attempts = MAX(attempts - 1, 0), lease_owner = NULL, "
+                "lease_expires_at = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = ?",
+                (PENDING, now, now, job_id, worker_id, PROCESSING),
+            ).rowcount
+        return updated == 1
+
+    def _finish(
+        self,
+        job_id: str,
+        worker_id: str,
+        status: str,
+        error: Optional[str],
+        result: Optional[Dict[str, Any]],
+    ) -> bool:
+        now = time.time()
+        with self._transaction() as conn:
+            updated = conn.execute(
+                "UPDATE generation_jobs SET status = ?, error = ?, result = ?, "
+                "lease_owner = NULL, lease_expires_at = NULL, stage = NULL, "
+                "sections = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND status = ?",
+                (
+                    status,
+                    error,
+                    json.dumps(result, default=str) if result is not None else None,
+                    now,
+                    job_id,
+                    worker_id,
+                    PROCESSING,
+                ),
+            ).rowcount
+        return updated == 1
+
+    def latest_for_paper(self, paper_id: str) -> Optional[Job]:
+        with self._read() as conn:
+            row = conn.execute(
+                "SELECT * FROM generation_jobs WHERE paper_id = ? OR ("
+                "paper_ids IS NOT NULL AND EXISTS ("
+                "SELECT 1 FROM json_each(paper_ids) WHERE value = ?)) "
+                "ORDER BY created_at DESC LIMIT 1",
+                (paper_id, paper_id),
+            ).fetchone()
+        return self._to_job(row) if row is not None else None
+
+    def counts(self) -> Dict[str, int]:
+        with self._read() as conn:
+            rows = conn.execute(
+                "SELECT status, COUNT(*) FROM generation_jobs GROUP BY status"
+            ).fetchall()
+        return {status: count for status, count in rows}
+
+
+_job_queue: Optional[SQLiteJobQueue] = None
+
+
+def get_job_queue() -> SQLiteJobQueue:
+    """Get the generation job queue."""
+    global _job_queue
+    if _job_queue is None:
+        _job_queue = SQLiteJobQueue(settings.GENERATION_QUEUE_PATH)
+    return _job_queue
@@ -0,0 +1,100 @@
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class IncrementalJSONParser:
+    """
+    Incrementally parse a streamed JSON object of the form
+    {"key": [{...}, {...}], "other": [...]} and emit every object inside a
+    top-level array as soon as its closing brace arrives.
+
+    Text before the first "{" (e.g. a markdown fence) is ignored, so raw LLM
+    output can be fed chunk by chunk.
+    """
+
+    def __init__(self) -> None:
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+        self._key_chars: List[str] = []
+        self._last_key: Optional[str] = None
+        self._array_key: Optional[str] = None
+        self._item_chars: List[str] = []
+        self.done = False
+
+    def feed(self, text: str) -> List[Tuple[str, Dict[str, Any]]]:
+        """Consume a chunk of text, returning (array key, item) for closed items."""
+        items: List[Tuple[str, Dict[str, Any]]] = []
+
+        for ch in text:
+            if self.done:
+                break
+
+            depth = len(self._stack)
+            capturing = depth >= 3
+
+            if self._in_string:
+                if capturing:
+                    self._item_chars.append(ch)
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if depth == 1:
+                        self._last_key = "".join(self._key_chars)
+                elif depth == 1:
+                    self._key_chars.append(ch)
+                continue
+
+            if depth == 0:
+                if ch == "{":
+                    self._stack.append("{")
+                continue
+
+            if ch == '"':
+                self._in_string = True
+                if depth == 1:
+                    self._key_chars = []
+            elif ch in "{[":
+                if depth == 1 and ch == "[":
+                    self._array_key = self._last_key
+                if depth == 2 and ch == "{" and self._stack[-1] == "[":
+                    self._item_chars = []
+                self._stack.append(ch)
+            elif ch in "}]":
+                self._stack.pop()
+                if len(self._stack) == 2 and ch == "}" and self._item_chars:
+                    self._item_chars.append(ch)
+                    item = self._parse_item()
+                    if item is not None and self._array_key is not None:
+                        items.append((self._array_key, item))
+                    self._item_chars = []
+                    continue
+                if not self._stack:
+                    self.done = True
+
+            if len(self._stack) >= 3 or capturing:
+                self._item_chars.append(ch)
+
+        return items
+
+    def _parse_item(self) -> Optional[Dict[str, Any]]:
+        try:
+            item = json.loads("".join(self._item_chars))
+        except json.JSONDecodeError:
+            return None
+        return item if isinstance(item, dict) else None
+
+
+def salvage_json_items(text: str) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Recover the complete items of a truncated or otherwise malformed JSON
+    response, grouped by their top-level array key. An item cut off by the
+    output token limit is dropped; everything closed before it is kept.
+    """
+    salvaged: Dict[str, List[Dict[str, Any]]] = {}
+    for key, item in IncrementalJSONParser().feed(text):
+        salvaged.setdefault(key, []).append(item)
+    return salvaged
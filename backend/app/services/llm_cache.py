@@ -0,0 +1,213 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, Optional, Tuple
+from app.core.config import settings
+
+
+def make_cache_key(request: Dict[str, Any]) -> str:
+    """
+    Content-address an LLM request: model, full messages (which include the
+    RAG context) and sampling parameters.
+    """
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CacheStats:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "stores": self.stores,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+class MemoryLRUCache:
+    """In-process LRU cache with a size limit and TTL."""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int, ttl_seconds: float) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.time() - entry[0] > self.ttl_seconds:
+                del self._entries[key]
+                self.stats.evictions += 1
+                entry = None
+
+            if entry is None:
+                self.stats.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.stats.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._entries[key] = (time.time(), value)
+            self._entries.move_to_end(key)
+            self.stats.stores += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.stats.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    On-disk cache shared by every worker process on the host, with the same
+    size limit (least recently used first) and TTL as the memory backend.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: str, max_entries: int, ttl_seconds: float) -> None:
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.stats = CacheStats()
+        with self._connect() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, value TEXT NOT NULL, "
+                "created_at REAL NOT NULL, accessed_at REAL NOT NULL)"
+            )
+
+    @contextmanager
+    def _connect(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self.stats.evictions += 1
+                row = None
+
+            if row is None:
+                self.stats.misses += 1
+                return None
+
+            conn.execute(
+                "UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            self.stats.hits += 1
+            return row[0]
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO llm_cache VALUES (?, ?, ?, ?)",
+                (key, value, now, now),
+            )
+            self.stats.stores += 1
+
+            expired = conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?",
+                (now - self.ttl_seconds,),
+            ).rowcount
+            overflow = conn.execute(
+                "DELETE FROM llm_cache WHERE key IN ("
+                "SELECT key FROM llm_cache ORDER BY accessed_at DESC "
+                "LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+            self.stats.evictions += expired + overflow
+
+    def clear(self) -> None:
+        with self._connect() as conn:
+            conn.execute("DELETE FROM llm_cache")
+
+    def __len__(self) -> int:
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0]
+
+
+_llm_cache = None
+_cache_initialized = False
+_bypass: ContextVar[bool] = ContextVar("llm_cache_bypass", default=False)
+
+
+def get_llm_cache():
+    """Get the configured LLM response cache, or None if caching is disabled."""
+    global _llm_cache, _cache_initialized
+    if not _cache_initialized:
+        backend = settings.LLM_CACHE_BACKEND.lower()
+        if backend == "memory":
+            _llm_cache = MemoryLRUCache(
+                settings.LLM_CACHE_MAX_ENTRIES, settings.LLM_CACHE_TTL_SECONDS
+            )
+        elif backend == "sqlite":
+            _llm_cache = SQLiteCache(
+                settings.LLM_CACHE_PATH,
+                settings.LLM_CACHE_MAX_ENTRIES,
+                settings.LLM_CACHE_TTL_SECONDS,
+            )
+        elif backend != "none":
+            raise ValueError(f"Unknown LLM_CACHE_BACKEND: {settings.LLM_CACHE_BACKEND}")
+        _cache_initialized = True
+    return _llm_cache
+
+
+@contextmanager
+def bypass_cache(bypass: bool = True) -> Iterator[None]:
+    """
+    Skip cache lookups for requests made in this context ("give me fresh
+    questions"). Fresh responses are still stored for later requests.
+    """
+    token = _bypass.set(bypass)
+    try:
+        yield
+    finally:
+        _bypass.reset(token)
+
+
+def is_cache_bypassed() -> bool:
+    return _bypass.get()
+
+
+def get_cache_stats() -> Dict[str, Any]:
+    cache = get_llm_cache()
+    if cache is None:
+        return {"backend": "none"}
+    return {"backend": cache.name, "entries": len(cache), **cache.stats.as_dict()}
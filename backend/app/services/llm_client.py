@@ -0,0 +1,227 @@
+import asyncio
+import math
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, Iterator, Optional
+import httpx
+from groq import AsyncGroq, RateLimitError
+from app.core.config import settings
+from app.services.hedging import hedge_stats, mark_call_started
+from app.services.rate_limiter import (
+    acquire_capacity,
+    release_capacity,
+    report_provider_limit,
+)
+from app.services.tokenizer import count_tokens
+
+# Wait after a 429 that carries no retry-after header
+DEFAULT_RETRY_AFTER_SECONDS = 10.0
+
+# The async client and the concurrency cap are bound to the event loop they were
+# created on, so they are rebuilt if a different loop (e.g. a new worker) uses them.
+_async_client: Optional[AsyncGroq] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+_semaphore: Optional[asyncio.Semaphore] = None
+_semaphore_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+@dataclass
+class LLMUsage:
+    """Token usage accumulated over the LLM calls made inside track_usage()."""
+
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+_usage: ContextVar[Optional[LLMUsage]] = ContextVar("llm_usage", default=None)
+
+
+@contextmanager
+def track_usage() -> Iterator[LLMUsage]:
+    """
+    Record usage of every chat_completion awaited in this context, including
+    calls from tasks started inside it (e.g. via asyncio.gather).
+    """
+    usage = LLMUsage()
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def record_usage(response: Any) -> None:
+    usage = _usage.get()
+    if usage is None:
+        return
+    usage.calls += 1
+    response_usage = getattr(response, "usage", None)
+    if response_usage is not None:
+        usage.prompt_tokens += response_usage.prompt_tokens or 0
+        usage.completion_tokens += response_usage.completion_tokens or 0
+
+
+def get_async_groq_client() -> AsyncGroq:
+    """Get or initialize the pooled async Groq client for the running loop."""
+    global _async_client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _async_client is None or _client_loop is not loop:
+        if not settings.GROQ_API_KEY:
+            raise ValueError("GROQ_API_KEY is not set in environment variables")
+
+        http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.LLM_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.LLM_MAX_KEEPALIVE_CONNECTIONS,
+            ),
+            timeout=settings.LLM_TIMEOUT_SECONDS,
+        )
+        _async_client = AsyncGroq(
+            api_key=settings.GROQ_API_KEY,
+            base_url=settings.GROQ_BASE_URL or None,
+            http_client=http_client,
+        )
+        _client_loop = loop
+    return _async_client
+
+
+def get_llm_semaphore() -> asyncio.Semaphore:
+    """Per-process cap on in-flight LLM requests."""
+    global _semaphore, _semaphore_loop
+    loop = asyncio.get_running_loop()
+    if _semaphore is None or _semaphore_loop is not loop:
+        _semaphore = asyncio.Semaphore(settings.LLM_MAX_CONCURRENCY)
+        _semaphore_loop = loop
+    return _semaphore
+
+
+def estimate_request_tokens(kwargs: Dict[str, Any]) -> int:
+    """
+    Tokens to reserve against the tokens-per-minute limit: the prompt plus
+    the expected completion, LLM_EXPECTED_COMPLETION_FRACTION of max_tokens.
+    The difference to actual usage is settled afterwards.
+    """
+    prompt = "\n".join(
+        str(message.get("content") or "") for message in kwargs.get("messages", [])
+    )
+    completion = int(kwargs.get("max_tokens") or 0)
+    return count_tokens(prompt) + math.ceil(
+        completion * settings.LLM_EXPECTED_COMPLETION_FRACTION
+    )
+
+
+def retry_after_seconds(error: RateLimitError) -> float:
+    try:
+        return float(error.response.headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER_SECONDS
+
+
+async def chat_completion(**kwargs: Any) -> Any:
+    """
+    Run a chat completion without blocking the event loop.
+
+    Requests beyond LLM_MAX_CONCURRENCY wait for a free slot, so sections of one
+    paper and jobs from different papers share the same connection pool.
+    Every call first waits for requests/tokens-per-minute capacity in the
+    limiter shared by all workers; a 429 from the provider pauses all of them
+    and the call waits again instead of failing. The provider call itself is
+    limited to LLM_CALL_TIMEOUT_SECONDS.
+    """
+    client = get_async_groq_client()
+    reserved = estimate_request_tokens(kwargs)
+    while True:
+        await acquire_capacity(reserved)
+        # Settled in every case: timeouts, provider errors, cancelled hedges
+        # and 429 retries must not keep their reservation
+        used_tokens = None
+        try:
+            async with get_llm_semaphore():
+                mark_call_started()
+                try:
+                    response = await asyncio.wait_for(
+                        client.chat.completions.create(**kwargs),
+                        timeout=settings.LLM_CALL_TIMEOUT_SECONDS,
+                    )
+                except asyncio.TimeoutError:
+                    hedge_stats.timeouts += 1
+                    raise
+            response_usage = getattr(response, "usage", None)
+            used_tokens = getattr(response_usage, "total_tokens", None) or reserved
+            break
+        except RateLimitError as e:
+            # The drain sets the buckets below zero; returning the
+            # reservation afterwards would undo the pause
+            used_tokens = reserved
+            await report_provider_limit(retry_after_seconds(e))
+        finally:
+            await release_capacity(reserved, used_tokens)
+
+    record_usage(response)
+    return response
+
+
+async def stream_chat_completion(**kwargs: Any) -> AsyncIterator[str]:
+    """
+    Stream a chat completion, yielding content deltas as they arrive.
+
+    The concurrency slot is held until the stream is exhausted or closed.
+    """
+    client = get_async_groq_client()
+    reserved = estimate_request_tokens(kwargs)
+    while True:
+        await acquire_capacity(reserved)
+        try:
+            async with get_llm_semaphore():
+                async for delta in _stream_deltas(client, reserved, kwargs):
+                    yield delta
+            return
+        except RateLimitError as e:
+            await report_provider_limit(retry_after_seconds(e))
+
+
+async def _stream_deltas(
+    client: AsyncGroq, reserved: int, kwargs: Dict[str, Any]
+) -> AsyncIterator[str]:
+    used_tokens = None
+    try:
+        try:
+            stream = await client.chat.completions.create(stream=True, **kwargs)
+        except RateLimitError:
+            # Kept, as in chat_completion: the caller drains the buckets
+            used_tokens = reserved
+            raise
+        # Accepted by the provider: without reported usage (e.g. the stream
+        # is closed early) the reservation is kept
+        used_tokens = reserved
+        usage = _usage.get()
+        if usage is not None:
+            usage.calls += 1
+        try:
+            async for chunk in stream:
+                # Groq reports token usage on the final chunk under x_groq
+                x_groq = getattr(chunk, "x_groq", None)
+                chunk_usage = getattr(x_groq, "usage", None)
+                if chunk_usage is not None:
+                    used_tokens = chunk_usage.total_tokens
+                    if usage is not None:
+                        usage.prompt_tokens += chunk_usage.prompt_tokens or 0
+                        usage.completion_tokens += chunk_usage.completion_tokens or 0
+
+                if chunk.choices and chunk.choices[0].delta.content:
+                    yield chunk.choices[0].delta.content
+        finally:
+            await stream.close()
+    finally:
+        await release_capacity(reserved, used_tokens)
+
+
+async def close_async_client() -> None:
+    """Close the pooled HTTP connections (call on shutdown)."""
+    global _async_client, _client_loop
+    if _async_client is not None:
+        await _async_client.close()
+    _async_client = None
+    _client_loop = None
@@ -0,0 +1,38 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Iterator, List, Optional
+
+# Pipeline stages reported while a paper is generated
+RETRIEVING = "retrieving"
+GENERATING = "generating"
+DEDUPLICATING = "deduplicating"
+
+ProgressCallback = Callable[[str, Optional[List[str]]], None]
+
+_callback: ContextVar[Optional[ProgressCallback]] = ContextVar(
+    "generation_progress", default=None
+)
+
+
+@contextmanager
+def track_progress(callback: ProgressCallback) -> Iterator[None]:
+    """
+    Send the stages reported by the generation pipeline in this context
+    (including tasks it starts) to callback(stage, sections).
+    """
+    token = _callback.set(callback)
+    try:
+        yield
+    finally:
+        _callback.reset(token)
+
+
+def report_progress(stage: str, sections: Optional[List[str]] = None) -> None:
+    """Report a stage, with the sections being generated when generating."""
+    callback = _callback.get()
+    if callback is None:
+        return
+    try:
+        callback(stage, sections)
+    except Exception as e:
+        print(f"Error reporting generation progress: {e}")
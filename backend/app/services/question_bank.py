@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import random
+from typing import Any, Dict, List, Set
+from pydantic import BaseModel
+from app.core.config import settings
+from app.core.supabase import supabase
+from app.services.embedding_worker import embed_texts
+
+# Candidates fetched per requested question; sampling from a wider pool keeps
+# papers assembled from the same bank from being identical.
+BANK_CANDIDATE_FACTOR = 4
+
+# Keep references to background saves so they are not garbage collected
+_pending_saves: Set[asyncio.Task] = set()
+
+
+def question_hash(subject_id: str, question_type: str, text: str) -> str:
+    """Stable identity of a question within a subject, for bank deduplication."""
+    normalized = " ".join(text.lower().split())
+    return hashlib.sha256(
+        f"{subject_id}:{question_type}:{normalized}".encode("utf-8")
+    ).hexdigest()
+
+
+async def fetch_bank_questions(
+    subject_id: str,
+    units: List[int],
+    difficulty: str,
+    question_config: Dict[str, int],
+) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Fetch stored questions matching the paper, up to the requested count per
+    question type. Returns raw question payloads keyed by question type.
+    """
+
+    def fetch(question_type: str, count: int) -> List[Dict[str, Any]]:
+        query = (
+            supabase.table("question_bank")
+            .select("payload")
+            .eq("subject_id", subject_id)
+            .eq("question_type", question_type)
+            .eq("difficulty", difficulty)
+        )
+        if units:
+            query = query.in_("unit", units)
+
+        response = (
+            query.order("created_at", desc=True)
+            .limit(count * BANK_CANDIDATE_FACTOR)
+            .execute()
+        )
+        rows = response.data or []
+        return [row["payload"] for row in random.sample(rows, min(count, len(rows)))]
+
+    requested = {t: c for t, c in question_config.items() if c > 0}
+    results = await asyncio.gather(
+        *(asyncio.to_thread(fetch, t, c) for t, c in requested.items()),
+        return_exceptions=True,
+    )
+
+    bank: Dict[str, List[Dict[str, Any]]] = {}
+    for question_type, result in zip(requested, results):
+        if isinstance(result, Exception):
+            print(f"Error reading question bank for {question_type}: {result}")
+            continue
+        bank[question_type] = result
+    return bank
+
+
+async def save_to_bank(
+    subject_id: str, difficulty: str, sections: Dict[str, List[BaseModel]]
+) -> int:
+    """
+    Store validated questions with a MiniLM embedding of their text.
+    Questions already in the bank are skipped. Returns the rows sent.
+    """
+    rows: Dict[str, Dict[str, Any]] = {}
+    for question_type, questions in sections.items():
+        for question in questions:
+            payload = question.model_dump()
+            content_hash = question_hash(subject_id, question_type, payload["question"])
+            rows[content_hash] = {
+                "subject_id": subject_id,
+                "unit": payload.get("unit"),
+                "question_type": question_type,
+                "difficulty": difficulty,
+                "marks": payload.get("marks"),
+                "question": payload["question"],
+                "payload": payload,
+                "content_hash": content_hash,
+            }
+
+    if not rows:
+        return 0
+
+    bank_rows = list(rows.values())
+    vectors = await embed_texts([row["question"] for row in bank_rows])
+    for row, vector in zip(bank_rows, vectors):
+        row["embedding"] = vector
+
+    await asyncio.to_thread(
+        supabase.table("question_bank")
+        .upsert(bank_rows, on_conflict="content_hash", ignore_duplicates=True)
+        .execute
+    )
+    return len(bank_rows)
+
+
+def schedule_save_to_bank(
+    subject_id: str, difficulty: str, sections: Dict[str, List[BaseModel]]
+) -> None:
+    """Save questions to the bank in the background, off the generation path."""
+    if not settings.QUESTION_BANK_ENABLED or not any(sections.values()):
+        return
+
+    async def run() -> None:
+        try:
+            saved = await save_to_bank(subject_id, difficulty, sections)
+            print(f"Saved {saved} questions to the question bank")
+        except Exception as e:
+            print(f"Error saving questions to the question bank: {e}")
+
+    task = asyncio.create_task(run())
+    _pending_saves.add(task)
+    task.add_done_callback(_pending_saves.discard)
@@ -1,69 +1,355 @@
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
-from typing import List, Dict, Any, Optional
+import hashlib
+import math
+import threading
+from itertools import batched
+from typing import Any, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
 from langchain_text_splitters import RecursiveCharacterTextSplitter
-from langchain_community.embeddings import HuggingFaceEmbeddings
+from app.core.config import settings
 from app.core.supabase import supabase
+from app.services.embedding_backends import create_embeddings_model
+from app.services.embedding_backends import embedding_model_id
+from app.services.embedding_cache import get_query_embedding_cache
+from app.services.embedding_worker import embed_texts
+from app.services.ingestion_progress import COMPLETED, FAILED, get_progress_store
+from app.services.single_flight import SingleFlight
+from app.services.vector_codec import FLOAT32, INT8, check_precision
+from app.services.vector_codec import int8_columns, vector_literal
+from app.services.vector_index import get_local_index
+
+T = TypeVar("T")
 
 # Necessary configuration: all-MiniLM-L6-v2 produces 384-dimensional vectors.
 # If this model is changed, the database schema (embedding column) must be updated.
 MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
 
-# Lazy initialization prevents heavy model loading on app startup
+# Lazy initialization prevents heavy model loading on app startup (unless
+# WARMUP_ENABLED loads it in the background, see app.services.warmup)
 _embeddings_model = None
+# The warm-up thread and a request may ask for the model at the same time
+_embeddings_lock = threading.Lock()
+
+# Identical searches running at the same time share one embedding and RPC
+search_flight = SingleFlight("rag_search")
 
 
 def get_embeddings_model():
     global _embeddings_model
     if _embeddings_model is None:
-        _embeddings_model = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+        with _embeddings_lock:
+            if _embeddings_model is None:
+                _embeddings_model = create_embeddings_model(MODEL_NAME)
     return _embeddings_model
 
 
+def get_embedding_model_id() -> str:
+    """Model and backend the stored and cached vectors must come from."""
+    return embedding_model_id(MODEL_NAME)
+
+
+# Chunking of reference text for embedding
+CHUNK_SIZE = 1000
+CHUNK_OVERLAP = 200
+# Documents are split a window of text at a time, cut at a paragraph break
+SPLIT_WINDOW_CHARS = 50000
+
+
+def get_text_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP,
+        length_function=len,
+        separators=["\n\n", "\n", ". ", " ", ""],
+    )
+
+
+def iter_chunk_texts(content: str) -> Iterator[str]:
+    """
+    Yield the chunks of a document lazily: only one window of text is split
+    at a time, so a whole textbook never exists as a list of chunks.
+    """
+    splitter = get_text_splitter()
+    position = 0
+    while position < len(content):
+        end = min(position + SPLIT_WINDOW_CHARS, len(content))
+        if end < len(content):
+            # Cut where the splitter would prefer to cut anyway
+            for separator in ("\n\n", "\n", ". "):
+                cut = content.rfind(separator, position + SPLIT_WINDOW_CHARS // 2, end)
+                if cut != -1:
+                    end = cut + len(separator)
+                    break
+        chunks = splitter.split_text(content[position:end])
+        if end < len(content) and len(chunks) > 1:
+            # The last chunk is split again with the next window, so chunks
+            # across the boundary overlap like any others
+            *chunks, tail = chunks
+            end = content.rfind(tail, position, end)
+        yield from chunks
+        position = end
+
+
+def estimate_chunk_count(content: str) -> int:
+    return max(1, math.ceil(len(content) / (CHUNK_SIZE - CHUNK_OVERLAP)))
+
+
+async def with_retries(label: str, doc_id: str, call: Callable[[], Awaitable[T]]) -> T:
+    """Run one batch step, retrying with exponential backoff."""
+    for attempt in range(1, settings.INGEST_MAX_ATTEMPTS + 1):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == settings.INGEST_MAX_ATTEMPTS:
+                raise
+            delay = settings.INGEST_RETRY_BACKOFF_SECONDS * 2 ** (attempt - 1)
+            print(
+                f"{label} failed for document {doc_id} (attempt {attempt}), "
+                f"retrying in {delay:.0f}s: {e}"
+            )
+            await asyncio.to_thread(get_progress_store().add, doc_id, retries=1)
+            await asyncio.sleep(delay)
+    raise AssertionError("unreachable")
+
+
+def chunk_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_existing_chunks(doc_id: str) -> List[Dict[str, Any]]:
+    """Identity and metadata of a document's chunks (no content or vectors)."""
+    rows: List[Dict[str, Any]] = []
+    page_size = 1000
+    while True:
+        page = (
+            supabase.table("document_chunks")
+            .select("id, chunk_index, content_hash, embedding_model, metadata")
+            .eq("document_id", doc_id)
+            .order("chunk_index")
+            .range(len(rows), len(rows) + page_size - 1)
+            .execute()
+        ).data or []
+        rows.extend(page)
+        if len(page) < page_size:
+            return rows
+
+
 async def process_document_chunks(
     doc_id: str, content: str, metadata: Dict[str, Any] = None
 ) -> int:
     """
     Chunk document content, generate embeddings, and store in Supabase.
     Returns the number of chunks created.
+
+    Reprocessing is incremental: a chunk whose text hash and embedding model
+    ID (model and backend, see embedding_model_id) match an existing chunk
+    of the document keeps its row (only its chunk_index and metadata are
+    updated if they changed), new or changed chunks are embedded and inserted, and chunks that
+    are no longer produced are deleted afterwards. An unchanged document
+    embeds and writes nothing.
+
+    Chunks are produced lazily and handled INGEST_BATCH_SIZE at a time: a
+    batch is inserted while the next one is embedded, so memory holds at
+    most two batches and no request body grows with the document. Each
+    batch is retried on failure; progress is recorded for
+    GET /api/rag/status/{doc_id}.
     """
     if not content:
         return 0
 
-    embeddings = get_embeddings_model()
+    precision = check_precision(settings.VECTOR_PRECISION)
+    progress = get_progress_store()
+    await asyncio.to_thread(progress.start, doc_id, estimate_chunk_count(content))
 
-    text_splitter = RecursiveCharacterTextSplitter(
-        chunk_size=1000,
-        chunk_overlap=200,
-        length_function=len,
-        separators=["\n\n", "\n", ". ", " ", ""],
-    )
+    # Reusable rows by hash, in chunk order; the rest become orphans
+    existing = await asyncio.to_thread(load_existing_chunks, doc_id)
+    model_id = get_embedding_model_id()
+    chunk_metadata = dict(metadata or {})
+    reusable: Dict[str, List[Dict[str, Any]]] = {}
+    orphans: List[str] = []
+    for row in existing:
+        if row.get("content_hash") and row.get("embedding_model") == model_id:
+            reusable.setdefault(row["content_hash"], []).append(row)
+        else:
+            orphans.append(row["id"])
+
+    def insert(rows: List[Dict[str, Any]]) -> Awaitable[Any]:
+        return asyncio.to_thread(supabase.table("document_chunks").insert(rows).execute)
+
+    def move(rows: List[Dict[str, Any]]) -> Awaitable[Any]:
+        return asyncio.to_thread(supabase.table("document_chunks").upsert(rows).execute)
+
+    stored = 0
+
+    async def store(rows: List[Dict[str, Any]], moved: List[Dict[str, Any]]) -> None:
+        nonlocal stored
+        if rows:
+            await with_retries("Chunk insert", doc_id, lambda: insert(rows))
+            stored += len(rows)
+        if moved:
+            await with_retries("Chunk reindex", doc_id, lambda: move(moved))
+        await asyncio.to_thread(
+            progress.add, doc_id, chunks_stored=len(rows), batches=1
+        )
+
+    moved_count = 0
+    pending: Optional[asyncio.Task] = None
+    try:
+        chunk_index = 0
+        for texts in batched(iter_chunk_texts(content), settings.INGEST_BATCH_SIZE):
+            new_chunks = []
+            moved = []
+            for text in texts:
+                content_hash = chunk_hash(text)
+                matches = reusable.get(content_hash)
+                if matches:
+                    row = matches.pop(0)
+                    # Unit and subject filters read the metadata, so a reused
+                    # row takes the document's current one
+                    if (
+                        row["chunk_index"] != chunk_index
+                        or row.get("metadata") != chunk_metadata
+                    ):
+                        moved.append(
+                            {
+                                "id": row["id"],
+                                "document_id": doc_id,
+                                "chunk_index": chunk_index,
+                                "content": text,
+                                "metadata": chunk_metadata,
+                            }
+                        )
+                else:
+                    new_chunks.append((chunk_index, text, content_hash))
+                chunk_index += 1
+
+            skipped = len(texts) - len(new_chunks)
+            if skipped:
+                await asyncio.to_thread(progress.add, doc_id, chunks_skipped=skipped)
+            moved_count += len(moved)
+            if not new_chunks and not moved:
+                continue
 
-    chunks = text_splitter.create_documents([content], metadatas=[metadata or {}])
+            vectors: List[List[float]] = []
+            if new_chunks:
+                vectors = await with_retries(
+                    "Embedding",
+                    doc_id,
+                    lambda: embed_texts([text for _, text, _ in new_chunks]),
+                )
+                await asyncio.to_thread(
+                    progress.add, doc_id, chunks_embedded=len(new_chunks)
+                )
 
-    texts = [chunk.page_content for chunk in chunks]
+            rows = [
+                {
+                    "document_id": doc_id,
+                    "chunk_index": index,
+                    "content": text,
+                    "metadata": dict(chunk_metadata),
+                    "embedding": vector_literal(vector),
+                    "content_hash": content_hash,
+                    "embedding_model": model_id,
+                }
+                for (index, text, content_hash), vector in zip(new_chunks, vectors)
+            ]
+            if precision == INT8:
+                for row, columns in zip(rows, int8_columns(vectors)):
+                    row.update(columns)
 
-    # Run embedding generation in a separate thread to avoid blocking the event loop
-    loop = asyncio.get_running_loop()
-    with ThreadPoolExecutor() as pool:
-        vectors = await loop.run_in_executor(pool, embeddings.embed_documents, texts)
+            # The previous batch was inserted while this one was embedded
+            if pending is not None:
+                await pending
+            pending = asyncio.create_task(store(rows, moved))
 
-    chunk_data = []
-    for i, (chunk, vector) in enumerate(zip(chunks, vectors)):
-        chunk_data.append(
-            {
-                "document_id": doc_id,
-                "chunk_index": i,
-                "content": chunk.page_content,
-                "metadata": chunk.metadata,
-                "embedding": vector,
+        if pending is not None:
+            await pending
+
+        # Only now, so searches never miss a part of the document
+        orphans.extend(row["id"] for rows in reusable.values() for row in rows)
+        for ids in batched(orphans, 200):
+            await with_retries(
+                "Orphan delete",
+                doc_id,
+                lambda: asyncio.to_thread(
+                    supabase.table("document_chunks")
+                    .delete()
+                    .in_("id", list(ids))
+                    .execute
+                ),
+            )
+            await asyncio.to_thread(progress.add, doc_id, chunks_deleted=len(ids))
+    except Exception as e:
+        if pending is not None:
+            pending.cancel()
+        await asyncio.to_thread(progress.finish, doc_id, FAILED, str(e))
+        print(f"Ingestion of document {doc_id} failed after {stored} chunks: {e}")
+        raise
+    finally:
+        if stored or moved_count or orphans:
+            # Including the subject the document's chunks had before
+            subjects = {
+                (row.get("metadata") or {}).get("subject_id") for row in existing
             }
+            for subject_id in subjects | {chunk_metadata.get("subject_id")}:
+                invalidate_local_index(subject_id)
+
+    await asyncio.to_thread(progress.finish, doc_id, COMPLETED)
+    if stored or moved_count or orphans:
+        print(
+            f"Document {doc_id}: {stored} chunks embedded, {moved_count} moved or updated, "
+            f"{len(orphans)} deleted, {chunk_index - stored} reused"
         )
+    else:
+        print(f"Document {doc_id} is unchanged; nothing embedded")
+    return stored
+
+
+def match_rpc(name: str, params: Dict[str, Any]) -> Any:
+    """
+    Build a match RPC call. The query vector goes over the wire in its
+    shortest text form; with compact vectors the *_compact variant ranks
+    candidates on the halfvec index and re-scores them at full precision.
+    """
+    params = {**params, "query_embedding": vector_literal(params["query_embedding"])}
+    if check_precision(settings.VECTOR_PRECISION) != FLOAT32:
+        name = f"{name}_compact"
+        params["rescore_factor"] = settings.VECTOR_RESCORE_FACTOR
+    return supabase.rpc(name, params)
+
+
+def invalidate_local_index(subject_id: Optional[str]) -> None:
+    """Reload a subject's local index after this process changed its chunks."""
+    index = get_local_index()
+    if index is not None and subject_id:
+        index.invalidate(str(subject_id))
+
 
-    if chunk_data:
-        supabase.table("document_chunks").insert(chunk_data).execute()
+async def embed_queries(queries: List[str]) -> List[List[float]]:
+    """
+    Embed search queries, reusing cached vectors of queries seen before
+    (e.g. the per-subject retrieval query of every generation).
+    """
+    cache = get_query_embedding_cache()
+    if cache is None:
+        return await embed_texts(queries)
+
+    # The on-disk tier is a SQLite read; keep it off the event loop
+    if cache.disk is not None:
+        vectors = await asyncio.to_thread(cache.get_many, queries)
+    else:
+        vectors = cache.get_many(queries)
 
-    return len(chunk_data)
+    missing = [i for i, vector in enumerate(vectors) if vector is None]
+    if missing:
+        computed = await embed_texts([queries[i] for i in missing])
+        for i, vector in zip(missing, computed):
+            vectors[i] = vector
+        items = [(queries[i], vectors[i]) for i in missing]
+        if cache.disk is not None:
+            await asyncio.to_thread(cache.set_many, items)
+        else:
+            cache.set_many(items)
+    return vectors
 
 
 async def search_similar_chunks(
@@ -71,13 +357,28 @@ async def search_similar_chunks(
 ) -> List[Dict[str, Any]]:
     """
     Search for similar chunks using vector similarity via Supabase RPC.
+
+    Concurrent calls with the same arguments are coalesced into one search.
     """
-    embeddings = get_embeddings_model()
+    query = query.strip()
+    results = await search_flight.do(
+        ("query", query, subject_id, limit, threshold),
+        lambda: run_similarity_search(query, subject_id, limit, threshold),
+    )
+    return list(results)
 
-    # Run query embedding in a separate thread
-    loop = asyncio.get_running_loop()
-    with ThreadPoolExecutor() as pool:
-        query_vector = await loop.run_in_executor(pool, embeddings.embed_query, query)
+
+async def run_similarity_search(
+    query: str, subject_id: Optional[str], limit: int, threshold: float
+) -> List[Dict[str, Any]]:
+    # Cached, or batched with other queries arriving at the same time
+    (query_vector,) = await embed_queries([query])
+
+    index = get_local_index()
+    if index is not None and subject_id:
+        local = index.search(subject_id, query_vector, limit, threshold)
+        if local is not None:
+            return local
 
     params = {
         "query_embedding": query_vector,
@@ -86,5 +387,82 @@ async def search_similar_chunks(
         "filter_subject_id": subject_id,
     }
 
-    response = supabase.rpc("match_document_chunks", params).execute()
-    return response.data
+    response = await asyncio.to_thread(
+        match_rpc("match_document_chunks", params).execute
+    )
+    return response.data or []
+
+
+async def search_chunks_by_units(
+    queries: Dict[int, str],
+    subject_id: str,
+    limit_per_unit: int = 5,
+    threshold: float = 0.5,
+) -> Dict[int, List[Dict[str, Any]]]:
+    """
+    Search each unit's documents with its own query, concurrently.
+
+    All unit queries are embedded in one batch, then one
+    match_unit_chunks RPC per unit runs in parallel. Concurrent calls with
+    the same arguments are coalesced into one search.
+    """
+    if not queries:
+        return {}
+
+    key = (
+        "units",
+        subject_id,
+        tuple(sorted(queries.items())),
+        limit_per_unit,
+        threshold,
+    )
+    results = await search_flight.do(
+        key,
+        lambda: run_unit_searches(queries, subject_id, limit_per_unit, threshold),
+    )
+    return {unit: list(chunks) for unit, chunks in results.items()}
+
+
+async def run_unit_searches(
+    queries: Dict[int, str], subject_id: str, limit_per_unit: int, threshold: float
+) -> Dict[int, List[Dict[str, Any]]]:
+    units = list(queries)
+    query_vectors = await embed_queries([queries[unit] for unit in units])
+
+    index = get_local_index()
+    if index is not None:
+        local = {
+            unit: index.search(
+                subject_id,
+                vector,
+                limit_per_unit,
+                threshold,
+                unit=unit,
+                include_embedding=True,
+            )
+            for unit, vector in zip(units, query_vectors)
+        }
+        if all(chunks is not None for chunks in local.values()):
+            return local
+
+    def match_unit(unit: int, query_vector: List[float]) -> List[Dict[str, Any]]:
+        params = {
+            "query_embedding": query_vector,
+            "match_threshold": threshold,
+            "match_count": limit_per_unit,
+            "filter_subject_id": subject_id,
+            "filter_unit_number": unit,
+        }
+        return match_rpc("match_unit_chunks", params).execute().data or []
+
+    results = await asyncio.gather(
+        *(
+            asyncio.to_thread(match_unit, unit, vector)
+            for unit, vector in zip(units, query_vectors)
+        )
+    )
+    return dict(zip(units, results))
+
+
+def get_search_stats() -> Dict[str, Any]:
+    return search_flight.summary()
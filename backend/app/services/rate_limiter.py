@@ -0,0 +1,258 @@
+import asyncio
+import random
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+from app.core.config import settings
+
+# Bucket names; each refills continuously up to its per-minute capacity
+REQUESTS = "requests"
+TOKENS = "tokens"
+
+# Upper bound on one sleep, so capacity returned by reconcile() is noticed
+MAX_SLEEP_SECONDS = 5.0
+
+
+class RateLimitTimeout(Exception):
+    """Raised when capacity did not free up within the configured wait."""
+
+
+class LimiterStats:
+    def __init__(self) -> None:
+        self.acquired = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.provider_limited = 0
+        self._lock = threading.Lock()
+
+    def record(self, wait_seconds: float) -> None:
+        with self._lock:
+            self.acquired += 1
+            if wait_seconds > 0:
+                self.waited += 1
+                self.wait_seconds += wait_seconds
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "acquired": self.acquired,
+            "waited": self.waited,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "provider_limited": self.provider_limited,
+        }
+
+
+class SQLiteTokenBucket:
+    """
+    Requests-per-minute and tokens-per-minute token buckets shared by every
+    worker process on the host through one SQLite file.
+
+    Each acquire runs in a BEGIN IMMEDIATE transaction, so refilling and
+    debiting both buckets is atomic across processes. Token reservations
+    are an estimate; reconcile() settles them once actual usage is known.
+    """
+
+    name = "sqlite"
+
+    def __init__(
+        self, path: str, requests_per_minute: int, tokens_per_minute: int
+    ) -> None:
+        self.path = path
+        self.capacity = {REQUESTS: requests_per_minute, TOKENS: tokens_per_minute}
+        self.stats = LimiterStats()
+        with self._transaction() as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS rate_limit_buckets ("
+                "name TEXT PRIMARY KEY, level REAL NOT NULL, "
+                "updated_at REAL NOT NULL)"
+            )
+            now = time.time()
+            for name, capacity in self.capacity.items():
+                conn.execute(
+                    "INSERT OR IGNORE INTO rate_limit_buckets VALUES (?, ?, ?)",
+                    (name, capacity, now),
+                )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def _levels(self, conn: sqlite3.Connection, now: float) -> Dict[str, float]:
+        """Current bucket levels after refilling for the time since last update."""
+        levels = {}
+        for name, level, updated_at in conn.execute(
+            "SELECT name, level, updated_at FROM rate_limit_buckets"
+        ):
+            capacity = self.capacity.get(name)
+            if capacity is None:
+                continue
+            refill = max(now - updated_at, 0.0) * capacity / 60.0
+            levels[name] = min(capacity, level + refill)
+        return levels
+
+    def _store(
+        self, conn: sqlite3.Connection, levels: Dict[str, float], now: float
+    ) -> None:
+        conn.executemany(
+            "UPDATE rate_limit_buckets SET level = ?, updated_at = ? WHERE name = ?",
+            [(level, now, name) for name, level in levels.items()],
+        )
+
+    def try_acquire(self, tokens: int) -> float:
+        """
+        Take one request and tokens from the buckets if both have capacity.
+        Returns 0 on success, otherwise the seconds until they should.
+        """
+        # A single request larger than the whole bucket could never fit
+        tokens = min(tokens, self.capacity[TOKENS])
+        now = time.time()
+        with self._transaction() as conn:
+            levels = self._levels(conn, now)
+            wanted = {REQUESTS: 1, TOKENS: tokens}
+            wait = max(
+                (wanted[name] - levels[name]) * 60.0 / self.capacity[name]
+                for name in wanted
+            )
+            if wait <= 0:
+                for name in wanted:
+                    levels[name] -= wanted[name]
+            self._store(conn, levels, now)
+        return max(wait, 0.0)
+
+    def reconcile(self, reserved_tokens: int, used_tokens: int) -> None:
+        """Return unused reserved tokens, or take the extra that was used."""
+        if reserved_tokens == used_tokens:
+            return
+        now = time.time()
+        with self._transaction() as conn:
+            levels = self._levels(conn, now)
+            levels[TOKENS] = min(
+                self.capacity[TOKENS], levels[TOKENS] + reserved_tokens - used_tokens
+            )
+            self._store(conn, levels, now)
+
+    def drain(self, seconds: float) -> None:
+        """
+        The provider rejected a request: empty both buckets so that every
+        worker waits at least `seconds` before the next call.
+        """
+        self.stats.provider_limited += 1
+        now = time.time()
+        with self._transaction() as conn:
+            levels = {
+                name: -seconds * capacity / 60.0
+                for name, capacity in self.capacity.items()
+            }
+            self._store(conn, levels, now)
+
+    def headroom(self) -> Dict[str, Any]:
+        """Capacity currently available in each bucket."""
+        now = time.time()
+        with self._transaction() as conn:
+            levels = self._levels(conn, now)
+        return {
+            name: {
+                "capacity_per_minute": capacity,
+                "available": round(max(levels[name], 0.0), 1),
+                "headroom": round(max(levels[name], 0.0) / capacity, 4),
+            }
+            for name, capacity in self.capacity.items()
+        }
+
+
+_rate_limiter = None
+_limiter_initialized = False
+
+
+def get_rate_limiter() -> Optional[SQLiteTokenBucket]:
+    """Get the shared LLM rate limiter, or None if rate limiting is disabled."""
+    global _rate_limiter, _limiter_initialized
+    if not _limiter_initialized:
+        backend = settings.LLM_RATE_LIMIT_BACKEND.lower()
+        if backend == "sqlite":
+            _rate_limiter = SQLiteTokenBucket(
+                settings.LLM_RATE_LIMIT_PATH,
+                settings.LLM_REQUESTS_PER_MINUTE,
+                settings.LLM_TOKENS_PER_MINUTE,
+            )
+        elif backend != "none":
+            raise ValueError(
+                f"Unknown LLM_RATE_LIMIT_BACKEND: {settings.LLM_RATE_LIMIT_BACKEND}"
+            )
+        _limiter_initialized = True
+    return _rate_limiter
+
+
+async def acquire_capacity(tokens: int) -> None:
+    """
+    Wait until one request and `tokens` tokens are available across all
+    workers, then take them. Raises RateLimitTimeout after
+    LLM_RATE_LIMIT_MAX_WAIT_SECONDS.
+    """
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return
+
+    started = time.monotonic()
+    slept = False
+    while True:
+        wait = await asyncio.to_thread(limiter.try_acquire, tokens)
+        waited = time.monotonic() - started
+        if wait <= 0:
+            limiter.stats.record(waited if slept else 0.0)
+            return
+        if waited + wait > settings.LLM_RATE_LIMIT_MAX_WAIT_SECONDS:
+            raise RateLimitTimeout(
+                f"LLM rate limit capacity not available within "
+                f"{settings.LLM_RATE_LIMIT_MAX_WAIT_SECONDS}s"
+            )
+        # Jitter keeps waiting workers from retrying in lockstep
+        await asyncio.sleep(min(wait, MAX_SLEEP_SECONDS) * random.uniform(1.0, 1.2))
+        slept = True
+
+
+async def release_capacity(reserved_tokens: int, used_tokens: Optional[int]) -> None:
+    """
+    Settle a reservation with the tokens the provider reported. None means
+    the call failed or was cancelled without a response, and the whole
+    reservation is returned.
+    """
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return
+    used = used_tokens if used_tokens is not None else 0
+    await asyncio.to_thread(limiter.reconcile, reserved_tokens, used)
+
+
+async def report_provider_limit(retry_after: float) -> None:
+    """
+    Pause LLM calls after a 429: every worker through the limiter, or just
+    this call when rate limiting is disabled.
+    """
+    limiter = get_rate_limiter()
+    if limiter is None:
+        await asyncio.sleep(retry_after)
+        return
+    await asyncio.to_thread(limiter.drain, retry_after)
+
+
+def get_rate_limit_stats() -> Dict[str, Any]:
+    limiter = get_rate_limiter()
+    if limiter is None:
+        return {"backend": "none"}
+    return {
+        "backend": limiter.name,
+        **limiter.headroom(),
+        **limiter.stats.as_dict(),
+    }
@@ -0,0 +1,51 @@
+import asyncio
+from dataclasses import asdict, dataclass
+from typing import Any, Awaitable, Callable, Dict, Hashable, TypeVar
+
+T = TypeVar("T")
+
+
+@dataclass
+class SingleFlightStats:
+    calls: int = 0
+    # Calls that joined a computation another caller had started
+    shared: int = 0
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls: while a computation for a key is in
+    flight, further calls with the same key wait for it and receive its
+    result (or exception) instead of starting their own. Nothing is kept
+    after it finishes; this is not a cache.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+        self.stats = SingleFlightStats()
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        self.stats.calls += 1
+        loop = asyncio.get_running_loop()
+        task = self._calls.get(key)
+        if task is None or task.get_loop() is not loop:
+            task = loop.create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.stats.shared += 1
+
+        # A caller that disconnects must not cancel the others' computation
+        return await asyncio.shield(task)
+
+    def _forget(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Retrieved by the waiters; avoids "exception never retrieved"
+            # when all of them were cancelled
+            task.exception()
+
+    def summary(self) -> Dict[str, Any]:
+        return {**asdict(self.stats), "in_flight": len(self._calls)}
@@ -0,0 +1,63 @@
+import asyncio
+import threading
+from typing import Optional
+from tokenizers import Tokenizer
+from app.core.config import settings
+
+# Rough characters per token for English text, used when the tokenizer of
+# the generation model cannot be loaded (e.g. offline) or is still loading
+CHARS_PER_TOKEN = 4
+
+# Lazy initialization; False marks a failed load so it is not retried
+_tokenizer = None
+_tokenizer_lock = threading.Lock()
+_loading: Optional[asyncio.Task] = None
+
+
+def load_tokenizer():
+    """Load the tokenizer of the generation model (blocking, may download it)."""
+    global _tokenizer
+    with _tokenizer_lock:
+        if _tokenizer is None:
+            try:
+                _tokenizer = Tokenizer.from_pretrained(settings.LLM_TOKENIZER)
+            except Exception as e:
+                print(f"Could not load tokenizer {settings.LLM_TOKENIZER}: {e}")
+                print("Falling back to estimated token counts")
+                _tokenizer = False
+    return _tokenizer or None
+
+
+def start_tokenizer_load() -> None:
+    """Start loading the tokenizer in a thread if it is not loaded or loading."""
+    global _loading
+    if _tokenizer is None and (_loading is None or _loading.done()):
+        _loading = asyncio.get_running_loop().create_task(
+            asyncio.to_thread(load_tokenizer)
+        )
+
+
+def get_tokenizer():
+    """
+    Get the tokenizer of the generation model, or None if unavailable. On the
+    event loop the load (a Hub download) runs in a thread and None is
+    returned until it has finished; elsewhere it loads in place.
+    """
+    if _tokenizer is not None:
+        return _tokenizer or None
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return load_tokenizer()
+    start_tokenizer_load()
+    return None
+
+
+def count_tokens(text: str, tokenizer: Optional[Tokenizer] = None) -> int:
+    """Count prompt tokens of text for the generation model."""
+    if not text:
+        return 0
+    tokenizer = tokenizer or get_tokenizer()
+    if tokenizer is None:
+        return -(-len(text) // CHARS_PER_TOKEN)
+    return len(tokenizer.encode(text, add_special_tokens=False).ids)
@@ -0,0 +1,148 @@
+import copy
+import random
+import re
+from typing import Any, Dict, List, Optional
+
+# Sections of the questions JSON, in paper order
+QUESTION_KEYS = ["mcqs", "fill_blanks", "short", "long"]
+
+OPTION_LETTERS = "ABCD"
+
+# "A) text", "(b) text", "C. text", "D: text"
+OPTION_LABEL = re.compile(r"^\s*\(?([A-Da-d])[\).:]\s+")
+
+# Options that refer to other options stay where they are
+ANCHORED_OPTION = re.compile(
+    r"\b(all|none|both|neither) of the (above|options)\b|\bboth\b.*\band\b|"
+    r"\bonly [a-d]\b",
+    re.IGNORECASE,
+)
+
+
+def variant_rng(seed: str, index: int) -> random.Random:
+    """Random generator for one variant, reproducible from seed and index."""
+    return random.Random(f"{seed}:{index}")
+
+
+def split_label(option: str) -> tuple:
+    """Split "B) text" into ("B", "text"); unlabelled options give (None, option)."""
+    match = OPTION_LABEL.match(option)
+    if match is None:
+        return None, option
+    return match.group(1).upper(), option[match.end() :]
+
+
+def shuffle_options(mcq: Dict[str, Any], rng: random.Random) -> Dict[str, Any]:
+    """
+    Permute the options of an MCQ and remap correct_answer, whether it holds
+    the option text, an option letter ("B") or a labelled option ("B) text").
+    Options like "All of the above" keep their position, and option labels
+    are rewritten to match the new order.
+    """
+    options: List[str] = list(mcq.get("options", []))
+    if len(options) < 2:
+        return mcq
+
+    labels, texts = zip(*(split_label(option) for option in options))
+    labelled = all(label is not None for label in labels)
+
+    movable = [i for i, text in enumerate(texts) if not ANCHORED_OPTION.search(text)]
+    shuffled = movable[:]
+    rng.shuffle(shuffled)
+    order = list(range(len(options)))
+    for position, source in zip(movable, shuffled):
+        order[position] = source
+
+    def render(position: int, source: int) -> str:
+        if labelled and position < len(OPTION_LETTERS):
+            return f"{OPTION_LETTERS[position]}) {texts[source]}"
+        return options[source]
+
+    new_options = [render(position, source) for position, source in enumerate(order)]
+    new_position = {source: position for position, source in enumerate(order)}
+
+    variant = dict(mcq)
+    variant["options"] = new_options
+    variant["correct_answer"] = remap_answer(
+        str(mcq.get("correct_answer", "")), options, texts, new_options, new_position
+    )
+    return variant
+
+
+def remap_answer(
+    answer: str,
+    options: List[str],
+    texts: List[str],
+    new_options: List[str],
+    new_position: Dict[int, int],
+) -> str:
+    stripped = answer.strip()
+
+    # The full option as written (possibly with its label)
+    if stripped in options:
+        return new_options[new_position[options.index(stripped)]]
+
+    label, text = split_label(stripped)
+    # Just the option text, with or without a label in front
+    for source, option_text in enumerate(texts):
+        if option_text.strip().lower() == text.strip().lower():
+            if label is None:
+                return option_text
+            return new_options[new_position[source]]
+
+    # A bare letter ("B", "b", "(B)", "Option B")
+    letter = re.fullmatch(r"(?:option\s*)?\(?([A-Da-d])\)?\.?", stripped, re.I)
+    if letter is not None:
+        source = OPTION_LETTERS.index(letter.group(1).upper())
+        if source < len(options):
+            return OPTION_LETTERS[new_position[source]]
+
+    return answer
+
+
+def derive_variant(
+    questions: Dict[str, Any], seed: str, index: int, shuffle_questions: bool = True
+) -> Dict[str, Any]:
+    """
+    Derive one variant of a paper's questions: questions reordered within
+    each section and MCQ options permuted. No question text changes.
+    """
+    rng = variant_rng(seed, index)
+    variant = copy.deepcopy(questions)
+
+    for key in QUESTION_KEYS:
+        items = variant.get(key)
+        if not isinstance(items, list):
+            continue
+        if shuffle_questions:
+            rng.shuffle(items)
+        if key == "mcqs":
+            variant[key] = [
+                shuffle_options(item, rng) if isinstance(item, dict) else item
+                for item in items
+            ]
+
+    return variant
+
+
+def derive_variants(
+    questions: Dict[str, Any],
+    count: int,
+    seed: str,
+    shuffle_questions: bool = True,
+    start: int = 1,
+) -> List[Dict[str, Any]]:
+    """
+    Derive `count` variants numbered from `start`. The same seed and number
+    always give the same variant, so a variant can be re-derived for export
+    instead of being stored.
+    """
+    return [
+        derive_variant(questions, seed, index, shuffle_questions)
+        for index in range(start, start + count)
+    ]
+
+
+def variant_seed(paper_id: str, seed: Optional[str]) -> str:
+    """Variants of a paper default to being seeded by the paper id."""
+    return seed if seed else str(paper_id)
@@ -0,0 +1,70 @@
+from typing import Any, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Precisions of the compact vector representation (VECTOR_PRECISION)
+FLOAT32 = "float32"
+FLOAT16 = "float16"
+INT8 = "int8"
+PRECISIONS = (FLOAT32, FLOAT16, INT8)
+
+# Bytes per dimension of a vector held in memory at each precision
+BYTES_PER_DIMENSION = {FLOAT32: 4, FLOAT16: 2, INT8: 1}
+
+
+def check_precision(precision: str) -> str:
+    precision = precision.lower()
+    if precision not in PRECISIONS:
+        raise ValueError(f"Unknown VECTOR_PRECISION: {precision}")
+    return precision
+
+
+def vector_literal(vector: Sequence[float], precision: str = FLOAT32) -> str:
+    """
+    pgvector text literal of a vector, with each value written in the fewest
+    digits that read back to the same float32 (or float16, for a halfvec).
+    Python floats of a float32 vector serialize to JSON in up to 17 digits;
+    the extra digits carry nothing and roughly double the payload.
+    """
+    dtype = np.float16 if precision == FLOAT16 else np.float32
+    values = np.asarray(vector, dtype=dtype)
+    return "[" + ",".join(map(str, values)) + "]"
+
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Symmetric int8 quantization with one scale per row: row ~= q * scale.
+    The scale maps the row's largest absolute value to 127.
+    """
+    matrix = np.asarray(matrix, dtype=np.float32)
+    scales = np.abs(matrix).max(axis=1) / 127
+    scales[scales == 0] = 1
+    quantized = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+def dequantize_int8(quantized: np.ndarray, scales: np.ndarray) -> np.ndarray:
+    return quantized.astype(np.float32) * scales[:, None]
+
+
+def int8_literal(quantized_row: np.ndarray) -> str:
+    """bytea hex literal of a quantized row, as PostgREST accepts and returns it."""
+    return "\\x" + quantized_row.astype(np.int8).tobytes().hex()
+
+
+def parse_int8(value: Any) -> Optional[np.ndarray]:
+    if value is None:
+        return None
+    if isinstance(value, str):
+        value = bytes.fromhex(value[2:] if value.startswith("\\x") else value)
+    return np.frombuffer(value, dtype=np.int8)
+
+
+def int8_columns(vectors: List[List[float]]) -> List[dict]:
+    """embedding_int8 / embedding_scale values of freshly embedded chunks."""
+    if not vectors:
+        return []
+    quantized, scales = quantize_int8(np.asarray(vectors, dtype=np.float32))
+    return [
+        {"embedding_int8": int8_literal(row), "embedding_scale": float(scale)}
+        for row, scale in zip(quantized, scales)
+    ]
@@ -0,0 +1,371 @@
+import asyncio
+import tempfile
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Set
+import numpy as np
+from app.core.config import settings
+from app.core.supabase import supabase
+from app.services.context_builder import parse_embedding
+from app.services.vector_codec import (
+    FLOAT16,
+    FLOAT32,
+    INT8,
+    check_precision,
+    quantize_int8,
+)
+
+# Columns loaded per chunk, as the match RPCs return them
+CHUNK_COLUMNS = "id, document_id, chunk_index, content, metadata"
+
+# Compact vectors are widened to float32 this many rows at a time when scanned
+SCAN_BLOCK_ROWS = 4096
+
+MB = 1024 * 1024
+
+# Rough per-row overhead of the Python objects kept for a chunk
+ROW_OVERHEAD_BYTES = 600
+
+
+@dataclass
+class SubjectIndex:
+    """
+    All chunks of one subject with unit-normalized embeddings, searched by
+    cosine similarity (one matrix-vector product).
+
+    With VECTOR_PRECISION=int8 the vectors are kept in memory as int8 rows
+    plus, per row, the inverse of its norm (the quantization scale cancels
+    out of a cosine), and the float32 rows in a memory-mapped temporary file.
+    The int8 scan picks the nearest limit * rescore_factor rows, which are
+    re-scored on the float32 ones, as the compact match RPCs do. The query
+    stays float32.
+    """
+
+    subject_id: str
+    version: int
+    rows: List[Dict[str, Any]]
+    vectors: np.ndarray
+    units: np.ndarray
+    nbytes: int
+    checked_at: float
+    precision: str = FLOAT32
+    inverse_norms: Optional[np.ndarray] = None
+    full_vectors: Optional[np.ndarray] = None
+    rescore_factor: int = 1
+
+    def similarities(self, query: np.ndarray) -> np.ndarray:
+        """Cosine similarity of every row to a unit-normalized query."""
+        if self.vectors.dtype == np.float32:
+            return self.vectors @ query
+        similarities = np.empty(len(self.rows), dtype=np.float32)
+        for start in range(0, len(self.rows), SCAN_BLOCK_ROWS):
+            block = self.vectors[start : start + SCAN_BLOCK_ROWS]
+            similarities[start : start + len(block)] = block.astype(np.float32) @ query
+        if self.inverse_norms is not None:
+            similarities *= self.inverse_norms
+        return similarities
+
+    def vector(self, i: int) -> List[float]:
+        if self.full_vectors is not None:
+            return np.asarray(self.full_vectors[i]).tolist()
+        return self.vectors[i].astype(np.float32).tolist()
+
+    def search(
+        self,
+        query_vector: List[float],
+        limit: int,
+        threshold: float,
+        unit: Optional[int] = None,
+        include_embedding: bool = False,
+    ) -> List[Dict[str, Any]]:
+        if not self.rows or limit <= 0:
+            return []
+        query = np.asarray(query_vector, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        if norm == 0:
+            return []
+        query /= norm
+        similarities = self.similarities(query)
+
+        if unit is None:
+            candidates = np.arange(len(self.rows))
+        else:
+            candidates = np.flatnonzero(self.units == unit)
+        scores = similarities[candidates]
+        if self.full_vectors is not None:
+            pool = limit * self.rescore_factor
+            if len(candidates) > pool:
+                top = np.argpartition(-scores, pool - 1)[:pool]
+                # In file order, so the rows are read front to back
+                candidates = np.sort(candidates[top])
+            scores = np.asarray(self.full_vectors[candidates]) @ query
+
+        # Same filter as the RPCs: similarity above the threshold
+        keep = scores > threshold
+        candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > limit:
+            top = np.argpartition(-scores, limit - 1)[:limit]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores)
+
+        results = []
+        for i, score in zip(candidates[order], scores[order]):
+            row = {**self.rows[i], "similarity": float(score)}
+            if include_embedding:
+                row["embedding"] = self.vector(i)
+            results.append(row)
+        return results
+
+
+def fetch_corpus_version(subject_id: str) -> int:
+    response = (
+        supabase.table("subject_corpus_versions")
+        .select("version")
+        .eq("subject_id", subject_id)
+        .execute()
+    )
+    return int(response.data[0]["version"]) if response.data else 0
+
+
+def load_subject_index(subject_id: str, version: int) -> SubjectIndex:
+    """Read every chunk of a subject from document_chunks, a page at a time."""
+    # float16 only applies to the RPCs: numpy widens float16 in software, so
+    # a float16 scan is slower than the float32 one and the index stays float32
+    precision = check_precision(settings.VECTOR_PRECISION)
+    if precision == FLOAT16:
+        precision = FLOAT32
+    rows: List[Dict[str, Any]] = []
+    vectors: List[Any] = []
+    units: List[int] = []
+    page_size = settings.LOCAL_INDEX_PAGE_SIZE
+    start = 0
+    while True:
+        page = (
+            supabase.table("document_chunks")
+            .select(
+                f"{CHUNK_COLUMNS}, embedding, documents!inner(subject_id, unit_number)"
+            )
+            .eq("documents.subject_id", subject_id)
+            .order("id")
+            .range(start, start + page_size - 1)
+            .execute()
+        ).data or []
+        for chunk in page:
+            embedding = parse_embedding(chunk.pop("embedding", None))
+            document = chunk.pop("documents", None) or {}
+            if embedding is None:
+                continue
+            rows.append(chunk)
+            vectors.append(embedding)
+            unit_number = document.get("unit_number")
+            units.append(unit_number if unit_number is not None else -1)
+        if len(page) < page_size:
+            break
+        start += page_size
+
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(len(vectors), -1)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    matrix /= np.where(norms == 0, 1, norms)
+    inverse_norms = None
+    full_vectors = None
+    if precision == INT8:
+        full_vectors = spill_to_disk(matrix)
+        matrix, _ = quantize_int8(matrix)
+        inverse_norms = inverse_row_norms(matrix)
+
+    # The memory-mapped float32 rows are paged in by the OS as read, and not
+    # counted against LOCAL_INDEX_MAX_MB
+    nbytes = matrix.nbytes + sum(
+        len(row.get("content") or "") + ROW_OVERHEAD_BYTES for row in rows
+    )
+    if inverse_norms is not None:
+        nbytes += inverse_norms.nbytes
+    return SubjectIndex(
+        subject_id=subject_id,
+        version=version,
+        rows=rows,
+        vectors=matrix,
+        units=np.asarray(units, dtype=np.int32),
+        nbytes=nbytes,
+        checked_at=time.monotonic(),
+        precision=precision,
+        inverse_norms=inverse_norms,
+        full_vectors=full_vectors,
+        rescore_factor=settings.VECTOR_RESCORE_FACTOR,
+    )
+
+
+def spill_to_disk(matrix: np.ndarray) -> Optional[np.ndarray]:
+    """
+    float32 copy of matrix in an unlinked temporary file, memory-mapped:
+    re-scoring reads a few rows of it and the file goes away with the index.
+    """
+    if matrix.size == 0:
+        return None
+    with tempfile.TemporaryFile(dir=settings.LOCAL_INDEX_SPILL_DIR or None) as f:
+        # The mapping keeps its own handle on the file once created
+        spilled = np.memmap(f, dtype=np.float32, mode="w+", shape=matrix.shape)
+    spilled[:] = matrix
+    spilled.flush()
+    return spilled
+
+
+def inverse_row_norms(matrix: np.ndarray) -> np.ndarray:
+    """1 / norm of each int8 row, 0 for all-zero rows."""
+    norms = np.sqrt(np.einsum("ij,ij->i", matrix, matrix, dtype=np.int32))
+    inverse_norms = np.zeros(len(matrix), dtype=np.float32)
+    np.divide(1, norms, out=inverse_norms, where=norms > 0)
+    return inverse_norms
+
+
+class IndexStats:
+    def __init__(self) -> None:
+        self.hits = 0
+        self.fallbacks = 0
+        self.loads = 0
+        self.reloads = 0
+        self.evictions = 0
+        self.load_errors = 0
+
+    def as_dict(self) -> Dict[str, Any]:
+        searches = self.hits + self.fallbacks
+        return {
+            "hits": self.hits,
+            "fallbacks": self.fallbacks,
+            "loads": self.loads,
+            "reloads": self.reloads,
+            "evictions": self.evictions,
+            "load_errors": self.load_errors,
+            "hit_rate": round(self.hits / searches, 4) if searches else 0.0,
+        }
+
+
+class LocalVectorIndex:
+    """
+    In-process mirror of the chunks of recently searched subjects.
+
+    A subject is loaded in the background on its first search, which (like
+    any search while the subject is loading) returns None so the caller
+    falls back to the RPC. Loaded subjects check the corpus version stamp
+    (see sql/phase9_corpus_version.sql) every LOCAL_INDEX_CHECK_SECONDS in
+    the background and are reloaded when it changed; searches keep using the
+    loaded copy meanwhile. Least recently searched subjects are evicted to
+    stay under LOCAL_INDEX_MAX_MB.
+    """
+
+    def __init__(self, max_bytes: int, check_seconds: float) -> None:
+        self.max_bytes = max_bytes
+        self.check_seconds = check_seconds
+        self.stats = IndexStats()
+        self._indexes: "OrderedDict[str, SubjectIndex]" = OrderedDict()
+        self._refreshing: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        # Subjects whose last load failed are not retried before this time
+        self._retry_at: Dict[str, float] = {}
+
+    def search(
+        self,
+        subject_id: str,
+        query_vector: List[float],
+        limit: int,
+        threshold: float,
+        unit: Optional[int] = None,
+        include_embedding: bool = False,
+    ) -> Optional[List[Dict[str, Any]]]:
+        """Search a loaded subject, or return None to use the RPC instead."""
+        index = self._indexes.get(subject_id)
+        if index is None:
+            self.stats.fallbacks += 1
+            self._refresh(subject_id, None)
+            return None
+
+        self._indexes.move_to_end(subject_id)
+        if time.monotonic() - index.checked_at > self.check_seconds:
+            self._refresh(subject_id, index)
+        self.stats.hits += 1
+        return index.search(query_vector, limit, threshold, unit, include_embedding)
+
+    def invalidate(self, subject_id: str) -> None:
+        """Drop a subject whose chunks this process just changed."""
+        self._indexes.pop(subject_id, None)
+
+    def _refresh(self, subject_id: str, current: Optional[SubjectIndex]) -> None:
+        if subject_id in self._refreshing:
+            return
+        if time.monotonic() < self._retry_at.get(subject_id, 0):
+            return
+        self._refreshing.add(subject_id)
+        task = asyncio.get_running_loop().create_task(self._load(subject_id, current))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _load(self, subject_id: str, current: Optional[SubjectIndex]) -> None:
+        try:
+            version = await asyncio.to_thread(fetch_corpus_version, subject_id)
+            if current is not None and version == current.version:
+                current.checked_at = time.monotonic()
+                return
+
+            index = await asyncio.to_thread(load_subject_index, subject_id, version)
+            if current is None:
+                self.stats.loads += 1
+            else:
+                self.stats.reloads += 1
+            self._store(index)
+            print(
+                f"Loaded {len(index.rows)} chunks of subject {subject_id} "
+                f"(version {version}, {index.nbytes / MB:.1f} MB)"
+            )
+        except Exception as e:
+            self.stats.load_errors += 1
+            self._retry_at[subject_id] = time.monotonic() + self.check_seconds
+            print(f"Could not load the local index of subject {subject_id}: {e}")
+        finally:
+            self._refreshing.discard(subject_id)
+
+    def _store(self, index: SubjectIndex) -> None:
+        if index.nbytes > self.max_bytes:
+            print(f"Subject {index.subject_id} exceeds LOCAL_INDEX_MAX_MB")
+            self._indexes.pop(index.subject_id, None)
+            return
+        self._indexes[index.subject_id] = index
+        self._indexes.move_to_end(index.subject_id)
+        while self.nbytes > self.max_bytes:
+            self._indexes.popitem(last=False)
+            self.stats.evictions += 1
+
+    @property
+    def nbytes(self) -> int:
+        return sum(index.nbytes for index in self._indexes.values())
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "subjects": len(self._indexes),
+            "chunks": sum(len(index.rows) for index in self._indexes.values()),
+            "memory_mb": round(self.nbytes / MB, 2),
+            **self.stats.as_dict(),
+        }
+
+
+_local_index: Optional[LocalVectorIndex] = None
+
+
+def get_local_index() -> Optional[LocalVectorIndex]:
+    """Get the local vector index, or None if LOCAL_INDEX_ENABLED is off."""
+    global _local_index
+    if not settings.LOCAL_INDEX_ENABLED:
+        return None
+    if _local_index is None:
+        _local_index = LocalVectorIndex(
+            int(settings.LOCAL_INDEX_MAX_MB * MB),
+            settings.LOCAL_INDEX_CHECK_SECONDS,
+        )
+    return _local_index
+
+
+def get_local_index_stats() -> Dict[str, Any]:
+    index = get_local_index()
+    if index is None:
+        return {"enabled": False}
+    return {"enabled": True, **index.summary()}
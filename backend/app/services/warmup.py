@@ -0,0 +1,158 @@
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+from app.core.config import settings
+
+PENDING = "pending"
+READY = "ready"
+FAILED = "failed"
+
+# Text of about one ingestion chunk, so warm-up runs the same shapes as real
+# batches
+SAMPLE_TEXT = (
+    "Warm-up passage covering the syllabus of a unit, with definitions, "
+    "examples and a short derivation. "
+) * 10
+
+
+def warm_embeddings() -> None:
+    from app.services.rag_service import get_embeddings_model
+
+    model = get_embeddings_model()
+    # First calls pay for lazy initialization inside the model and tokenizer
+    model.embed_query("warm-up query")
+    model.embed_documents([SAMPLE_TEXT] * 8)
+
+
+def warm_tokenizer() -> None:
+    from app.services.tokenizer import count_tokens
+
+    count_tokens(SAMPLE_TEXT)
+
+
+async def warm_groq() -> None:
+    from app.services.llm_client import get_async_groq_client
+
+    get_async_groq_client()
+
+
+def warm_mistral() -> None:
+    from app.services import ocr_service
+
+    # OCR is optional; without a key there is nothing to warm
+    if not settings.MISTRAL_API_KEY:
+        return
+    # Checks the key and opens the connection the first upload would open
+    ocr_service.client.models.list()
+
+
+def warm_supabase() -> None:
+    from app.core.supabase import supabase
+
+    # Opens the HTTP connection pool the first request would otherwise open
+    supabase.table("subjects").select("id").limit(1).execute()
+
+
+class WarmupState:
+    """Progress of the startup warm-up, reported by GET /ready."""
+
+    def __init__(self) -> None:
+        self.started = False
+        self.components: Dict[str, Dict[str, Any]] = {}
+
+    def set(self, name: str, status: str, **details: Any) -> None:
+        self.components[name] = {"status": status, **details}
+
+    @property
+    def ready(self) -> bool:
+        if not settings.WARMUP_ENABLED:
+            return True
+        return self.started and all(
+            component["status"] == READY
+            for name, component in self.components.items()
+            if name not in OPTIONAL_STEPS
+        )
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready,
+            "warmup": settings.WARMUP_ENABLED,
+            "components": self.components,
+        }
+
+
+warmup_state = WarmupState()
+
+WARMUP_STEPS: Dict[str, Callable[[], Any]] = {
+    "supabase": warm_supabase,
+    "groq": warm_groq,
+    "mistral": warm_mistral,
+    "tokenizer": warm_tokenizer,
+    "embeddings": warm_embeddings,
+}
+
+# Only OCR uploads need Mistral; its state is reported but does not gate
+# readiness
+OPTIONAL_STEPS = {"mistral"}
+
+# What the generation workers need before claiming jobs
+WORKER_WARMUP_STEPS = ["groq", "tokenizer", "embeddings"]
+
+
+def is_permanent(error: Exception) -> bool:
+    """Whether a warm-up failure is configuration that retrying cannot fix."""
+    # Missing settings raise ValueError; rejected API keys come back as 401/403
+    return isinstance(error, ValueError) or getattr(error, "status_code", None) in (
+        401,
+        403,
+    )
+
+
+async def run_step(name: str, step: Callable[[], Any]) -> None:
+    """
+    Run a warm-up step until it succeeds. Failures are retried with
+    exponential backoff capped at WARMUP_RETRY_MAX_SECONDS, so an outage at
+    boot delays readiness instead of ending it; configuration errors are
+    not retried.
+    """
+    attempt = 0
+    while True:
+        attempt += 1
+        start = time.perf_counter()
+        try:
+            if asyncio.iscoroutinefunction(step):
+                await step()
+            else:
+                # Blocking work stays off the event loop so requests are served
+                await asyncio.to_thread(step)
+        except Exception as e:
+            permanent = is_permanent(e)
+            print(f"Warm-up of {name} failed (attempt {attempt}): {e}")
+            warmup_state.set(
+                name, FAILED, attempts=attempt, error=str(e), permanent=permanent
+            )
+            if permanent:
+                return
+            await asyncio.sleep(min(2**attempt, settings.WARMUP_RETRY_MAX_SECONDS))
+            continue
+
+        seconds = round(time.perf_counter() - start, 3)
+        warmup_state.set(name, READY, seconds=seconds, attempts=attempt)
+        print(f"Warm-up of {name} took {seconds}s")
+        return
+
+
+async def run_warmup(steps: Optional[List[str]] = None) -> None:
+    """
+    Initialize the clients and load and exercise the embedding model (or
+    only the named steps). The steps run concurrently, each until it
+    succeeds or fails permanently; the process reports ready once all
+    required steps have succeeded.
+    """
+    selected = {name: WARMUP_STEPS[name] for name in (steps or WARMUP_STEPS)}
+    for name in selected:
+        warmup_state.set(name, PENDING)
+    warmup_state.started = True
+
+    await asyncio.gather(*(run_step(name, step) for name, step in selected.items()))
+    print(f"Warm-up finished, ready: {warmup_state.ready}")
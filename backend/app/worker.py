@@ -0,0 +1,325 @@
+"""
+Generation worker: runs queued paper generation jobs outside the API
+processes.
+
+    uv run python -m app.worker
+
+Starts GENERATION_WORKER_PROCESSES processes that each run up to
+GENERATION_WORKER_CONCURRENCY jobs at a time. On SIGINT/SIGTERM the workers
+stop claiming jobs, let running jobs finish for up to
+GENERATION_WORKER_DRAIN_SECONDS and hand anything still running back to
+the queue.
+"""
+
+import asyncio
+import multiprocessing
+import os
+import signal
+import socket
+from typing import List, Optional, Set, Tuple
+from app.core.config import settings
+from app.core.supabase import supabase
+from app.models.question import GenerationRequest
+from app.services.ai_service import generate_question_sets, generate_questions
+from app.services.embedding_worker import close_embedding_worker
+from app.services.job_queue import FAILED, Job, SQLiteJobQueue, get_job_queue
+from app.services.llm_client import close_async_client
+from app.services.progress import ProgressCallback, track_progress
+from app.services.tokenizer import start_tokenizer_load
+from app.services.warmup import WORKER_WARMUP_STEPS, run_warmup
+
+
+class ProgressWriter:
+    """
+    Progress callback that writes stages to the job off the event loop.
+
+    A write can wait on the queue's lock, so writes run in a thread, one at a
+    time; stages reported while one is in flight are coalesced into a single
+    write of the latest.
+    """
+
+    def __init__(self, queue: SQLiteJobQueue, job: Job, worker_id: str):
+        self.queue = queue
+        self.job = job
+        self.worker_id = worker_id
+        self._latest: Optional[Tuple[str, Optional[List[str]]]] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopped = False
+
+    def __call__(self, stage: str, sections: Optional[List[str]]) -> None:
+        if self._stopped:
+            return
+        self._latest = (stage, sections)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._write())
+
+    async def _write(self) -> None:
+        while self._latest is not None:
+            stage, sections = self._latest
+            self._latest = None
+            try:
+                await asyncio.to_thread(
+                    self.queue.set_progress,
+                    self.job.id,
+                    self.worker_id,
+                    stage,
+                    sections,
+                )
+            except Exception as e:
+                print(f"Error writing progress of job {self.job.id}: {e}")
+
+    async def flush(self) -> None:
+        """Wait for the pending writes."""
+        if self._task is not None and not self._stopped:
+            await self._task
+
+    def stop(self) -> None:
+        """Drop pending and further writes (the job is no longer ours)."""
+        self._stopped = True
+        self._latest = None
+        if self._task is not None:
+            self._task.cancel()
+
+
+async def run_generation(queue: SQLiteJobQueue, job: Job, worker_id: str) -> dict:
+    """
+    Generate the questions of a job and save them to its paper. Pipeline
+    stages are written to the job for the status event stream.
+    """
+    request = GenerationRequest.model_validate(job.payload)
+    on_progress = ProgressWriter(queue, job, worker_id)
+    try:
+        return await generate_and_save(job, request, on_progress)
+    except asyncio.CancelledError:
+        on_progress.stop()
+        raise
+    finally:
+        await on_progress.flush()
+
+
+async def generate_and_save(
+    job: Job, request: GenerationRequest, on_progress: ProgressCallback
+) -> dict:
+    """Generate the questions of a job and save them to its paper(s)."""
+    if job.paper_ids:
+        return await run_set_generation(job, request, on_progress)
+
+    with track_progress(on_progress):
+        questions = await generate_questions(
+            subject_id=str(request.subject_id),
+            subject_name=request.subject_name,
+            units=request.units,
+            difficulty=request.difficulty,
+            question_config=request.question_config,
+            custom_instructions=request.custom_instructions,
+            fresh=request.fresh,
+            use_question_bank=request.use_question_bank,
+        )
+
+    await asyncio.to_thread(
+        supabase.table("papers")
+        .update({"questions": questions.model_dump(), "status": "generated"})
+        .eq("id", job.paper_id)
+        .execute
+    )
+    return {"usage": questions.usage.model_dump() if questions.usage else None}
+
+
+async def run_set_generation(
+    job: Job, request: GenerationRequest, on_progress: ProgressCallback
+) -> dict:
+    """Generate the sets of a multi-set paper, one per paper in job.paper_ids."""
+    with track_progress(on_progress):
+        sets = await generate_question_sets(
+            subject_id=str(request.subject_id),
+            subject_name=request.subject_name,
+            units=request.units,
+            difficulty=request.difficulty,
+            question_config=request.question_config,
+            set_count=len(job.paper_ids),
+            custom_instructions=request.custom_instructions,
+            fresh=request.fresh,
+        )
+
+    await asyncio.gather(
+        *(
+            asyncio.to_thread(
+                supabase.table("papers")
+                .update({"questions": questions.model_dump(), "status": "generated"})
+                .eq("id", paper_id)
+                .execute
+            )
+            for paper_id, questions in zip(job.paper_ids, sets)
+        )
+    )
+    return {"usage": sets[0].usage.model_dump() if sets[0].usage else None}
+
+
+async def heartbeat(queue: SQLiteJobQueue, job: Job, worker_id: str) -> None:
+    """Renew the lease until cancelled; returns if the lease was lost."""
+    lease = settings.GENERATION_JOB_LEASE_SECONDS
+    while True:
+        await asyncio.sleep(lease / 3)
+        if not await asyncio.to_thread(queue.heartbeat, job.id, worker_id, lease):
+            print(f"Lost the lease on job {job.id}")
+            return
+
+
+async def mark_papers_failed(job: Job) -> None:
+    await asyncio.to_thread(
+        supabase.table("papers")
+        .update({"status": "failed"})
+        .in_("id", job.paper_ids or [job.paper_id])
+        .execute
+    )
+
+
+async def stop_generation(generation: asyncio.Task) -> None:
+    """
+    Cancel a job's generation and wait for it to end, so it makes no further
+    writes (one already running in a thread still completes).
+    """
+    generation.cancel()
+    await asyncio.wait({generation})
+    if not generation.cancelled() and generation.exception() is not None:
+        print(f"Generation failed while being stopped: {generation.exception()}")
+
+
+async def process_job(queue: SQLiteJobQueue, job: Job, worker_id: str) -> None:
+    print(
+        f"[{worker_id}] Job {job.id} for paper {job.paper_id}, attempt {job.attempts}"
+    )
+    generation = asyncio.create_task(run_generation(queue, job, worker_id))
+    lease = asyncio.create_task(heartbeat(queue, job, worker_id))
+    try:
+        await asyncio.wait({generation, lease}, return_when=asyncio.FIRST_COMPLETED)
+        if not generation.done():
+            # Another worker owns the job now; stop duplicating its work, and
+            # make sure it can no longer save the paper once we return
+            await stop_generation(generation)
+            return
+
+        try:
+            result = generation.result()
+        except Exception as e:
+            error = str(e)
+            status = await asyncio.to_thread(queue.fail, job.id, worker_id, error)
+            print(f"[{worker_id}] Job {job.id} failed ({status}): {error}")
+            if status == FAILED:
+                await mark_papers_failed(job)
+            return
+
+        await asyncio.to_thread(queue.complete, job.id, worker_id, result)
+        print(f"[{worker_id}] Job {job.id} completed")
+
+    except asyncio.CancelledError:
+        # Drain timed out: give the job back without counting the attempt
+        await stop_generation(generation)
+        await asyncio.to_thread(queue.release, job.id, worker_id)
+        print(f"[{worker_id}] Job {job.id} returned to the queue")
+        raise
+    finally:
+        lease.cancel()
+
+
+async def worker_main(worker_id: str) -> None:
+    queue = get_job_queue()
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    start_tokenizer_load()
+    warmup = None
+    if settings.WARMUP_ENABLED:
+        # Load the embedding model before claiming, not inside the first job.
+        # Failed steps keep retrying in the background; after the timeout
+        # jobs are claimed anyway and load what they need on first use.
+        warmup = asyncio.create_task(run_warmup(WORKER_WARMUP_STEPS))
+        stop = asyncio.create_task(stopping.wait())
+        await asyncio.wait(
+            {warmup, stop},
+            timeout=settings.WARMUP_TIMEOUT_SECONDS,
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        stop.cancel()
+        if not warmup.done():
+            print(f"[{worker_id}] Warm-up still running, claiming jobs anyway")
+
+    running: Set[asyncio.Task] = set()
+    print(f"[{worker_id}] Started, up to {settings.GENERATION_WORKER_CONCURRENCY} jobs")
+
+    while not stopping.is_set():
+        job = None
+        if len(running) < settings.GENERATION_WORKER_CONCURRENCY:
+            # Jobs whose worker died on their last attempt fail here; nothing
+            # else would tell their papers
+            for expired in await asyncio.to_thread(queue.fail_expired):
+                print(
+                    f"[{worker_id}] Job {expired.id} failed: worker stopped responding"
+                )
+                await mark_papers_failed(expired)
+            job = await asyncio.to_thread(
+                queue.claim, worker_id, settings.GENERATION_JOB_LEASE_SECONDS
+            )
+
+        if job is not None:
+            task = asyncio.create_task(process_job(queue, job, worker_id))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            continue
+
+        # Idle or at capacity: check again after a poll interval or on shutdown
+        try:
+            await asyncio.wait_for(
+                stopping.wait(), timeout=settings.GENERATION_WORKER_POLL_SECONDS
+            )
+        except asyncio.TimeoutError:
+            pass
+
+    if running:
+        print(f"[{worker_id}] Draining {len(running)} running jobs")
+        _, pending = await asyncio.wait(
+            running, timeout=settings.GENERATION_WORKER_DRAIN_SECONDS
+        )
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+    await close_embedding_worker()
+    await close_async_client()
+    print(f"[{worker_id}] Stopped")
+
+
+def run_worker(index: int) -> None:
+    worker_id = f"{socket.gethostname()}:{os.getpid()}:{index}"
+    asyncio.run(worker_main(worker_id))
+
+
+def main() -> None:
+    processes = [
+        multiprocessing.Process(
+            target=run_worker, args=(index,), name=f"worker-{index}"
+        )
+        for index in range(settings.GENERATION_WORKER_PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+
+    # The children handle SIGINT/SIGTERM themselves; forward SIGTERM to them
+    # and wait for them to drain
+    def forward(signum, frame):
+        for process in processes:
+            if process.is_alive():
+                os.kill(process.pid, signum)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
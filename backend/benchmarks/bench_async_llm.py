@@ -0,0 +1,106 @@
+"""
+Benchmark: blocking vs. async LLM calls for a 4-section paper.
+
+Runs against the local stub server, so no API key or network is needed:
+
+    cd backend && python -m benchmarks.bench_async_llm
+
+The "blocking" run reproduces the previous behaviour (the synchronous Groq
+client called from async functions), where asyncio.gather runs the sections
+one after another. The "async" run uses the pooled client from llm_client,
+so the paper should take about as long as its slowest section.
+"""
+
+import asyncio
+import os
+import time
+
+# Settings and the Supabase client are created at import time.
+os.environ.setdefault("GROQ_API_KEY", "stub")
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "stub")
+os.environ.setdefault("QUESTION_BANK_ENABLED", "false")
+os.environ.setdefault("LLM_RATE_LIMIT_BACKEND", "none")
+# Every call must reach the stub server, or repeat runs only time cache hits
+os.environ.setdefault("LLM_CACHE_BACKEND", "none")
+
+from groq import Groq
+from app.core.config import settings
+from app.services import ai_service
+from benchmarks.stub_llm import (
+    SECTION_LATENCY,
+    StubServer,
+    create_stub_app,
+)
+
+CONFIG = {"mcq": 10, "fill_blanks": 10, "short": 5, "long": 3}
+PAPERS = 3
+
+
+async def generate_paper_async() -> int:
+    results = await asyncio.gather(
+        ai_service.generate_mcqs(CONFIG["mcq"], "Networks", [1, 2], "medium", ""),
+        ai_service.generate_fill_blanks(
+            CONFIG["fill_blanks"], "Networks", [1, 2], "medium", ""
+        ),
+        ai_service.generate_short_questions(
+            CONFIG["short"], "Networks", [1, 2], "medium", ""
+        ),
+        ai_service.generate_long_questions(
+            CONFIG["long"], "Networks", [1, 2], "medium", ""
+        ),
+    )
+    return sum(len(r) for r in results)
+
+
+async def generate_paper_blocking(client: Groq) -> int:
+    async def section(key: str, count: int) -> int:
+        prompt = ai_service.build_system_prompt("Networks", [1, 2], "medium")
+        prompt += f"\n\nGenerate exactly {count} questions in the '{key}' array."
+        client.chat.completions.create(
+            model=ai_service.GENERATION_MODEL,
+            messages=[{"role": "user", "content": prompt}],
+            max_tokens=4000,
+        )
+        return count
+
+    results = await asyncio.gather(
+        section("mcqs", CONFIG["mcq"]),
+        section("fill_blanks", CONFIG["fill_blanks"]),
+        section("short", CONFIG["short"]),
+        section("long", CONFIG["long"]),
+    )
+    return sum(results)
+
+
+async def timed(label: str, coro_factory, papers: int = 1) -> float:
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(coro_factory() for _ in range(papers)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<34} {elapsed:6.2f}s  ({sum(counts)} questions)")
+    return elapsed
+
+
+async def main(base_url: str) -> None:
+    settings.GROQ_BASE_URL = base_url
+    blocking_client = Groq(api_key="stub", base_url=base_url)
+
+    slowest = max(SECTION_LATENCY.values())
+    total = sum(SECTION_LATENCY.values())
+    print(
+        f"Section latencies: {SECTION_LATENCY} (slowest {slowest:.1f}s, sum {total:.1f}s)\n"
+    )
+
+    await timed("blocking, 1 paper", lambda: generate_paper_blocking(blocking_client))
+    await timed("async pool, 1 paper", generate_paper_async)
+    await timed(
+        f"blocking, {PAPERS} papers",
+        lambda: generate_paper_blocking(blocking_client),
+        PAPERS,
+    )
+    await timed(f"async pool, {PAPERS} papers", generate_paper_async, PAPERS)
+
+
+if __name__ == "__main__":
+    with StubServer(create_stub_app()) as stub:
+        asyncio.run(main(stub.base_url))
@@ -0,0 +1,95 @@
+"""
+Benchmark: recall of the compact match RPCs (sql/phase11_compact_vectors.sql)
+on a real subject, per subject and per unit.
+
+Needs a Supabase project with processed documents and the phase 11
+migration (SUPABASE_URL and SUPABASE_SERVICE_KEY in .env), but not the
+embedding model: queries are the stored embeddings of random chunks plus
+noise. The ground truth is the exact float32 ranking of the subject's
+chunks (or of the query chunk's unit), computed locally.
+
+    cd backend && python -m benchmarks.bench_compact_rpc <subject_id>
+
+For each RPC it reports recall@k against the exact ranking and the mean
+number of rows returned, which shows filtered searches coming back short.
+"""
+
+import argparse
+import random
+import time
+from typing import Any, Dict, List
+import numpy as np
+from app.core.config import settings
+from app.core.supabase import supabase
+from app.services.vector_codec import FLOAT32, vector_literal
+from app.services.vector_index import fetch_corpus_version, load_subject_index
+
+
+def call(name: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return supabase.rpc(name, params).execute().data or []
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("subject_id")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    # The exact ranking needs the float32 vectors, whatever the app is set to
+    settings.VECTOR_PRECISION = FLOAT32
+    index = load_subject_index(args.subject_id, fetch_corpus_version(args.subject_id))
+    if not index.rows:
+        raise SystemExit(f"Subject {args.subject_id} has no chunks")
+    print(f"{len(index.rows)} chunks, {len(set(index.units.tolist()))} units\n")
+
+    rng = np.random.default_rng(7)
+    picks = random.Random(7).choices(range(len(index.rows)), k=args.queries)
+    results: Dict[str, Dict[str, List[float]]] = {}
+
+    def record(name: str, found: List[Dict[str, Any]], exact: set, seconds: float):
+        stats = results.setdefault(name, {"recall": [], "rows": [], "ms": []})
+        stats["recall"].append(len(exact & {row["id"] for row in found}) / len(exact))
+        stats["rows"].append(len(found))
+        stats["ms"].append(seconds * 1000)
+
+    for i in picks:
+        query = index.vectors[i] + rng.normal(0, args.noise, index.vectors.shape[1])
+        query = (query / np.linalg.norm(query)).astype(np.float32)
+        unit = int(index.units[i])
+        base = {
+            "query_embedding": vector_literal(query),
+            "match_threshold": -1.0,
+            "match_count": args.k,
+            "filter_subject_id": args.subject_id,
+        }
+        searches = [
+            ("subject", base, {row["id"] for row in index.search(query, args.k, -1.0)}),
+            (
+                "unit",
+                {**base, "filter_unit_number": unit},
+                {row["id"] for row in index.search(query, args.k, -1.0, unit=unit)},
+            ),
+        ]
+        for scope, params, exact in searches:
+            rpc = "match_document_chunks" if scope == "subject" else "match_unit_chunks"
+            for name, extra in (
+                (rpc, {}),
+                (f"{rpc}_compact", {"rescore_factor": args.rescore_factor}),
+            ):
+                start = time.perf_counter()
+                found = call(name, {**params, **extra})
+                record(name, found, exact, time.perf_counter() - start)
+
+    print(f"{'rpc':<30}{'recall@' + str(args.k):>10}{'rows':>8}{'p50':>10}")
+    for name, stats in results.items():
+        print(
+            f"{name:<30}{np.mean(stats['recall']):>10.3f}{np.mean(stats['rows']):>8.2f}"
+            f"{np.percentile(stats['ms'], 50):>8.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()
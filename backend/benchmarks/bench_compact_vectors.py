@@ -0,0 +1,178 @@
+"""
+Benchmark: memory and bandwidth saved by compact vectors (VECTOR_PRECISION)
+against the recall they cost.
+
+Runs offline. By default the corpus is synthetic: 384-dim unit vectors
+drawn around topic centres, like the chunks of a subject's documents, and
+the queries are chunks plus noise. A real corpus can be used instead by
+exporting document_chunks embeddings to a .npy file (rows x 384).
+
+    cd backend && python -m benchmarks.bench_compact_vectors
+    cd backend && python -m benchmarks.bench_compact_vectors --embeddings chunks.npy
+
+For each precision it reports the bytes per vector the local index holds
+in memory (and in its memory-mapped float32 file), the bytes per vector of
+the compact representation on the wire, the search time and recall@k of the
+local index against the exact float32 ranking, and the recall@k of the
+compact match RPCs, simulated here: the top k * rescore_factor by the
+compact vectors, re-scored at float32 (factor 1 is the compact ranking
+without re-scoring). The int8 local index re-scores as the RPCs do; with
+float16 the local index stays float32.
+"""
+
+import argparse
+import json
+import time
+from typing import List
+import numpy as np
+from app.services.vector_codec import (
+    BYTES_PER_DIMENSION,
+    FLOAT16,
+    FLOAT32,
+    INT8,
+    int8_literal,
+    quantize_int8,
+    vector_literal,
+)
+from app.services.vector_index import SubjectIndex, inverse_row_norms, spill_to_disk
+
+
+def synthetic_corpus(
+    rng: np.random.Generator, chunks: int, topics: int, dimensions: int
+) -> np.ndarray:
+    centres = rng.normal(0, 1, (topics, dimensions))
+    vectors = centres[rng.integers(0, topics, chunks)] + rng.normal(
+        0, 0.9, (chunks, dimensions)
+    )
+    return vectors.astype(np.float32)
+
+
+def unit(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.where(norms == 0, 1, norms)
+
+
+def build_index(
+    vectors: np.ndarray, precision: str, rescore_factor: int
+) -> SubjectIndex:
+    """The SubjectIndex load_subject_index would build from these vectors."""
+    matrix = unit(vectors).astype(np.float32)
+    inverse_norms = None
+    full_vectors = None
+    if precision == INT8:
+        full_vectors = spill_to_disk(matrix)
+        matrix, _ = quantize_int8(matrix)
+        inverse_norms = inverse_row_norms(matrix)
+    return SubjectIndex(
+        subject_id="bench",
+        version=0,
+        rows=[{"id": i} for i in range(len(vectors))],
+        vectors=matrix,
+        units=np.zeros(len(vectors), dtype=np.int32),
+        nbytes=matrix.nbytes,
+        checked_at=0,
+        precision=precision,
+        inverse_norms=inverse_norms,
+        full_vectors=full_vectors,
+        rescore_factor=rescore_factor,
+    )
+
+
+def compact_matrix(vectors: np.ndarray, precision: str) -> np.ndarray:
+    """The unit vectors as the compact RPCs rank them, widened to float32."""
+    matrix = unit(vectors).astype(np.float32)
+    if precision == FLOAT16:
+        return matrix.astype(np.float16).astype(np.float32)
+    if precision == INT8:
+        quantized, _ = quantize_int8(matrix)
+        return unit(quantized.astype(np.float32))
+    return matrix
+
+
+def recall(found: List[np.ndarray], exact: List[np.ndarray]) -> float:
+    return float(np.mean([len(set(f) & set(e)) / len(e) for f, e in zip(found, exact)]))
+
+
+def wire_bytes(vectors: np.ndarray, precision: str) -> float:
+    """Mean bytes per vector in the JSON the local index load receives."""
+    sample = vectors[:200]
+    if precision == INT8:
+        texts = [json.dumps(int8_literal(row)) for row in quantize_int8(sample)[0]]
+    else:
+        texts = [json.dumps(vector_literal(row, precision)) for row in sample]
+    return float(np.mean([len(text) for text in texts]))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--embeddings", help=".npy file of chunk embeddings")
+    parser.add_argument("--chunks", type=int, default=20000)
+    parser.add_argument("--topics", type=int, default=40)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.6)
+    parser.add_argument("--rescore-factor", type=int, default=4)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(7)
+    if args.embeddings:
+        vectors = np.load(args.embeddings).astype(np.float32)
+    else:
+        vectors = synthetic_corpus(rng, args.chunks, args.topics, 384)
+    dimensions = vectors.shape[1]
+    picks = rng.integers(0, len(vectors), args.queries)
+    queries = unit(
+        unit(vectors[picks])
+        + rng.normal(0, args.noise / np.sqrt(dimensions), (args.queries, dimensions))
+    ).astype(np.float32)
+
+    full = unit(vectors)
+    exact = [np.argsort(-(full @ q))[: args.k] for q in queries]
+    print(
+        f"{len(vectors)} vectors x {dimensions} dims, {args.queries} queries, k={args.k}\n"
+    )
+
+    # Before this change, vectors went over the wire as JSON lists of Python floats
+    legacy = np.mean([len(json.dumps(row.tolist())) for row in vectors[:200]])
+    print(f"Wire format before (JSON floats): {legacy:.0f} bytes/vector\n")
+
+    print(
+        f"{'precision':<10}{'memory':>10}{'file':>9}{'wire':>10}{'search p50':>12}"
+        f"{'local':>9}{'rpc x1':>9}{'rpc x' + str(args.rescore_factor):>9}"
+    )
+    for precision in (FLOAT32, FLOAT16, INT8):
+        index = build_index(vectors, precision, args.rescore_factor)
+        times, local = [], []
+        for q in queries:
+            start = time.perf_counter()
+            rows = index.search(q.tolist(), args.k, -1.0)
+            times.append(time.perf_counter() - start)
+            local.append(np.array([row["id"] for row in rows]))
+
+        # The compact RPCs: candidates by compact distance, re-scored at float32
+        rpc = {}
+        compact = compact_matrix(vectors, precision)
+        for factor in (1, args.rescore_factor):
+            found = []
+            for q in queries:
+                coarse = compact @ q
+                candidates = np.argsort(-coarse)[: args.k * factor]
+                found.append(candidates[np.argsort(-(full[candidates] @ q))][: args.k])
+            rpc[factor] = recall(found, exact)
+
+        memory = dimensions * index.vectors.itemsize
+        if index.inverse_norms is not None:
+            memory += index.inverse_norms.itemsize
+        spilled = 0
+        if index.full_vectors is not None:
+            spilled = dimensions * BYTES_PER_DIMENSION[FLOAT32]
+        print(
+            f"{precision:<10}{memory:>8} B{spilled:>7} B"
+            f"{wire_bytes(vectors, precision):>8.0f} B"
+            f"{np.percentile(times, 50) * 1000:>10.2f}ms"
+            f"{recall(local, exact):>9.3f}{rpc[1]:>9.3f}{rpc[args.rescore_factor]:>9.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
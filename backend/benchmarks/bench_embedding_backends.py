@@ -0,0 +1,83 @@
+"""
+Benchmark: embedding throughput in chunks per second for each backend.
+
+Embeds ingestion-sized chunks (1000 characters) in batches of
+INGEST_BATCH_SIZE, as process_document_chunks does, with the current
+backend (HuggingFaceEmbeddings on torch) and with ONNX Runtime at full
+precision and int8-quantized. Also reports how long each takes to load and
+the resident memory it adds. A backend that cannot load (e.g. torch is not
+installed) is reported and skipped.
+
+    cd backend && python -m benchmarks.bench_embedding_backends
+    cd backend && python -m benchmarks.bench_embedding_backends --backends onnx onnx-int8
+
+Backends share the process, so memory is the growth of resident memory
+while each one loads; run one backend per invocation for clean numbers.
+"""
+
+import argparse
+import os
+import time
+from itertools import batched
+from app.core.config import settings
+from app.services.embedding_backends import HUGGINGFACE, ONNX, create_embeddings_model
+from app.services.rag_service import MODEL_NAME
+from benchmarks.sample_chunks import sample_chunks
+
+BACKENDS = {
+    "huggingface": (HUGGINGFACE, False),
+    "onnx": (ONNX, False),
+    "onnx-int8": (ONNX, True),
+}
+
+
+def rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        pages = int(f.read().split()[1])
+    return pages * os.sysconf("SC_PAGE_SIZE") / 1e6
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--backends", nargs="+", choices=list(BACKENDS), default=list(BACKENDS)
+    )
+    parser.add_argument("--file", help="text file to chunk instead of generated text")
+    parser.add_argument("--chunks", type=int, default=512)
+    parser.add_argument("--batch-size", type=int, default=settings.INGEST_BATCH_SIZE)
+    args = parser.parse_args()
+
+    chunks = sample_chunks(args.chunks, args.file)
+    print(
+        f"{len(chunks)} chunks of ~{sum(map(len, chunks)) // len(chunks)} chars, batches of {args.batch_size}\n"
+    )
+    print(f"{'backend':<13}{'load':>8}{'memory':>10}{'chunks/s':>10}{'speedup':>9}")
+
+    baseline = None
+    for name in args.backends:
+        backend, quantized = BACKENDS[name]
+        before = rss_mb()
+        start = time.perf_counter()
+        try:
+            model = create_embeddings_model(MODEL_NAME, backend, quantized=quantized)
+            # First call pays for lazy initialization
+            model.embed_documents(chunks[:8])
+        except Exception as e:
+            print(f"{name:<13}could not load: {e}")
+            continue
+        load_seconds = time.perf_counter() - start
+        memory = rss_mb() - before
+
+        start = time.perf_counter()
+        for batch in batched(chunks, args.batch_size):
+            model.embed_documents(list(batch))
+        rate = len(chunks) / (time.perf_counter() - start)
+        baseline = baseline or rate
+        print(
+            f"{name:<13}{load_seconds:>7.1f}s{memory:>7.0f} MB{rate:>10.1f}{rate / baseline:>8.2f}x"
+        )
+        del model
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""
+Benchmark: tail latency of section calls with and without hedging.
+
+The stub answers most requests quickly but stalls a few of them, as a
+congested provider does:
+
+    cd backend && python -m benchmarks.bench_hedging
+
+Each run sends the same number of section requests through
+request_json_completion and reports p50/p95/p99 latency per call. Hedged
+runs duplicate a call once it exceeds the p95 latency of earlier calls,
+either to the same model or to a faster fallback model.
+"""
+
+import asyncio
+import os
+import random
+import time
+from typing import Any, Dict
+
+# Settings and the Supabase client are created at import time.
+os.environ.setdefault("GROQ_API_KEY", "stub")
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "stub")
+os.environ.setdefault("QUESTION_BANK_ENABLED", "false")
+os.environ.setdefault("LLM_RATE_LIMIT_BACKEND", "none")
+os.environ.setdefault("LLM_CACHE_BACKEND", "none")
+
+import numpy as np
+from app.core.config import settings
+from app.services import ai_service
+from app.services.hedging import get_hedge_stats, hedge_stats, latency_tracker
+from benchmarks.stub_llm import StubServer, create_stub_app
+
+FALLBACK_MODEL = "stub-fast"
+REQUESTS = 400
+# Below LLM_MAX_CONCURRENCY, so hedges do not queue behind primaries
+CONCURRENCY = 6
+# Share of requests that stall, and for how long
+STALL_RATE = 0.04
+STALL_SECONDS = 4.0
+
+rng = random.Random(7)
+
+
+def injected_latency(sections: Dict[str, int], body: Dict[str, Any]) -> float:
+    if body.get("model") == FALLBACK_MODEL:
+        return rng.uniform(0.2, 0.3)
+    if rng.random() < STALL_RATE:
+        return STALL_SECONDS
+    return rng.uniform(0.3, 0.6)
+
+
+async def run(label: str, hedge: bool, fallback_model: str) -> None:
+    settings.LLM_HEDGE_ENABLED = hedge
+    settings.LLM_FALLBACK_MODEL = fallback_model
+    latency_tracker.clear()
+    hedge_stats.reset()
+    rng.seed(7)
+
+    prompt = ai_service.build_section_prompt("short", 3, "Networks", [1], "medium", "")
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one() -> float:
+        async with semaphore:
+            start = time.perf_counter()
+            await ai_service.request_json_completion(prompt, max_tokens=3000)
+            return time.perf_counter() - start
+
+    latencies = await asyncio.gather(*(one() for _ in range(REQUESTS)))
+
+    # The first calls run before the hedge delay has enough samples
+    measured = np.array(latencies[2 * settings.LLM_HEDGE_MIN_SAMPLES :])
+    stats = get_hedge_stats()
+    print(
+        f"{label:<28} p50 {np.percentile(measured, 50):5.2f}s  "
+        f"p95 {np.percentile(measured, 95):5.2f}s  "
+        f"p99 {np.percentile(measured, 99):5.2f}s  "
+        f"hedged {stats['hedged']:>3}/{stats['calls']}  "
+        f"hedge wins {stats['hedge_wins']}"
+    )
+
+
+async def main(base_url: str) -> None:
+    settings.GROQ_BASE_URL = base_url
+    # Learn the delay from the first calls rather than waiting the default
+    settings.LLM_HEDGE_INITIAL_DELAY_SECONDS = STALL_SECONDS
+
+    print(
+        f"{REQUESTS} calls, {CONCURRENCY} concurrent, {STALL_RATE:.0%} stall "
+        f"for {STALL_SECONDS:.0f}s\n"
+    )
+    await run("no hedging", False, "")
+    await run("hedge, same model", True, "")
+    await run(f"hedge, fallback {FALLBACK_MODEL}", True, FALLBACK_MODEL)
+
+
+if __name__ == "__main__":
+    with StubServer(create_stub_app(injected_latency)) as stub:
+        asyncio.run(main(stub.base_url))
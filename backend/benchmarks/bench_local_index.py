@@ -0,0 +1,92 @@
+"""
+Benchmark: recall and latency of the local vector index against the
+match_document_chunks RPC.
+
+Needs a Supabase project with processed documents (SUPABASE_URL and
+SUPABASE_SERVICE_KEY in .env) but not the embedding model: queries are the
+stored embeddings of random chunks plus noise, so they resemble real
+queries that land near some chunks of the subject.
+
+    cd backend && python -m benchmarks.bench_local_index <subject_id>
+
+The local index ranks by exact cosine similarity, while the RPC goes through
+the ivfflat index, which is approximate. Recall@k is the share of the exact
+top k that the RPC also returned.
+"""
+
+import argparse
+import random
+import time
+from typing import List
+import numpy as np
+from app.core.supabase import supabase
+from app.services.vector_index import fetch_corpus_version, load_subject_index
+
+
+def percentile_ms(values: List[float], q: float) -> float:
+    return float(np.percentile(values, q)) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("subject_id")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--noise", type=float, default=0.05)
+    parser.add_argument("--threshold", type=float, default=0.0)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    version = fetch_corpus_version(args.subject_id)
+    index = load_subject_index(args.subject_id, version)
+    load_seconds = time.perf_counter() - start
+    if not index.rows:
+        raise SystemExit(f"Subject {args.subject_id} has no chunks")
+    print(
+        f"Loaded {len(index.rows)} chunks (version {version}) in "
+        f"{load_seconds:.2f}s, {index.nbytes / 1e6:.1f} MB\n"
+    )
+
+    rng = np.random.default_rng(7)
+    picks = random.Random(7).choices(range(len(index.rows)), k=args.queries)
+    recalls, local_times, rpc_times = [], [], []
+
+    for i in picks:
+        query = index.vectors[i] + rng.normal(0, args.noise, index.vectors.shape[1])
+        query = (query / np.linalg.norm(query)).astype(np.float32).tolist()
+
+        start = time.perf_counter()
+        local = index.search(query, args.k, args.threshold)
+        local_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        remote = (
+            supabase.rpc(
+                "match_document_chunks",
+                {
+                    "query_embedding": query,
+                    "match_threshold": args.threshold,
+                    "match_count": args.k,
+                    "filter_subject_id": args.subject_id,
+                },
+            ).execute()
+        ).data or []
+        rpc_times.append(time.perf_counter() - start)
+
+        exact = {row["id"] for row in local}
+        if exact:
+            recalls.append(len(exact & {row["id"] for row in remote}) / len(exact))
+
+    print(f"{'':<8}{'p50':>10}{'p95':>10}")
+    for label, times in (("local", local_times), ("rpc", rpc_times)):
+        print(
+            f"{label:<8}{percentile_ms(times, 50):>8.2f}ms"
+            f"{percentile_ms(times, 95):>8.2f}ms"
+        )
+    print(
+        f"\nRPC recall@{args.k} against the exact local ranking: {np.mean(recalls):.3f}"
+    )
+
+
+if __name__ == "__main__":
+    main()
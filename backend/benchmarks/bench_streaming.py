@@ -0,0 +1,75 @@
+"""
+Benchmark: time-to-first-question for buffered vs. streamed generation.
+
+    cd backend && python -m benchmarks.bench_streaming
+
+Both paths generate the same large paper against the local stub server,
+which spreads each response over its section latency the way a real model
+emits tokens. The buffered path only has questions once every section has
+been fully parsed; the streamed path yields each question as its JSON
+object closes.
+"""
+
+import asyncio
+import os
+import time
+
+# Settings and the Supabase client are created at import time.
+os.environ.setdefault("GROQ_API_KEY", "stub")
+os.environ.setdefault("SUPABASE_URL", "http://127.0.0.1:9")
+os.environ.setdefault("SUPABASE_SERVICE_KEY", "stub")
+os.environ.setdefault("QUESTION_BANK_ENABLED", "false")
+os.environ.setdefault("LLM_RATE_LIMIT_BACKEND", "none")
+
+from app.core.config import settings
+from app.services import ai_service
+from benchmarks.stub_llm import StubServer, create_stub_app
+
+CONFIG = {"mcq": 30, "fill_blanks": 20, "short": 10, "long": 6}
+
+
+def section_latency(sections, body) -> float:
+    # Roughly one second per five questions, like a large real paper
+    return sum(sections.values()) / 5
+
+
+async def no_context(*args, **kwargs):
+    return []
+
+
+async def buffered() -> None:
+    start = time.perf_counter()
+    questions = await ai_service.generate_questions(
+        "subject", "Networks", [1, 2], "medium", CONFIG
+    )
+    elapsed = time.perf_counter() - start
+    total = sum(
+        len(getattr(questions, k)) for k in ("mcqs", "fill_blanks", "short", "long")
+    )
+    print(f"buffered: first question {elapsed:6.2f}s, all {total} at {elapsed:6.2f}s")
+
+
+async def streamed() -> None:
+    start = time.perf_counter()
+    first = None
+    total = 0
+    async for _ in ai_service.stream_questions(
+        "subject", "Networks", [1, 2], "medium", CONFIG
+    ):
+        total += 1
+        if first is None:
+            first = time.perf_counter() - start
+    elapsed = time.perf_counter() - start
+    print(f"streamed: first question {first:6.2f}s, all {total} at {elapsed:6.2f}s")
+
+
+async def main(base_url: str) -> None:
+    settings.GROQ_BASE_URL = base_url
+    ai_service.search_similar_chunks = no_context
+    await buffered()
+    await streamed()
+
+
+if __name__ == "__main__":
+    with StubServer(create_stub_app(section_latency)) as stub:
+        asyncio.run(main(stub.base_url))
@@ -0,0 +1,85 @@
+"""
+Parity check: the ONNX embedding backend against the HuggingFace one.
+
+Embeds the same chunks and queries with the current backend
+(HuggingFaceEmbeddings, sentence-transformers on torch) and with ONNX
+Runtime, full precision and int8-quantized, and compares:
+
+- dimensions (must be 384 for the embedding columns),
+- cosine similarity of each text's two vectors,
+- the top k chunks each query retrieves, since mixing vectors of two
+  backends in one corpus is what switching EMBEDDING_BACKEND does.
+
+Exits with status 1 if a backend falls below its minimum cosine.
+
+    cd backend && python -m benchmarks.check_embedding_parity
+    cd backend && python -m benchmarks.check_embedding_parity --file textbook.txt
+"""
+
+import argparse
+import sys
+import numpy as np
+from app.services.embedding_backends import HUGGINGFACE, ONNX, create_embeddings_model
+from app.services.rag_service import MODEL_NAME
+from benchmarks.sample_chunks import SENTENCES, sample_chunks
+
+
+def top_k(chunks: np.ndarray, queries: np.ndarray, k: int) -> np.ndarray:
+    return np.argsort(-(queries @ chunks.T), axis=1)[:, :k]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", help="text file to chunk instead of generated text")
+    parser.add_argument("--chunks", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--min-cosine", type=float, default=0.999)
+    parser.add_argument("--min-cosine-quantized", type=float, default=0.98)
+    args = parser.parse_args()
+
+    chunks = sample_chunks(args.chunks, args.file)
+    queries = SENTENCES
+    print(f"{len(chunks)} chunks, {len(queries)} queries, model {MODEL_NAME}\n")
+
+    reference = create_embeddings_model(MODEL_NAME, HUGGINGFACE)
+    expected_chunks = np.asarray(reference.embed_documents(chunks))
+    expected_queries = np.asarray([reference.embed_query(q) for q in queries])
+    expected_top = top_k(expected_chunks, expected_queries, args.k)
+
+    failed = False
+    print(
+        f"{'backend':<12}{'dims':>6}{'min cos':>10}{'mean cos':>10}{'max |diff|':>12}{'top-k':>8}"
+    )
+    for quantized, minimum in (
+        (False, args.min_cosine),
+        (True, args.min_cosine_quantized),
+    ):
+        model = create_embeddings_model(MODEL_NAME, ONNX, quantized=quantized)
+        vectors = np.asarray(model.embed_documents(chunks))
+        query_vectors = np.asarray([model.embed_query(q) for q in queries])
+
+        both = np.vstack([vectors, query_vectors])
+        expected = np.vstack([expected_chunks, expected_queries])
+        cosines = (both * expected).sum(axis=1) / (
+            np.linalg.norm(both, axis=1) * np.linalg.norm(expected, axis=1)
+        )
+        # Queries of this backend against the reference corpus
+        found = top_k(expected_chunks, query_vectors, args.k)
+        overlap = np.mean(
+            [len(set(f) & set(e)) / args.k for f, e in zip(found, expected_top)]
+        )
+
+        name = "onnx-int8" if quantized else "onnx"
+        print(
+            f"{name:<12}{vectors.shape[1]:>6}{cosines.min():>10.5f}{cosines.mean():>10.5f}"
+            f"{np.abs(both - expected).max():>12.5f}{overlap:>8.3f}"
+        )
+        if vectors.shape[1] != expected_chunks.shape[1] or cosines.min() < minimum:
+            print(f"  {name}: below the minimum cosine {minimum} or wrong dimensions")
+            failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
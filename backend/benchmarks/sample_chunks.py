@@ -0,0 +1,42 @@
+"""Chunks to embed in the embedding benchmarks, cut as ingestion cuts them."""
+
+import random
+from itertools import islice
+from typing import List, Optional
+from app.services.rag_service import iter_chunk_texts
+
+# Sentences of the kind reference material is made of, shuffled into a
+# textbook-sized text when no file is given
+SENTENCES = [
+    "The first law of thermodynamics states that energy is conserved in a closed system.",
+    "A linked list stores each element in a node that points to the next node.",
+    "Ohm's law relates the current through a conductor to the voltage across it.",
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+    "The time complexity of binary search on a sorted array is logarithmic.",
+    "An exothermic reaction releases heat to its surroundings.",
+    "Normalization removes redundancy from relational database tables.",
+    "Newton's second law states that force equals mass times acceleration.",
+    "A process scheduler decides which ready process runs next on the CPU.",
+    "Entropy measures the number of microscopic states consistent with a macrostate.",
+    "In a balanced binary search tree, insertion and lookup take O(log n) time.",
+    "The mitochondria produce most of the cell's supply of adenosine triphosphate.",
+    "Kirchhoff's current law states that currents entering a node sum to zero.",
+    "A deadlock occurs when processes wait on resources held by each other.",
+    "Catalysts lower the activation energy of a reaction without being consumed.",
+    "Define the term specific heat capacity and give its SI unit.",
+]
+
+
+def sample_chunks(count: int, path: Optional[str] = None, seed: int = 7) -> List[str]:
+    """The first count chunks of a text file, or of a generated text."""
+    if path:
+        with open(path, encoding="utf-8") as f:
+            content = f.read()
+    else:
+        rng = random.Random(seed)
+        paragraphs = [
+            " ".join(rng.choices(SENTENCES, k=rng.randint(4, 9)))
+            for _ in range(count * 3)
+        ]
+        content = "\n\n".join(paragraphs)
+    return list(islice(iter_chunk_texts(content), count))
@@ -0,0 +1,187 @@
+"""
+Local OpenAI-compatible stub of the Groq chat completions API.
+
+The stub parses the requested section counts out of the generation prompt,
+sleeps for a configurable latency and answers with well-formed questions, so
+the generation pipeline can be benchmarked without network or API quota.
+"""
+
+import asyncio
+import json
+import re
+import socket
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# Default per-section latency in seconds, roughly proportional to output length.
+SECTION_LATENCY = {"mcqs": 2.0, "fill_blanks": 1.0, "short": 1.5, "long": 2.5}
+
+STREAM_PIECE_CHARS = 16
+
+SECTION_PATTERN = re.compile(r"(\d+)[^\n]*?'(mcqs|fill_blanks|short|long)' array")
+
+
+def requested_sections(prompt: str) -> Dict[str, int]:
+    """Extract {section: count} from a generation prompt."""
+    return {key: int(count) for count, key in SECTION_PATTERN.findall(prompt)}
+
+
+def build_item(section: str, index: str) -> Dict[str, Any]:
+    if section == "mcqs":
+        return {
+            "question": f"Stub multiple choice question {index}?",
+            "options": ["alpha", "beta", "gamma", "delta"],
+            "correct_answer": "alpha",
+            "explanation": "Stub explanation.",
+            "unit": 1,
+        }
+    if section == "fill_blanks":
+        return {"question": f"Stub blank ___ number {index}.", "answer": "x", "unit": 1}
+    if section == "short":
+        return {
+            "question": f"Explain stub concept {index}.",
+            "expected_points": ["p1", "p2", "p3"],
+            "marks": 3,
+            "unit": 1,
+        }
+    return {
+        "question": f"Discuss stub topic {index} in detail.",
+        "expected_points": [f"p{i}" for i in range(1, 7)],
+        "marks": 10,
+        "unit": 1,
+    }
+
+
+def build_payload(
+    sections: Dict[str, int], request_id: int = 0
+) -> Dict[str, List[Dict[str, Any]]]:
+    payload: Dict[str, List[Dict[str, Any]]] = {
+        "mcqs": [],
+        "fill_blanks": [],
+        "short": [],
+        "long": [],
+    }
+    for section, count in sections.items():
+        payload[section] = [
+            build_item(section, f"{request_id}.{i}") for i in range(1, count + 1)
+        ]
+    return payload
+
+
+def default_latency(sections: Dict[str, int], body: Dict[str, Any]) -> float:
+    return max((SECTION_LATENCY.get(s, 1.0) for s in sections), default=0.5)
+
+
+def create_stub_app(
+    latency_fn: Callable[[Dict[str, int], Dict[str, Any]], float] = default_latency,
+    latency_scale: float = 1.0,
+) -> FastAPI:
+    app = FastAPI()
+    app.state.request_count = 0
+
+    @app.post("/openai/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.request_count += 1
+        prompt = body["messages"][-1]["content"]
+        sections = requested_sections(prompt)
+        latency = latency_fn(sections, body) * latency_scale
+
+        content = json.dumps(build_payload(sections, app.state.request_count), indent=1)
+        prompt_tokens = sum(len(m["content"]) for m in body["messages"]) // 4
+        completion_tokens = len(content) // 4
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "total_tokens": prompt_tokens + completion_tokens,
+        }
+
+        if body.get("stream"):
+            return StreamingResponse(
+                stream_content(content, latency, body, usage),
+                media_type="text/event-stream",
+            )
+
+        await asyncio.sleep(latency)
+        return {
+            "id": f"stub-{app.state.request_count}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": content},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": usage,
+        }
+
+    return app
+
+
+async def stream_content(
+    content: str, latency: float, body: Dict[str, Any], usage: Dict[str, int]
+):
+    """Emit content as chat.completion.chunk events spread evenly over latency."""
+    pieces = [
+        content[i : i + STREAM_PIECE_CHARS]
+        for i in range(0, len(content), STREAM_PIECE_CHARS)
+    ]
+    delay = latency / max(len(pieces), 1)
+
+    def chunk(delta: Dict[str, Any], finish_reason: Optional[str] = None, **extra):
+        return {
+            "id": "stub-stream",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": body.get("model", "stub"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}],
+            **extra,
+        }
+
+    for piece in pieces:
+        await asyncio.sleep(delay)
+        yield f"data: {json.dumps(chunk({'content': piece}))}\n\n"
+
+    final = chunk({}, "stop", x_groq={"id": "stub", "usage": usage})
+    yield f"data: {json.dumps(final)}\n\n"
+    yield "data: [DONE]\n\n"
+
+
+class StubServer:
+    """Runs the stub app with uvicorn on a background thread."""
+
+    def __init__(self, app: FastAPI, port: Optional[int] = None):
+        self.app = app
+        self.port = port or self._free_port()
+        config = uvicorn.Config(
+            app, host="127.0.0.1", port=self.port, log_level="warning"
+        )
+        self.server = uvicorn.Server(config)
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+
+    @staticmethod
+    def _free_port() -> int:
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.port}"
+
+    def __enter__(self) -> "StubServer":
+        self.thread.start()
+        while not self.server.started:
+            time.sleep(0.05)
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.server.should_exit = True
+        self.thread.join(timeout=5)
@@ -0,0 +1,11 @@
+-- Incremental re-embedding: each chunk records a hash of its text and the
+-- embedding model that produced its vector. Reprocessing a document only
+-- embeds chunks whose (content_hash, embedding_model) is new, and deletes
+-- the chunks no longer produced. Rows from before this migration have no
+-- hash and are replaced on the next run.
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_model TEXT;
+
+-- Reprocessing reads the chunks of one document
+CREATE INDEX IF NOT EXISTS document_chunks_document_idx
+    ON document_chunks (document_id, chunk_index);
@@ -0,0 +1,122 @@
+-- Compact vectors (VECTOR_PRECISION=float16 or int8). Needs pgvector 0.8+
+-- (halfvec and hnsw.iterative_scan).
+--
+-- embedding (vector, float32) stays the full-precision copy the searches
+-- re-score on. embedding_half is derived from it by the database, so
+-- ingestion sends nothing extra for it. embedding_int8 holds int8 rows with
+-- one scale per row (embedding ~= embedding_int8 * embedding_scale), written
+-- by the app when VECTOR_PRECISION=int8. The local index loads the float32
+-- column instead, since it re-scores on it, and quantizes in memory.
+--
+-- This reduces what the searches send back and what the app holds in
+-- memory, not what the database stores: the new columns and the HNSW index
+-- below come on top of the float32 column and its ivfflat index.
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_half halfvec(384)
+    GENERATED ALWAYS AS (embedding::halfvec(384)) STORED;
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_int8 BYTEA;
+ALTER TABLE document_chunks ADD COLUMN IF NOT EXISTS embedding_scale REAL;
+
+CREATE INDEX IF NOT EXISTS document_chunks_embedding_half_idx
+    ON document_chunks USING hnsw (embedding_half halfvec_cosine_ops);
+
+-- Like match_document_chunks: the nearest match_count * rescore_factor
+-- chunks of the subject by halfvec distance (index scan), re-scored and
+-- filtered on the float32 embedding.
+--
+-- The HNSW scan returns hnsw.ef_search candidates (40 by default) before
+-- the subject and unit filters run, so filtered searches could come back
+-- short or empty. ef_search is raised to cover the candidates asked for,
+-- and the iterative scan keeps reading the index until enough rows pass
+-- the filters.
+CREATE OR REPLACE FUNCTION match_document_chunks_compact (
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_subject_id uuid DEFAULT NULL,
+  rescore_factor int DEFAULT 4
+)
+RETURNS TABLE (
+  id uuid,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM set_config('hnsw.ef_search', LEAST(GREATEST(match_count * rescore_factor, 40), 1000)::text, true);
+  PERFORM set_config('hnsw.iterative_scan', 'strict_order', true);
+  RETURN QUERY
+  SELECT
+    candidates.id,
+    candidates.content,
+    candidates.metadata,
+    1 - (candidates.embedding <=> query_embedding) as similarity
+  FROM (
+    SELECT document_chunks.id, document_chunks.content, document_chunks.metadata, document_chunks.embedding
+    FROM document_chunks
+    JOIN documents ON document_chunks.document_id = documents.id
+    WHERE (filter_subject_id IS NULL OR documents.subject_id = filter_subject_id)
+    ORDER BY document_chunks.embedding_half <=> query_embedding::halfvec(384)
+    LIMIT match_count * rescore_factor
+  ) AS candidates
+  WHERE 1 - (candidates.embedding <=> query_embedding) > match_threshold
+  ORDER BY candidates.embedding <=> query_embedding
+  LIMIT match_count;
+END;
+$$;
+
+-- Like match_unit_chunks, with the same re-scoring. The embedding returned
+-- for MMR is the halfvec one, half the bytes over the wire.
+CREATE OR REPLACE FUNCTION match_unit_chunks_compact (
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_subject_id uuid,
+  filter_unit_number int,
+  rescore_factor int DEFAULT 4
+)
+RETURNS TABLE (
+  id uuid,
+  document_id uuid,
+  chunk_index int,
+  content text,
+  metadata jsonb,
+  embedding halfvec(384),
+  similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  PERFORM set_config('hnsw.ef_search', LEAST(GREATEST(match_count * rescore_factor, 40), 1000)::text, true);
+  PERFORM set_config('hnsw.iterative_scan', 'strict_order', true);
+  RETURN QUERY
+  SELECT
+    candidates.id,
+    candidates.document_id,
+    candidates.chunk_index,
+    candidates.content,
+    candidates.metadata,
+    candidates.embedding_half,
+    1 - (candidates.embedding <=> query_embedding) as similarity
+  FROM (
+    SELECT
+      document_chunks.id,
+      document_chunks.document_id,
+      document_chunks.chunk_index,
+      document_chunks.content,
+      document_chunks.metadata,
+      document_chunks.embedding,
+      document_chunks.embedding_half
+    FROM document_chunks
+    JOIN documents ON document_chunks.document_id = documents.id
+    WHERE documents.subject_id = filter_subject_id
+    AND documents.unit_number = filter_unit_number
+    ORDER BY document_chunks.embedding_half <=> query_embedding::halfvec(384)
+    LIMIT match_count * rescore_factor
+  ) AS candidates
+  WHERE 1 - (candidates.embedding <=> query_embedding) > match_threshold
+  ORDER BY candidates.embedding <=> query_embedding
+  LIMIT match_count;
+END;
+$$;
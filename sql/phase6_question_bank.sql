@@ -0,0 +1,22 @@
+-- Question bank: every validated generated question, reusable across papers
+-- Note: embedding dimension is 384 for sentence-transformers/all-MiniLM-L6-v2
+CREATE TABLE IF NOT EXISTS question_bank (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    subject_id UUID REFERENCES subjects(id) ON DELETE CASCADE,
+    unit INTEGER CHECK (unit BETWEEN 1 AND 5),
+    question_type VARCHAR(20) NOT NULL,  -- mcq, fill_blanks, short, long
+    difficulty VARCHAR(20) NOT NULL,     -- easy, medium, hard
+    marks INTEGER,
+    question TEXT NOT NULL,
+    payload JSONB NOT NULL,              -- full validated question object
+    content_hash VARCHAR(64) NOT NULL UNIQUE,
+    embedding vector(384),
+    created_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Bank-first assembly filters on these columns
+CREATE INDEX IF NOT EXISTS question_bank_lookup_idx
+    ON question_bank (subject_id, question_type, difficulty, unit);
+
+CREATE INDEX IF NOT EXISTS question_bank_embedding_idx
+    ON question_bank USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
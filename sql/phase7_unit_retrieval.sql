@@ -0,0 +1,36 @@
+-- Per-unit retrieval: like match_document_chunks, restricted to the documents
+-- of one unit of a subject. Generation issues one call per selected unit.
+CREATE OR REPLACE FUNCTION match_unit_chunks (
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_subject_id uuid,
+  filter_unit_number int
+)
+RETURNS TABLE (
+  id uuid,
+  content text,
+  metadata jsonb,
+  similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    document_chunks.id,
+    document_chunks.content,
+    document_chunks.metadata,
+    1 - (document_chunks.embedding <=> query_embedding) as similarity
+  FROM document_chunks
+  JOIN documents ON document_chunks.document_id = documents.id
+  WHERE 1 - (document_chunks.embedding <=> query_embedding) > match_threshold
+  AND documents.subject_id = filter_subject_id
+  AND documents.unit_number = filter_unit_number
+  ORDER BY document_chunks.embedding <=> query_embedding
+  LIMIT match_count;
+END;
+$$;
+
+-- Supports the unit filter above
+CREATE INDEX IF NOT EXISTS documents_subject_unit_idx ON documents (subject_id, unit_number);
@@ -0,0 +1,42 @@
+-- Return chunk position and embedding from per-unit retrieval so the
+-- context builder can select diverse chunks (MMR) and merge adjacent
+-- overlapping chunks of the same document.
+DROP FUNCTION IF EXISTS match_unit_chunks(vector, float, int, uuid, int);
+
+CREATE OR REPLACE FUNCTION match_unit_chunks (
+  query_embedding vector(384),
+  match_threshold float,
+  match_count int,
+  filter_subject_id uuid,
+  filter_unit_number int
+)
+RETURNS TABLE (
+  id uuid,
+  document_id uuid,
+  chunk_index int,
+  content text,
+  metadata jsonb,
+  embedding vector(384),
+  similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    document_chunks.id,
+    document_chunks.document_id,
+    document_chunks.chunk_index,
+    document_chunks.content,
+    document_chunks.metadata,
+    document_chunks.embedding,
+    1 - (document_chunks.embedding <=> query_embedding) as similarity
+  FROM document_chunks
+  JOIN documents ON document_chunks.document_id = documents.id
+  WHERE 1 - (document_chunks.embedding <=> query_embedding) > match_threshold
+  AND documents.subject_id = filter_subject_id
+  AND documents.unit_number = filter_unit_number
+  ORDER BY document_chunks.embedding <=> query_embedding
+  LIMIT match_count;
+END;
+$$;
@@ -0,0 +1,50 @@
+-- Corpus version per subject: bumped whenever chunks of the subject are
+-- inserted, updated or deleted. Processes that mirror a subject's chunks in
+-- memory compare it with the version they loaded to know when to reload.
+CREATE TABLE IF NOT EXISTS subject_corpus_versions (
+    subject_id UUID PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP DEFAULT NOW()
+);
+
+-- Statement-level, so a bulk insert of a document's chunks bumps once.
+-- The subject comes from the chunk metadata, falling back to the document:
+-- when a document is deleted its chunks go by cascade after the document row.
+CREATE OR REPLACE FUNCTION bump_subject_corpus_version()
+RETURNS trigger
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  INSERT INTO subject_corpus_versions (subject_id, version, updated_at)
+  SELECT DISTINCT subject_id, 1, NOW()
+  FROM (
+    SELECT COALESCE((changed.metadata->>'subject_id')::uuid, documents.subject_id) AS subject_id
+    FROM changed_chunks AS changed
+    LEFT JOIN documents ON documents.id = changed.document_id
+  ) AS subjects
+  WHERE subject_id IS NOT NULL
+  ON CONFLICT (subject_id) DO UPDATE
+    SET version = subject_corpus_versions.version + 1,
+        updated_at = NOW();
+  RETURN NULL;
+END;
+$$;
+
+-- Transition tables allow one event per trigger
+DROP TRIGGER IF EXISTS document_chunks_version_insert ON document_chunks;
+CREATE TRIGGER document_chunks_version_insert
+  AFTER INSERT ON document_chunks
+  REFERENCING NEW TABLE AS changed_chunks
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_subject_corpus_version();
+
+DROP TRIGGER IF EXISTS document_chunks_version_update ON document_chunks;
+CREATE TRIGGER document_chunks_version_update
+  AFTER UPDATE ON document_chunks
+  REFERENCING NEW TABLE AS changed_chunks
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_subject_corpus_version();
+
+DROP TRIGGER IF EXISTS document_chunks_version_delete ON document_chunks;
+CREATE TRIGGER document_chunks_version_delete
+  AFTER DELETE ON document_chunks
+  REFERENCING OLD TABLE AS changed_chunks
+  FOR EACH STATEMENT EXECUTE FUNCTION bump_subject_corpus_version();